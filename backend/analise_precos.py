@@ -0,0 +1,161 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+from sqlalchemy import Float, cast, extract, func, select
+from sqlalchemy.orm import Session
+from models import HistoricoPreco, HistoricoPrecoDiario
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Análise de preços vetorizada: as séries de todos os produtos pedidos são
+# carregadas em uma consulta, viram arrays NumPy ordenados por (produto, data)
+# e as estatísticas saem de reduções por segmento (reduceat/cumsum/searchsorted),
+# sem laço Python por produto. O numpy só é importado no primeiro uso.
+ANALISE_JANELA_DIAS = int(os.getenv("ANALISE_JANELA_DIAS", "365"))
+ANALISE_ZSCORE_LIMIAR = float(os.getenv("ANALISE_ZSCORE_LIMIAR", "2.0"))
+ANALISE_MIN_PONTOS_ZSCORE = 5
+MEDIAS_MOVEIS_PONTOS = (7, 30)
+DIA_SEGUNDOS = 86400.0
+
+def carregar_series(db: Session, produto_ids: Iterable[int], desde: datetime):
+    """
+    (produto_ids, tempos em epoch, preços) ordenados por produto e data, das
+    linhas quentes e do arquivo frio. A data já vem em segundos do banco:
+    converter milhões de datetimes em Python custaria mais que a análise inteira
+    """
+    import numpy as np
+    from arquivo_historico import series_arquivadas  # sem banco no import: bench_analise usa só calcular_analises
+    produto_ids = list(produto_ids)
+    linhas = db.execute(
+        select(HistoricoPreco.produto_id, cast(extract("epoch", HistoricoPreco.data), Float), HistoricoPreco.preco)
+        .where(HistoricoPreco.produto_id.in_(produto_ids), HistoricoPreco.data >= desde, HistoricoPreco.preco.is_not(None))
+        .order_by(HistoricoPreco.produto_id, HistoricoPreco.data)
+    ).all()
+    if linhas:
+        matriz = np.array(linhas, dtype=np.float64)
+        ids, tempos, precos = matriz[:, 0].astype(np.int64), matriz[:, 1], matriz[:, 2]
+    else:
+        vazio = np.empty(0)
+        ids, tempos, precos = vazio.astype(np.int64), vazio, vazio
+    ids_arquivo, tempos_arquivo, precos_arquivo = series_arquivadas(db, produto_ids, desde)
+    if len(precos_arquivo) == 0:
+        return ids, tempos, precos
+    ids, tempos, precos = np.concatenate((ids_arquivo, ids)), np.concatenate((tempos_arquivo, tempos)), np.concatenate((precos_arquivo, precos))
+    ordem = np.lexsort((tempos, ids))
+    return ids[ordem], tempos[ordem], precos[ordem]
+
+def minimos_consolidados(db: Session, produto_ids: Iterable[int]) -> Dict[int, float]:
+    """Mínimo de cada produto nos dias já consolidados (fora da retenção do histórico bruto)"""
+    return dict(db.execute(
+        select(HistoricoPrecoDiario.produto_id, func.min(HistoricoPrecoDiario.preco_minimo))
+        .where(HistoricoPrecoDiario.produto_id.in_(list(produto_ids)))
+        .group_by(HistoricoPrecoDiario.produto_id)
+    ).all())
+
+def calcular_analises(
+    produto_ids: "np.ndarray",
+    tempos: "np.ndarray",
+    precos: "np.ndarray",
+    agora: float,
+    minimos_anteriores: Optional[Dict[int, float]] = None
+) -> Dict[int, dict]:
+    """
+    Estatísticas por produto a partir de arrays ordenados por (produto, tempo):
+    mínimo histórico e de 90 dias, médias móveis dos últimos N pontos,
+    variação em 30 dias e z-score do preço atual contra os últimos 90 dias
+    """
+    import numpy as np
+    total = len(precos)
+    if total == 0:
+        return {}
+
+    inicios = np.flatnonzero(np.r_[True, produto_ids[1:] != produto_ids[:-1]])
+    fins = np.r_[inicios[1:], total]
+    tamanhos = fins - inicios
+    grupos = np.repeat(np.arange(len(inicios)), tamanhos)
+    ids = produto_ids[inicios]
+    ultimo = precos[fins - 1]
+
+    minimo = np.minimum.reduceat(precos, inicios)
+    if minimos_anteriores:
+        anteriores = np.array([minimos_anteriores.get(int(i), np.inf) for i in ids], dtype=np.float64)
+        minimo = np.minimum(minimo, anteriores)
+
+    # Últimos 90 dias: mínimo, média e desvio (duas passadas, sem cancelamento numérico)
+    em_90 = tempos >= agora - 90 * DIA_SEGUNDOS
+    pontos_90 = np.add.reduceat(em_90.astype(np.int64), inicios)
+    minimo_90 = np.minimum.reduceat(np.where(em_90, precos, np.inf), inicios)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media_90 = np.add.reduceat(np.where(em_90, precos, 0.0), inicios) / pontos_90
+        desvios = np.where(em_90, precos - media_90[grupos], 0.0)
+        desvio_90 = np.sqrt(np.add.reduceat(desvios * desvios, inicios) / pontos_90)
+        zscore = np.where(
+            (pontos_90 >= ANALISE_MIN_PONTOS_ZSCORE) & (desvio_90 > 0),
+            (ultimo - media_90) / desvio_90, np.nan
+        )
+
+    # Médias móveis dos últimos N pontos via soma acumulada
+    acumulado = np.concatenate(([0.0], np.cumsum(precos)))
+    medias_moveis = {}
+    for n in MEDIAS_MOVEIS_PONTOS:
+        janela_inicio = np.maximum(inicios, fins - n)
+        medias_moveis[n] = (acumulado[fins] - acumulado[janela_inicio]) / (fins - janela_inicio)
+
+    # Variação em 30 dias: preço vigente no corte (último ponto antes dele,
+    # ou o primeiro da janela) contra o atual. Chave composta (grupo, tempo)
+    # permite um único searchsorted para todos os produtos.
+    tempo_min = tempos.min()
+    escala = tempos.max() - tempo_min + 1.0
+    chaves = grupos * escala + (tempos - tempo_min)
+    deslocamento = min(max(agora - 30 * DIA_SEGUNDOS - tempo_min, 0.0), escala - 0.5)
+    primeiro_30 = np.searchsorted(chaves, np.arange(len(inicios)) * escala + deslocamento, side="left")
+    referencia = precos[np.where(primeiro_30 > inicios, primeiro_30 - 1, primeiro_30)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variacao_30 = np.where(referencia > 0, (ultimo - referencia) / referencia * 100, np.nan)
+
+    colunas = {
+        "produto_id": ids.tolist(),
+        "pontos": tamanhos.tolist(),
+        "preco_atual": ultimo.tolist(),
+        "minimo_historico": minimo.tolist(),
+        "minimo_90d": minimo_90.tolist(),
+        "media_movel_7": medias_moveis[7].tolist(),
+        "media_movel_30": medias_moveis[30].tolist(),
+        "variacao_30d_pct": np.round(variacao_30, 2).tolist(),
+        "zscore_90d": np.round(zscore, 3).tolist(),
+    }
+    analises = {}
+    for linha in zip(*colunas.values()):
+        analise = {
+            chave: (None if isinstance(valor, float) and (valor != valor or valor == float("inf")) else valor)
+            for chave, valor in zip(colunas.keys(), linha)
+        }
+        analise["no_minimo_90d"] = analise["minimo_90d"] is not None and analise["preco_atual"] <= analise["minimo_90d"]
+        analise["anomalia"] = analise["zscore_90d"] is not None and abs(analise["zscore_90d"]) >= ANALISE_ZSCORE_LIMIAR
+        analises[analise["produto_id"]] = analise
+    return analises
+
+def analisar_produtos(db: Session, produto_ids: Iterable[int], agora: Optional[datetime] = None) -> Dict[int, dict]:
+    """Carrega as séries e calcula as análises de vários produtos de uma vez"""
+    produto_ids = list(produto_ids)
+    if not produto_ids:
+        return {}
+    agora = agora or datetime.utcnow()
+    ids, tempos, precos = carregar_series(db, produto_ids, agora - timedelta(days=ANALISE_JANELA_DIAS))
+    # epoch do banco é UTC (datas gravadas com utcnow)
+    agora_epoch = (agora - datetime(1970, 1, 1)).total_seconds()
+    return calcular_analises(ids, tempos, precos, agora_epoch, minimos_consolidados(db, produto_ids))
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    from models import ProdutoMonitorado
+    db = SessionLocal()
+    try:
+        todos = [produto_id for (produto_id,) in db.query(ProdutoMonitorado.id)]
+        inicio = time.perf_counter()
+        resultado = analisar_produtos(db, todos)
+        print(f"📈 {len(resultado)} produtos analisados em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    finally:
+        db.close()
@@ -0,0 +1,308 @@
+import os
+import sys
+import zlib
+import struct
+import time
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+from models import HistoricoPreco, HistoricoArquivo, HistoricoPrecoDiario, ProdutoMonitorado
+from particoes import inicio_mes, proximo_mes, nome_particao, listar_particoes, HISTORICO_RETENCAO_DIAS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Camada fria do histórico de preços: os pontos mais antigos que o corte saem
+# de historico_precos (uma linha por ponto, ~60 bytes com cabeçalho e índices)
+# e viram um blob por produto por mês em historico_arquivo. Cada blob guarda
+# quatro colunas int64 (id, data em µs, preço em centavos, estoque), cada uma
+# delta-codificada, com os bytes transpostos (como o "shuffle" do Blosc) e
+# comprimidas com zlib: poucos bytes por ponto. As leituras de histórico,
+# exportação e análise juntam as duas camadas de forma transparente. Meses
+# arquivados que saem de HISTORICO_RETENCAO_DIAS viram agregados em
+# historico_precos_diario, como as partições (aplicar_retencao_arquivo).
+# Preços são guardados em centavos (os do ML têm 2 casas); None vira -1.
+HISTORICO_ARQUIVO_DIAS = int(os.getenv("HISTORICO_ARQUIVO_DIAS", "90"))  # 0 desliga o arquivamento
+ARQUIVO_LOTE_PRODUTOS = 200
+ARQUIVO_VERSAO = 1
+CABECALHO = struct.Struct("<BI")  # versão, número de pontos
+COLUNAS = 4
+AUSENTE = -1
+EPOCH = datetime(1970, 1, 1)
+
+Ponto = Tuple[int, datetime, Optional[float], Optional[int]]  # (id, data, preço, estoque)
+
+def _microssegundos(data: datetime) -> int:
+    return (data - EPOCH) // timedelta(microseconds=1)
+
+def codificar_pontos(pontos: List[Ponto]) -> bytes:
+    """Pontos ordenados por data -> blob compactado"""
+    import numpy as np
+    matriz = np.array([
+        (
+            ponto_id,
+            _microssegundos(data),
+            AUSENTE if preco is None else round(preco * 100),
+            AUSENTE if estoque is None else estoque,
+        )
+        for ponto_id, data, preco, estoque in pontos
+    ], dtype=np.int64).reshape(-1, COLUNAS)
+    deltas = np.diff(matriz, axis=0, prepend=np.zeros((1, COLUNAS), dtype=np.int64))
+    # Coluna a coluna, depois os bytes de mesma posição juntos: os deltas são
+    # pequenos e os bytes altos viram longas sequências de zeros
+    colunas = np.ascontiguousarray(deltas.T).astype("<i8")
+    transpostos = colunas.view(np.uint8).reshape(-1, 8).T.tobytes()
+    return CABECALHO.pack(ARQUIVO_VERSAO, len(pontos)) + zlib.compress(transpostos, 6)
+
+def decodificar_colunas(dados: bytes) -> "np.ndarray":
+    """Blob -> matriz (COLUNAS x pontos) int64 com os valores originais"""
+    import numpy as np
+    versao, total = CABECALHO.unpack_from(dados)
+    if versao != ARQUIVO_VERSAO:
+        raise ValueError(f"Versão de arquivo desconhecida: {versao}")
+    transpostos = np.frombuffer(zlib.decompress(dados[CABECALHO.size:]), dtype=np.uint8)
+    deltas = np.ascontiguousarray(transpostos.reshape(8, -1).T).view("<i8").reshape(COLUNAS, total)
+    return np.cumsum(deltas, axis=1)
+
+def decodificar_pontos(dados: bytes) -> List[Ponto]:
+    ids, tempos, centavos, estoques = decodificar_colunas(dados).tolist()
+    return [
+        (
+            ponto_id,
+            EPOCH + timedelta(microseconds=tempo),
+            None if centavo == AUSENTE else centavo / 100,
+            None if estoque == AUSENTE else estoque,
+        )
+        for ponto_id, tempo, centavo, estoque in zip(ids, tempos, centavos, estoques)
+    ]
+
+# --- Leitura (junto com as linhas quentes) ---
+
+def consulta_arquivos(produto_ids: Iterable[int], desde: Optional[datetime] = None):
+    """Blobs dos produtos, na ordem (produto, mês); com `desde`, só os meses que o alcançam"""
+    consulta = (
+        select(HistoricoArquivo.produto_id, HistoricoArquivo.dados)
+        .where(HistoricoArquivo.produto_id.in_(list(produto_ids)))
+        .order_by(HistoricoArquivo.produto_id, HistoricoArquivo.mes)
+    )
+    if desde is not None:
+        consulta = consulta.where(HistoricoArquivo.ultimo_ponto_em >= desde)
+    return consulta
+
+def consulta_versao_arquivo(produto_id: int):
+    """(blobs, pontos, último arquivamento): muda quando o arquivador mexe no produto"""
+    return select(func.count(), func.coalesce(func.sum(HistoricoArquivo.pontos), 0), func.max(HistoricoArquivo.arquivado_em)).where(
+        HistoricoArquivo.produto_id == produto_id
+    )
+
+def pontos_arquivados(arquivos: Iterable[Tuple[int, bytes]], desde: Optional[datetime] = None) -> Dict[int, List[Ponto]]:
+    """{produto_id: pontos em ordem de data} a partir das linhas de consulta_arquivos"""
+    pontos: Dict[int, List[Ponto]] = {}
+    for produto_id, dados in arquivos:
+        lista = pontos.setdefault(produto_id, [])
+        lista.extend(ponto for ponto in decodificar_pontos(dados) if desde is None or ponto[1] >= desde)
+    return pontos
+
+def series_arquivadas(db: Session, produto_ids: Iterable[int], desde: datetime):
+    """
+    (produto_ids, tempos em epoch, preços) dos pontos arquivados, no formato
+    de analise_precos.carregar_series, sem passar por datetime em Python
+    """
+    import numpy as np
+    desde_us = _microssegundos(desde)
+    partes = []
+    for produto_id, dados in db.execute(consulta_arquivos(produto_ids, desde)):
+        _, tempos, centavos, _ = decodificar_colunas(dados)
+        validos = (tempos >= desde_us) & (centavos != AUSENTE)
+        partes.append((np.full(int(validos.sum()), produto_id, dtype=np.int64), tempos[validos] / 1e6, centavos[validos] / 100))
+    if not partes:
+        vazio = np.empty(0)
+        return vazio.astype(np.int64), vazio, vazio
+    return tuple(np.concatenate(coluna) for coluna in zip(*partes))
+
+# --- Arquivamento ---
+
+def _mes_datetime(mes: date) -> datetime:
+    return datetime(mes.year, mes.month, 1)
+
+def arquivar_lote(db: Session, produto_ids: List[int], mes: date) -> int:
+    """
+    Move os pontos do mês dos produtos para os blobs (sem commit). Pontos que
+    chegarem depois para um mês já arquivado são mesclados no blob existente
+    """
+    inicio, fim = _mes_datetime(mes), _mes_datetime(proximo_mes(mes))
+    filtros = (HistoricoPreco.produto_id.in_(produto_ids), HistoricoPreco.data >= inicio, HistoricoPreco.data < fim)
+    linhas = db.execute(
+        select(HistoricoPreco.produto_id, HistoricoPreco.id, HistoricoPreco.data, HistoricoPreco.preco, HistoricoPreco.estoque)
+        .where(*filtros).order_by(HistoricoPreco.produto_id, HistoricoPreco.data, HistoricoPreco.id)
+    ).all()
+    if not linhas:
+        return 0
+    por_produto: Dict[int, List[Ponto]] = {}
+    for produto_id, ponto_id, data, preco, estoque in linhas:
+        por_produto.setdefault(produto_id, []).append((ponto_id, data, preco, estoque))
+    existentes = {
+        arquivo.produto_id: arquivo
+        for arquivo in db.query(HistoricoArquivo).filter(HistoricoArquivo.produto_id.in_(list(por_produto)), HistoricoArquivo.mes == mes)
+    }
+    agora = datetime.utcnow()
+    for produto_id, pontos in por_produto.items():
+        arquivo = existentes.get(produto_id)
+        if arquivo is not None:
+            novos = {ponto[0] for ponto in pontos}
+            pontos = sorted(
+                [ponto for ponto in decodificar_pontos(arquivo.dados) if ponto[0] not in novos] + pontos,
+                key=lambda ponto: (ponto[1], ponto[0])
+            )
+        else:
+            arquivo = HistoricoArquivo(produto_id=produto_id, mes=mes)
+            db.add(arquivo)
+        arquivo.dados = codificar_pontos(pontos)
+        arquivo.pontos = len(pontos)
+        arquivo.primeiro_ponto_em = pontos[0][1]
+        arquivo.ultimo_ponto_em = pontos[-1][1]
+        arquivo.arquivado_em = agora
+    db.execute(delete(HistoricoPreco).where(*filtros))
+    return len(linhas)
+
+def liberar_particao(mes: date):
+    """Partição do mês que ficou vazia: TRUNCATE devolve o espaço na hora (sem esperar o VACUUM)"""
+    if engine.dialect.name != "postgresql":
+        return
+    nome = nome_particao(mes)
+    with engine.begin() as connection:
+        if nome not in {particao for particao, _ in listar_particoes(connection)}:
+            return
+        if connection.execute(text(f"SELECT NOT EXISTS (SELECT 1 FROM {nome})")).scalar():
+            connection.execute(text(f"TRUNCATE {nome}"))
+
+def arquivar_historico(dias: int = HISTORICO_ARQUIVO_DIAS, produto_ids: Optional[List[int]] = None, lote: int = ARQUIVO_LOTE_PRODUTOS) -> dict:
+    """
+    Arquiva os meses inteiros anteriores ao corte (hoje - dias), um mês e um
+    lote de produtos por transação. Roda antes da retenção: meses arquivados
+    não são consolidados em historico_precos_diario, ficam no arquivo com
+    todos os pontos
+    """
+    resultado = {"meses": 0, "pontos": 0}
+    if dias <= 0:
+        return resultado
+    corte = inicio_mes(datetime.utcnow().date() - timedelta(days=dias))
+    db: Session = SessionLocal()
+    try:
+        todos = produto_ids is None
+        if todos:
+            produto_ids = [produto_id for (produto_id,) in db.query(ProdutoMonitorado.id).order_by(ProdutoMonitorado.id)]
+        if not produto_ids:
+            return resultado
+        mais_antigo = db.execute(select(func.min(HistoricoPreco.data)).where(
+            HistoricoPreco.data < _mes_datetime(corte), HistoricoPreco.produto_id.in_(produto_ids)
+        )).scalar()
+        if mais_antigo is None:
+            return resultado
+        mes = inicio_mes(mais_antigo.date())
+        while mes < corte:
+            for i in range(0, len(produto_ids), lote):
+                resultado["pontos"] += arquivar_lote(db, produto_ids[i:i + lote], mes)
+                db.commit()
+            if todos:
+                liberar_particao(mes)
+            resultado["meses"] += 1
+            mes = proximo_mes(mes)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if resultado["pontos"]:
+        print(f"🧊 Histórico arquivado: {resultado['pontos']} pontos de {resultado['meses']} meses (corte {corte})")
+    return resultado
+
+# --- Retenção do arquivo ---
+
+def _combinar(funcao, *valores):
+    presentes = [valor for valor in valores if valor is not None]
+    return funcao(presentes) if presentes else None
+
+def consolidar_blobs(db: Session, arquivos: List[HistoricoArquivo]) -> int:
+    """
+    Soma os pontos dos blobs em historico_precos_diario (sem commit), com a
+    mesma regra de particoes.SQL_CONSOLIDAR: dia já agregado é combinado
+    """
+    dias: Dict[Tuple[int, date], dict] = {}
+    for arquivo in arquivos:
+        for _, data, preco, estoque in decodificar_pontos(arquivo.dados):
+            dia = dias.setdefault((arquivo.produto_id, data.date()), {"precos": [], "pontos": 0, "ultimo": None})
+            dia["pontos"] += 1
+            if preco is not None:
+                dia["precos"].append(preco)
+            if dia["ultimo"] is None or data >= dia["ultimo"][0]:
+                dia["ultimo"] = (data, estoque)
+    if not dias:
+        return 0
+    produto_ids = {produto_id for produto_id, _ in dias}
+    existentes = {
+        (linha.produto_id, linha.dia): linha
+        for linha in db.query(HistoricoPrecoDiario).filter(
+            HistoricoPrecoDiario.produto_id.in_(produto_ids),
+            HistoricoPrecoDiario.dia.in_({dia for _, dia in dias})
+        )
+    }
+    for (produto_id, dia), agregado in dias.items():
+        precos = agregado["precos"]
+        minimo, maximo = (min(precos), max(precos)) if precos else (None, None)
+        medio = sum(precos) / len(precos) if precos else None
+        linha = existentes.get((produto_id, dia))
+        if linha is None:
+            db.add(HistoricoPrecoDiario(
+                produto_id=produto_id, dia=dia, preco_minimo=minimo, preco_maximo=maximo,
+                preco_medio=medio, estoque_final=agregado["ultimo"][1], pontos=agregado["pontos"]
+            ))
+            continue
+        if medio is not None and linha.preco_medio is not None:
+            medio = (linha.preco_medio * linha.pontos + medio * agregado["pontos"]) / (linha.pontos + agregado["pontos"])
+        linha.preco_minimo = _combinar(min, linha.preco_minimo, minimo)
+        linha.preco_maximo = _combinar(max, linha.preco_maximo, maximo)
+        linha.preco_medio = medio if medio is not None else linha.preco_medio
+        linha.estoque_final = agregado["ultimo"][1]
+        linha.pontos += agregado["pontos"]
+    return sum(agregado["pontos"] for agregado in dias.values())
+
+def aplicar_retencao_arquivo(dias: int = HISTORICO_RETENCAO_DIAS, lote: int = ARQUIVO_LOTE_PRODUTOS) -> dict:
+    """
+    A retenção das partições (particoes.aplicar_retencao) aplicada ao arquivo:
+    os meses inteiros anteriores ao corte (hoje - dias) viram agregados em
+    historico_precos_diario e os blobs são apagados, na mesma transação
+    """
+    resultado = {"blobs": 0, "pontos": 0}
+    if dias <= 0:
+        return resultado
+    corte = inicio_mes(datetime.utcnow().date() - timedelta(days=dias))
+    db: Session = SessionLocal()
+    try:
+        while True:
+            arquivos = db.query(HistoricoArquivo).filter(HistoricoArquivo.mes < corte).order_by(
+                HistoricoArquivo.produto_id, HistoricoArquivo.mes
+            ).limit(lote).all()
+            if not arquivos:
+                break
+            resultado["pontos"] += consolidar_blobs(db, arquivos)
+            for arquivo in arquivos:
+                db.delete(arquivo)
+            db.commit()
+            resultado["blobs"] += len(arquivos)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if resultado["blobs"]:
+        print(f"🧹 Retenção do arquivo ({dias} dias): {resultado['blobs']} blobs consolidados ({resultado['pontos']} pontos)")
+    return resultado
+
+if __name__ == "__main__":
+    # python arquivo_historico.py [dias]
+    inicio = time.perf_counter()
+    arquivar_historico(int(sys.argv[1]) if len(sys.argv) > 1 else HISTORICO_ARQUIVO_DIAS)
+    print(f"⏱️ {time.perf_counter() - inicio:.1f}s")
@@ -0,0 +1,169 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import ProdutoMonitorado, HistoricoPreco, Alerta, Usuario, EstatisticaProduto
+from email_utils import enviar_alerta_email
+from eventos import publicar_evento
+from analise_precos import analisar_produtos, ANALISE_ZSCORE_LIMIAR
+from estatisticas import registrar_pontos, carregar_estatisticas
+from indice_alertas import indice_alertas, garantir_indice, alerta_removido
+
+# Caminho único de gravação das atualizações vindas do ML
+# (usado pelo scheduler e pela atualização em massa do usuário)
+
+def publicar_mudanca_preco(db: Session, produto: ProdutoMonitorado, preco_anterior: Optional[float], estoque_anterior: Optional[int]):
+    """Publica o evento "preco" se preço ou estoque mudaram (entregue no commit)"""
+    if produto.preco_atual == preco_anterior and produto.estoque_atual == estoque_anterior:
+        return
+    publicar_evento(db, produto.usuario_id, "preco", {
+        "produto_id": produto.id,
+        "ml_id": produto.ml_id,
+        "preco_atual": produto.preco_atual,
+        "estoque_atual": produto.estoque_atual,
+        "preco_anterior": preco_anterior,
+        "estoque_anterior": estoque_anterior
+    })
+
+def aplicar_dados_ml(db: Session, produto: ProdutoMonitorado, dados_ml: dict, agora: Optional[datetime] = None) -> HistoricoPreco:
+    """Atualiza o produto com os dados do ML e registra o ponto de histórico (sem commit)"""
+    agora = agora or datetime.utcnow()
+    preco_anterior, estoque_anterior = produto.preco_atual, produto.estoque_atual
+    produto.nome = dados_ml["nome"]
+    produto.preco_atual = dados_ml["preco"]
+    produto.estoque_atual = dados_ml["estoque"]
+    produto.url = dados_ml["url"]
+    publicar_mudanca_preco(db, produto, preco_anterior, estoque_anterior)
+    historico = HistoricoPreco(
+        produto_id=produto.id,
+        preco=produto.preco_atual,
+        estoque=produto.estoque_atual,
+        data=agora
+    )
+    db.add(historico)
+    return historico
+
+# Tipos de alerta que precisam da análise das séries (janelas de 90/30 dias)
+TIPOS_ALERTA_ANALISE = ("minimo_90d", "queda_percentual", "anomalia")
+
+def condicao_atingida(alerta: Alerta, produto: ProdutoMonitorado, analise: Optional[dict], estatistica: Optional[EstatisticaProduto] = None) -> bool:
+    """
+    Avalia a condição do alerta. O mínimo histórico vem das estatísticas
+    incrementais; os tipos de janela dependem da análise do produto
+    """
+    preco = produto.preco_atual
+    if preco is None:
+        return False
+    if alerta.tipo == "preco_alvo":
+        return alerta.preco_alvo is not None and preco <= alerta.preco_alvo
+    if alerta.tipo == "minimo_historico":
+        return estatistica is not None and estatistica.preco_minimo is not None and preco <= estatistica.preco_minimo
+    if analise is None:
+        return False
+    if alerta.tipo == "minimo_90d":
+        return analise["minimo_90d"] is not None and preco <= analise["minimo_90d"]
+    if alerta.tipo == "queda_percentual":
+        return analise["variacao_30d_pct"] is not None and analise["variacao_30d_pct"] <= -(alerta.parametro or 0)
+    if alerta.tipo == "anomalia":
+        # Só anomalias para baixo interessam a quem quer comprar
+        return analise["zscore_90d"] is not None and analise["zscore_90d"] <= -(alerta.parametro or ANALISE_ZSCORE_LIMIAR)
+    return False
+
+def carregar_alertas_candidatos(db: Session, produtos: List[ProdutoMonitorado]) -> Dict[int, List[Alerta]]:
+    """
+    Alertas pendentes que podem disparar, por produto. Com o índice em memória
+    os de preço alvo já vêm filtrados pelo preço atual (só os atingidos são
+    lidos do banco); os demais tipos são avaliados um a um
+    """
+    produto_ids = [produto.id for produto in produtos]
+    if not produto_ids:
+        return {}
+    consulta = db.query(Alerta).filter(Alerta.enviado == False)
+    if garantir_indice(db):
+        disparados = [
+            alerta_id
+            for produto in produtos if produto.preco_atual is not None
+            for alerta_id in indice_alertas.disparados(produto.id, produto.preco_atual)
+        ]
+        consulta = consulta.filter(or_(
+            Alerta.id.in_(disparados),
+            (Alerta.produto_id.in_(produto_ids)) & (Alerta.tipo != "preco_alvo")
+        ))
+    else:
+        consulta = consulta.filter(Alerta.produto_id.in_(produto_ids))
+    candidatos: Dict[int, List[Alerta]] = {}
+    for alerta in consulta.order_by(Alerta.id):
+        candidatos.setdefault(alerta.produto_id, []).append(alerta)
+    return candidatos
+
+def verificar_alertas(
+    db: Session,
+    produto: ProdutoMonitorado,
+    analise: Optional[dict] = None,
+    estatistica: Optional[EstatisticaProduto] = None,
+    alertas: Optional[List[Alerta]] = None
+) -> int:
+    """Envia os alertas pendentes cuja condição foi atingida (sem commit)"""
+    enviados = 0
+    if alertas is None:
+        alertas = carregar_alertas_candidatos(db, [produto]).get(produto.id, [])
+    for alerta in alertas:
+        if condicao_atingida(alerta, produto, analise, estatistica):
+            usuario = db.query(Usuario).filter(Usuario.id == alerta.usuario_id).first()
+            if usuario:
+                enviar_alerta_email(usuario.email, produto.nome, produto.preco_atual, produto.url)
+                alerta.enviado = True
+                alerta_removido(db, alerta)
+                publicar_evento(db, alerta.usuario_id, "alerta", {
+                    "alerta_id": alerta.id,
+                    "produto_id": produto.id,
+                    "tipo": alerta.tipo,
+                    "preco_alvo": alerta.preco_alvo,
+                    "preco_atual": produto.preco_atual
+                })
+                enviados += 1
+    return enviados
+
+def gravar_atualizacoes(usuario_id: int, dados_por_ml_id: Dict[str, dict]) -> dict:
+    """
+    Grava em uma única transação as atualizações obtidas do ML para os
+    produtos de um usuário e dispara os alertas atingidos
+    """
+    db: Session = SessionLocal()
+    try:
+        produtos = db.query(ProdutoMonitorado).filter(ProdutoMonitorado.usuario_id == usuario_id).all()
+        agora = datetime.utcnow()
+        atualizados = []
+        for produto in produtos:
+            dados_ml = dados_por_ml_id.get(produto.ml_id)
+            if dados_ml:
+                aplicar_dados_ml(db, produto, dados_ml, agora)
+                atualizados.append(produto)
+        db.flush()
+        registrar_pontos(db, [(produto.id, produto.preco_atual, agora) for produto in atualizados])
+        estatisticas = carregar_estatisticas(db, [produto.id for produto in atualizados])
+        candidatos = carregar_alertas_candidatos(db, atualizados)
+        # Uma análise vetorizada para todos os produtos com alerta de janela pendente
+        com_alerta_analitico = [
+            produto_id for produto_id, alertas in candidatos.items()
+            if any(alerta.tipo in TIPOS_ALERTA_ANALISE for alerta in alertas)
+        ]
+        analises = analisar_produtos(db, com_alerta_analitico, agora)
+        alertas_enviados = sum(
+            verificar_alertas(db, produto, analises.get(produto.id), estatisticas.get(produto.id), candidatos.get(produto.id, []))
+            for produto in atualizados
+        )
+        db.commit()
+        print(f"💾 {len(atualizados)}/{len(produtos)} produtos atualizados para user {usuario_id} ({alertas_enviados} alertas)")
+        return {
+            "total": len(produtos),
+            "atualizados": len(atualizados),
+            "nao_encontrados": len(produtos) - len(atualizados),
+            "alertas_enviados": alertas_enviados
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
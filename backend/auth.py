@@ -1,23 +1,86 @@
 import os
+import time
+import threading
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import AsyncSessionLocal
 from models import Usuario
+from replicas import marcar_requisicao_de_escrita, abrir_sessao_leitura
 
 # Configurações
 SECRET_KEY = os.getenv("NEXTAUTH_SECRET", "supersecret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 dias
+USUARIO_CACHE_TTL_SEGUNDOS = int(os.getenv("USUARIO_CACHE_TTL_SEGUNDOS", "60"))
+USUARIO_CACHE_MAX_ITENS = int(os.getenv("USUARIO_CACHE_MAX_ITENS", "10000"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    usuario_id: Optional[int] = None
+
+class UsuarioAutenticado(BaseModel):
+    """Dados do usuário autenticado guardados em cache (não é uma linha do ORM)"""
+    id: int
+    email: str
+    nome: Optional[str] = None
+    is_active: bool = True
+    is_admin: bool = False
+
+class CacheUsuarios:
+    """
+    Cache em memória (por worker) dos usuários já resolvidos, com TTL.
+    Invalidado pelos eventos do ORM quando o usuário é alterado/removido
+    neste processo; nos demais workers a defasagem máxima é o TTL.
+    """
+    def __init__(self, ttl_segundos: int, max_itens: int):
+        self.ttl_segundos = ttl_segundos
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.falhas = 0
+        self._itens: Dict[int, Tuple[float, UsuarioAutenticado]] = {}
+        self._lock = threading.Lock()
+
+    def obter(self, usuario_id: int) -> Optional[UsuarioAutenticado]:
+        with self._lock:
+            item = self._itens.get(usuario_id)
+            if item is None or item[0] < time.monotonic():
+                self._itens.pop(usuario_id, None)
+                self.falhas += 1
+                return None
+            self.acertos += 1
+            return item[1]
+
+    def guardar(self, usuario: UsuarioAutenticado):
+        if self.ttl_segundos <= 0:
+            return
+        with self._lock:
+            if len(self._itens) >= self.max_itens:
+                # Descarta os itens expirados; se ainda estiver cheio, esvazia
+                agora = time.monotonic()
+                self._itens = {k: v for k, v in self._itens.items() if v[0] >= agora}
+                if len(self._itens) >= self.max_itens:
+                    self._itens.clear()
+            self._itens[usuario.id] = (time.monotonic() + self.ttl_segundos, usuario)
+
+    def invalidar(self, usuario_id: int):
+        with self._lock:
+            self._itens.pop(usuario_id, None)
+
+usuarios_cache = CacheUsuarios(USUARIO_CACHE_TTL_SEGUNDOS, USUARIO_CACHE_MAX_ITENS)
+
+@event.listens_for(Usuario, "after_update")
+@event.listens_for(Usuario, "after_delete")
+def _invalidar_usuario_cache(mapper, connection, target):
+    usuarios_cache.invalidar(target.id)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -26,27 +89,71 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def criar_token_usuario(user: Usuario) -> str:
+    """JWT com o email (sub) e o id do usuário (uid), evitando a busca por email"""
+    return create_access_token(data={"sub": user.email, "uid": user.id})
+
 def verify_access_token(token: str, credentials_exception):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        return TokenData(email=email)
+        usuario_id = payload.get("uid")
+        return TokenData(email=email, usuario_id=usuario_id if isinstance(usuario_id, int) else None)
     except JWTError:
         raise credentials_exception
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def autenticar_token(token: str) -> UsuarioAutenticado:
+    """
+    Resolve o usuário do JWT. Com o id no token (claim uid) e o usuário em
+    cache, não há consulta ao banco; caso contrário abre uma sessão curta
+    só para a busca (tokens antigos, sem uid, são resolvidos pelo email)
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não autenticado",
         headers={"WWW-Authenticate": "Bearer"},
     )
     token_data = verify_access_token(token, credentials_exception)
-    user = db.query(Usuario).filter(Usuario.email == token_data.email).first()
+    if token_data.usuario_id is not None:
+        usuario = usuarios_cache.obter(token_data.usuario_id)
+        if usuario is not None:
+            return usuario
+        consulta = select(Usuario).where(Usuario.id == token_data.usuario_id)
+    else:
+        consulta = select(Usuario).where(Usuario.email == token_data.email)
+
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(consulta)).scalar_one_or_none()
     if user is None:
         raise credentials_exception
-    return user
+    usuario = UsuarioAutenticado(id=user.id, email=user.email, nome=user.nome, is_active=bool(user.is_active), is_admin=bool(user.is_admin))
+    if token_data.usuario_id is not None:
+        usuarios_cache.guardar(usuario)
+    return usuario
+
+METODOS_LEITURA = ("GET", "HEAD", "OPTIONS")
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> UsuarioAutenticado:
+    """Dependência das rotas autenticadas (não abre sessão do banco em cache hit)"""
+    usuario = await autenticar_token(token)
+    if request.method not in METODOS_LEITURA:
+        # Leituras seguintes deste usuário vão ao primário (read-your-writes),
+        # contadas a partir do commit da mutação
+        marcar_requisicao_de_escrita(usuario.id)
+    return usuario
+
+async def get_current_admin(current_user: UsuarioAutenticado = Depends(get_current_user)) -> UsuarioAutenticado:
+    """Dependência das rotas administrativas"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito a administradores")
+    return current_user
+
+async def get_async_db_leitura(current_user: UsuarioAutenticado = Depends(get_current_user)) -> AsyncIterator[AsyncSession]:
+    """Sessão somente-leitura: réplica, exceto logo após uma mutação do próprio usuário"""
+    async with abrir_sessao_leitura(current_user.id) as db:
+        yield db
 
 # Esqueleto para integração Google OAuth (a ser implementado)
 def google_oauth_login(token_id: str, db: Session):
@@ -0,0 +1,173 @@
+import os
+import re
+import asyncio
+import zlib
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import BuscaSalva, EventoBusca
+from eventos import publicar_evento
+from mercadolivre import buscar_produtos_ml
+
+# Buscas salvas: o scheduler reexecuta cada consulta e compara o resultado com
+# o que já foi visto. Só anúncios nunca vistos e quedas de preço viram linhas
+# em eventos_busca e eventos ao vivo; páginas inteiras nunca são gravadas.
+# Dois estados por busca: o snapshot (preços da última página, sem o filtro
+# de preço máximo) e o conjunto de ids já vistos, que só cresce: anúncio que
+# só mudou de posição no ranking não volta como "novo". A primeira execução
+# só registra a linha de base.
+BUSCA_SALVA_LIMITE = int(os.getenv("BUSCA_SALVA_LIMITE", "50"))  # máximo do /sites/MLB/search
+BUSCAS_MAX_POR_USUARIO = int(os.getenv("BUSCAS_MAX_POR_USUARIO", "20"))
+BUSCAS_INTERVALO_MINUTOS = int(os.getenv("BUSCAS_INTERVALO_MINUTOS", "60"))
+
+ML_ID_NUMERICO = re.compile(r"^MLB(\d+)$")
+
+def _numero(ml_id: str) -> int:
+    return int(ML_ID_NUMERICO.match(ml_id).group(1))
+
+def _deltas(numeros: List[int]) -> array:
+    """Números ordenados -> diferenças (só o número do ml_id, o prefixo é sempre MLB)"""
+    return array("q", (numero - anterior for numero, anterior in zip(numeros, [0] + numeros)))
+
+def _acumular(deltas) -> List[int]:
+    numeros, numero = [], 0
+    for delta in deltas:
+        numero += delta
+        numeros.append(numero)
+    return numeros
+
+def codificar_snapshot(precos: Dict[str, float]) -> bytes:
+    """
+    {ml_id: preço} -> bytes. Ids ordenados e guardados como diferenças e
+    preços em centavos, tudo em zlib: poucos bytes por anúncio
+    """
+    itens = sorted((_numero(ml_id), round(preco * 100)) for ml_id, preco in precos.items())
+    centavos = array("q", (centavo for _, centavo in itens))
+    return zlib.compress(_deltas([numero for numero, _ in itens]).tobytes() + centavos.tobytes())
+
+def decodificar_snapshot(dados: Optional[bytes]) -> Dict[str, float]:
+    if not dados:
+        return {}
+    valores = array("q")
+    valores.frombytes(zlib.decompress(dados))
+    metade = len(valores) // 2
+    return {f"MLB{numero}": centavos / 100 for numero, centavos in zip(_acumular(valores[:metade]), valores[metade:])}
+
+def codificar_vistos(ml_ids: Set[str]) -> bytes:
+    return zlib.compress(_deltas(sorted(_numero(ml_id) for ml_id in ml_ids)).tobytes())
+
+def decodificar_vistos(dados: Optional[bytes]) -> Set[str]:
+    if not dados:
+        return set()
+    deltas = array("q")
+    deltas.frombytes(zlib.decompress(dados))
+    return {f"MLB{numero}" for numero in _acumular(deltas)}
+
+def extrair_resultados(dados_busca: dict) -> Dict[str, dict]:
+    """Resultados válidos da busca (sem o filtro de preço máximo, aplicado na comparação)"""
+    resultados = {}
+    for item in dados_busca.get("results", []):
+        ml_id, preco = item.get("id"), item.get("price")
+        if preco is None or not ml_id or not ML_ID_NUMERICO.match(ml_id):
+            continue
+        resultados[ml_id] = {"preco": float(preco), "titulo": item.get("title"), "url": item.get("permalink")}
+    return resultados
+
+def diferencas(
+    vistos: Set[str], anterior: Dict[str, float], atuais: Dict[str, dict], preco_maximo: Optional[float] = None
+) -> List[Tuple[str, str, Optional[float]]]:
+    """
+    (ml_id, tipo, preço anterior) dos anúncios dentro do preço máximo que
+    nunca foram vistos ("novo") ou que estão mais baratos que na página
+    anterior ("queda_preco", inclusive os que voltaram para baixo do máximo)
+    """
+    mudancas = []
+    for ml_id, resultado in atuais.items():
+        if preco_maximo is not None and resultado["preco"] > preco_maximo:
+            continue
+        preco_anterior = anterior.get(ml_id)
+        if ml_id not in vistos:
+            mudancas.append((ml_id, "novo", None))
+        elif preco_anterior is not None and round(resultado["preco"] * 100) < round(preco_anterior * 100):
+            mudancas.append((ml_id, "queda_preco", preco_anterior))
+    return mudancas
+
+def aplicar_execucao(db: Session, busca: BuscaSalva, dados_busca: dict, agora: Optional[datetime] = None) -> int:
+    """Compara com o estado salvo, grava os eventos, o snapshot e os ids vistos (sem commit)"""
+    agora = agora or datetime.utcnow()
+    atuais = extrair_resultados(dados_busca)
+    if not atuais and busca.ultima_execucao_em is not None:
+        # Página vazia (falha passageira do ML): manter o estado, senão tudo
+        # que voltar na próxima execução pareceria novo ou mais barato
+        print(f"⚠️ Busca {busca.id}: resultado vazio, mantendo o snapshot anterior")
+        return 0
+    primeira_execucao = busca.ultima_execucao_em is None
+    anterior = decodificar_snapshot(busca.snapshot)
+    # Buscas anteriores ao conjunto de vistos: começa pelos ids do snapshot
+    vistos = decodificar_vistos(busca.vistos) if busca.vistos is not None else set(anterior)
+    mudancas = [] if primeira_execucao else diferencas(vistos, anterior, atuais, busca.preco_maximo)
+    for ml_id, tipo, preco_anterior in mudancas:
+        resultado = atuais[ml_id]
+        db.add(EventoBusca(
+            busca_id=busca.id, ml_id=ml_id, tipo=tipo, preco=resultado["preco"], preco_anterior=preco_anterior,
+            titulo=resultado["titulo"], url=resultado["url"], criado_em=agora
+        ))
+        publicar_evento(db, busca.usuario_id, "busca", {
+            "busca_id": busca.id,
+            "consulta": busca.consulta,
+            "ml_id": ml_id,
+            "tipo": tipo,
+            "preco": resultado["preco"],
+            "preco_anterior": preco_anterior,
+            "titulo": resultado["titulo"],
+            "url": resultado["url"]
+        })
+    busca.snapshot = codificar_snapshot({ml_id: resultado["preco"] for ml_id, resultado in atuais.items()})
+    busca.vistos = codificar_vistos(vistos | set(atuais))
+    busca.resultados = sum(1 for resultado in atuais.values() if busca.preco_maximo is None or resultado["preco"] <= busca.preco_maximo)
+    busca.ultima_execucao_em = agora
+    return len(mudancas)
+
+def gravar_execucoes(usuario_id: int, dados_por_busca: Dict[int, dict]) -> int:
+    """Grava em uma transação as execuções das buscas de um usuário"""
+    db: Session = SessionLocal()
+    try:
+        buscas = db.query(BuscaSalva).filter(BuscaSalva.usuario_id == usuario_id, BuscaSalva.id.in_(list(dados_por_busca))).all()
+        agora = datetime.utcnow()
+        eventos = sum(aplicar_execucao(db, busca, dados_por_busca[busca.id], agora) for busca in buscas)
+        db.commit()
+        print(f"🔎 {len(buscas)} buscas salvas executadas para user {usuario_id} ({eventos} novidades)")
+        return eventos
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def executar_buscas(usuario_id: int, buscas: List[Tuple[int, str]]) -> Dict[int, dict]:
+    """Roda as consultas no ML (token e rate limit do usuário); buscas que falharem ficam de fora"""
+    dados_por_busca = {}
+    for busca_id, consulta in buscas:
+        dados = await buscar_produtos_ml(consulta, usuario_id, limit=BUSCA_SALVA_LIMITE)
+        if dados:
+            dados_por_busca[busca_id] = dados
+    return dados_por_busca
+
+def buscas_ativas_por_usuario() -> Dict[int, List[Tuple[int, str]]]:
+    db: Session = SessionLocal()
+    try:
+        por_usuario = {}
+        for busca_id, usuario_id, consulta in db.query(BuscaSalva.id, BuscaSalva.usuario_id, BuscaSalva.consulta).filter(BuscaSalva.ativa == True).order_by(BuscaSalva.id):
+            por_usuario.setdefault(usuario_id, []).append((busca_id, consulta))
+        return por_usuario
+    finally:
+        db.close()
+
+async def executar_e_gravar(usuario_id: int, buscas: List[Tuple[int, str]]) -> int:
+    """Execução fora do scheduler (ex: linha de base logo após criar a busca)"""
+    dados = await executar_buscas(usuario_id, buscas)
+    if not dados:
+        return 0
+    return await asyncio.to_thread(gravar_execucoes, usuario_id, dados)
@@ -1,9 +1,17 @@
 import os
+import time
 import logging
+import threading
+from typing import Optional
 from sqlalchemy import create_engine, text, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import OperationalError, SQLAlchemyError, DisconnectionError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from dotenv import load_dotenv
+from metricas import instrumentar_engine
 
 load_dotenv()
 
@@ -18,27 +26,205 @@ if not DATABASE_URL:
 
 logger.info(f"🔗 Conectando ao banco: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else 'URL_PARCIAL'}")
 
-# Engine com configurações otimizadas
+# Dimensionamento dos pools. O limite de conexões do Postgres é dividido
+# entre todos os processos (workers x réplicas); em cada processo, a parte do
+# engine síncrono (scheduler/scripts) é menor que a do async (rotas) e uma
+# conexão fica reservada para o LISTEN dos eventos e outra para o lock de
+# liderança do scheduler. Réplicas de leitura (replicas.py) são outros
+# servidores, com limite próprio: DB_REPLICA_MAX_CONEXOES por réplica,
+# dividido entre os mesmos processos e todo para o pool async das leituras.
+DB_MAX_CONEXOES = int(os.getenv("DB_MAX_CONEXOES", "40"))
+DB_REPLICA_MAX_CONEXOES = int(os.getenv("DB_REPLICA_MAX_CONEXOES", str(DB_MAX_CONEXOES)))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+APP_REPLICAS = int(os.getenv("APP_REPLICAS", "1"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_PING_APOS_SEGUNDOS = int(os.getenv("DB_PING_APOS_SEGUNDOS", "60"))
+
+def calcular_pools(max_conexoes: int, workers: int, replicas: int, max_conexoes_replica: Optional[int] = None) -> dict:
+    """
+    Retorna {"sync": (pool_size, max_overflow), "async": (...), "replica": (...)}
+    por processo; "replica" é o pool de cada réplica de leitura
+    """
+    processos = max(1, workers * replicas)
+    por_processo = max(4, max_conexoes // processos) - 2  # -2: LISTEN e lock do scheduler
+    conexoes_sync = max(1, por_processo // 4)
+    conexoes_async = max(1, por_processo - conexoes_sync)
+    conexoes_replica = max(2, (max_conexoes if max_conexoes_replica is None else max_conexoes_replica) // processos)
+    return {
+        nome: (max(1, conexoes // 2), conexoes - max(1, conexoes // 2))
+        for nome, conexoes in (("sync", conexoes_sync), ("async", conexoes_async), ("replica", conexoes_replica))
+    }
+
+POOLS = calcular_pools(DB_MAX_CONEXOES, WEB_CONCURRENCY, APP_REPLICAS, DB_REPLICA_MAX_CONEXOES)
+
+class EstatisticasPool:
+    """Tempo de espera e timeouts na retirada de conexões do pool"""
+    def __init__(self):
+        self.retiradas = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self._lock = threading.Lock()
+
+    def registrar(self, espera: float, timeout: bool = False):
+        with self._lock:
+            self.retiradas += 1
+            self.timeouts += int(timeout)
+            self.espera_total += espera
+            self.espera_maxima = max(self.espera_maxima, espera)
+
+class _PoolMedido:
+    """Mede a espera de cada retirada (inclui abrir conexão nova quando preciso)"""
+    def _do_get(self):
+        estatisticas = self.__dict__.setdefault("estatisticas", EstatisticasPool())
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except PoolTimeoutError:
+            estatisticas.registrar(time.perf_counter() - inicio, timeout=True)
+            raise
+        estatisticas.registrar(time.perf_counter() - inicio)
+        return conexao
+
+class QueuePoolMedido(_PoolMedido, QueuePool):
+    pass
+
+class AsyncQueuePoolMedido(_PoolMedido, AsyncAdaptedQueuePool):
+    pass
+
+def configurar_ping(engine_sync):
+    """
+    Pre-ping apenas de conexões paradas há mais de DB_PING_APOS_SEGUNDOS
+    (o pool_pre_ping padrão faria um round-trip em toda retirada). Conexão
+    morta levanta DisconnectionError e o pool tenta com uma nova.
+    """
+    @event.listens_for(engine_sync, "checkin")
+    def marcar_uso(dbapi_connection, connection_record):
+        connection_record.info["ultimo_uso"] = time.monotonic()
+
+    @event.listens_for(engine_sync, "checkout")
+    def ping_se_parada(dbapi_connection, connection_record, connection_proxy):
+        ultimo_uso = connection_record.info.get("ultimo_uso")
+        if ultimo_uso is None or time.monotonic() - ultimo_uso < DB_PING_APOS_SEGUNDOS:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as e:
+            logger.warning(f"⚠️ Conexão parada não respondeu ao ping, descartando: {e}")
+            raise DisconnectionError()
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+def argumentos_pool(url, nome: str) -> dict:
+    """Argumentos de pool do create_engine (apenas PostgreSQL)"""
+    if url.get_backend_name() != "postgresql":
+        return {}
+    pool_size, max_overflow = POOLS[nome]
+    return {
+        "poolclass": QueuePoolMedido if nome == "sync" else AsyncQueuePoolMedido,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
 engine = create_engine(
     DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
     pool_recycle=1800,  # 30 minutos
-    echo=False  # Não fazer log de todas as queries
+    echo=False,  # Não fazer log de todas as queries
+    **argumentos_pool(make_url(DATABASE_URL), "sync")
 )
+configurar_ping(engine)
+instrumentar_engine(engine, "sync")
 
 # Event listener para logs de conexão
 @event.listens_for(engine, "connect")
 def receive_connect(dbapi_connection, connection_record):
     logger.info("✅ Nova conexão estabelecida com o banco")
 
-@event.listens_for(engine, "checkout")
-def receive_checkout(dbapi_connection, connection_record, connection_proxy):
-    logger.debug("🔄 Conexão retirada do pool")
-
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def build_async_url(database_url: str):
+    """
+    Converte a DATABASE_URL síncrona para o driver async (asyncpg).
+    O asyncpg não aceita sslmode na URL: vira connect_args["ssl"].
+    """
+    url = make_url(database_url)
+    connect_args = {}
+    if url.get_backend_name() == "postgresql":
+        query = dict(url.query)
+        sslmode = query.pop("sslmode", None)
+        if sslmode:
+            connect_args["ssl"] = sslmode
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")  # apenas desenvolvimento local
+    return url, connect_args
+
+def url_libpq(database_url: Optional[str]) -> Optional[str]:
+    """
+    URL para as conexões psycopg2 dedicadas (LISTEN dos eventos, lock do
+    scheduler): aceita postgresql+<driver>:// e tira o driver, que a libpq
+    não entende. None quando o banco não é PostgreSQL
+    """
+    if not database_url:
+        return None
+    url = make_url(database_url)
+    if url.get_backend_name() not in ("postgresql", "postgres"):
+        return None
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+# Engine async para as rotas (não bloqueia o event loop). O engine síncrono
+# acima continua sendo usado pelo scheduler e por scripts.
+_async_url, _async_connect_args = build_async_url(DATABASE_URL)
+async_engine = create_async_engine(
+    _async_url,
+    connect_args=_async_connect_args,
+    pool_recycle=1800,
+    echo=False,
+    **argumentos_pool(_async_url, "async")
+)
+configurar_ping(async_engine.sync_engine)
+instrumentar_engine(async_engine.sync_engine, "async")
+
+def estatisticas_pool(engine_sync) -> dict:
+    """Situação atual do pool de um engine (síncrono ou async.sync_engine)"""
+    pool = engine_sync.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__, "status": pool.status()}
+    estatisticas = pool.__dict__.get("estatisticas") or EstatisticasPool()
+    return {
+        "pool": type(pool).__name__,
+        "tamanho": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "em_uso": pool.checkedout(),
+        "livres": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "retiradas": estatisticas.retiradas,
+        "timeouts": estatisticas.timeouts,
+        "espera_media_ms": round(estatisticas.espera_total / estatisticas.retiradas * 1000, 3) if estatisticas.retiradas else 0.0,
+        "espera_maxima_ms": round(estatisticas.espera_maxima * 1000, 3),
+    }
+
+def estatisticas_pools() -> dict:
+    return {
+        "config": {
+            "db_max_conexoes": DB_MAX_CONEXOES,
+            "db_replica_max_conexoes": DB_REPLICA_MAX_CONEXOES,
+            "web_concurrency": WEB_CONCURRENCY,
+            "app_replicas": APP_REPLICAS,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "ping_apos_segundos": DB_PING_APOS_SEGUNDOS,
+        },
+        "sync": estatisticas_pool(engine),
+        "async": estatisticas_pool(async_engine.sync_engine),
+    }
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 def test_database_connection():
     """Testa a conexão com o banco de dados"""
     try:
@@ -79,14 +265,26 @@ def get_database_info():
         logger.error(f"❌ Erro ao obter informações do banco: {e}")
         return None
 
+def executar_migracoes():
+    """Aplica as migrações pendentes do Alembic (alembic upgrade head)"""
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations"))
+    config.attributes["configurar_logging"] = False
+    command.upgrade(config, "head")
+
 def create_tables():
-    """Cria as tabelas se não existirem"""
+    """Cria/atualiza as tabelas (migrações no PostgreSQL, create_all no SQLite local)"""
     try:
-        from models import Base
         logger.info("🔨 Criando/verificando tabelas...")
         
-        # Criar todas as tabelas
-        Base.metadata.create_all(bind=engine)
+        if engine.dialect.name == "postgresql":
+            executar_migracoes()
+        else:
+            from models import Base
+            Base.metadata.create_all(bind=engine)
         
         logger.info("✅ Tabelas criadas/verificadas com sucesso")
         return True
@@ -99,8 +297,6 @@ def get_db():
     """Dependency para obter sessão do banco"""
     db = SessionLocal()
     try:
-        # Teste rápido da sessão usando text()
-        db.execute(text("SELECT 1"))
         yield db
     except OperationalError as e:
         logger.error(f"❌ Erro de conexão com banco na sessão: {e}")
@@ -113,6 +309,20 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Dependency para obter sessão async do banco"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except OperationalError as e:
+            logger.error(f"❌ Erro de conexão com banco na sessão async: {e}")
+            await db.rollback()
+            raise
+        except Exception as e:
+            logger.error(f"❌ Erro inesperado na sessão async: {e}")
+            await db.rollback()
+            raise
+
 def initialize_database():
     """Inicializa o banco de dados completo"""
     logger.info("🚀 Inicializando banco de dados...")
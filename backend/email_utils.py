@@ -1,11 +1,13 @@
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "no-reply@mlmonitor.com.br")
 
 def enviar_alerta_email(destinatario: str, produto_nome: str, preco: float, url: str):
+    # sendgrid importado só no primeiro envio (não pesa no boot do worker)
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Mail
+
     subject = f"[VigIA] Alerta de preço para {produto_nome}"
     content = f"O produto <b>{produto_nome}</b> atingiu o preço desejado: <b>R$ {preco:.2f}</b>.<br>Veja mais: <a href='{url}'>{url}</a>"
     message = Mail(
@@ -0,0 +1,197 @@
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import EstatisticaProduto, HistoricoPrecoDiario, ProdutoMonitorado
+
+EPOCH = datetime(1970, 1, 1)
+
+# Estatísticas de preço por produto mantidas de forma incremental: cada ponto
+# novo de histórico faz um upsert que atualiza mínimo/máximo, média e m2
+# (algoritmo de Welford) e o contador de mudanças. Listagens e alertas leem
+# uma linha por produto em vez de varrer historico_precos.
+# No SET do ON CONFLICT as colunas da tabela ainda têm os valores antigos e
+# "excluded" traz o ponto novo. SQL portável entre PostgreSQL e SQLite.
+SQL_REGISTRAR_PONTO = """
+    INSERT INTO estatisticas_produto (
+        produto_id, pontos, preco_minimo, preco_maximo, preco_medio, m2, ultimo_preco,
+        primeiro_ponto_em, ultimo_ponto_em, ultima_mudanca_em, mudancas, atualizado_em
+    ) VALUES (:produto_id, 1, :preco, :preco, :preco, 0, :preco, :data, :data, NULL, 0, :agora)
+    ON CONFLICT (produto_id) DO UPDATE SET
+        pontos = estatisticas_produto.pontos + 1,
+        preco_minimo = CASE WHEN excluded.ultimo_preco < estatisticas_produto.preco_minimo
+            THEN excluded.ultimo_preco ELSE estatisticas_produto.preco_minimo END,
+        preco_maximo = CASE WHEN excluded.ultimo_preco > estatisticas_produto.preco_maximo
+            THEN excluded.ultimo_preco ELSE estatisticas_produto.preco_maximo END,
+        preco_medio = estatisticas_produto.preco_medio
+            + (excluded.ultimo_preco - estatisticas_produto.preco_medio) / (estatisticas_produto.pontos + 1),
+        m2 = estatisticas_produto.m2
+            + (excluded.ultimo_preco - estatisticas_produto.preco_medio)
+            * (excluded.ultimo_preco - estatisticas_produto.preco_medio
+               - (excluded.ultimo_preco - estatisticas_produto.preco_medio) / (estatisticas_produto.pontos + 1)),
+        mudancas = estatisticas_produto.mudancas
+            + CASE WHEN excluded.ultimo_preco <> estatisticas_produto.ultimo_preco THEN 1 ELSE 0 END,
+        ultima_mudanca_em = CASE WHEN excluded.ultimo_preco <> estatisticas_produto.ultimo_preco
+            THEN excluded.ultimo_ponto_em ELSE estatisticas_produto.ultima_mudanca_em END,
+        ultimo_preco = excluded.ultimo_preco,
+        ultimo_ponto_em = excluded.ultimo_ponto_em,
+        atualizado_em = excluded.atualizado_em
+"""
+
+# Grava o resultado de um recálculo completo (backfill / correção de deriva)
+SQL_GRAVAR_RECALCULO = """
+    INSERT INTO estatisticas_produto (
+        produto_id, pontos, preco_minimo, preco_maximo, preco_medio, m2, ultimo_preco,
+        primeiro_ponto_em, ultimo_ponto_em, ultima_mudanca_em, mudancas, atualizado_em
+    ) VALUES (
+        :produto_id, :pontos, :preco_minimo, :preco_maximo, :preco_medio, :m2, :ultimo_preco,
+        :primeiro_ponto_em, :ultimo_ponto_em, :ultima_mudanca_em, :mudancas, :atualizado_em
+    )
+    ON CONFLICT (produto_id) DO UPDATE SET
+        pontos = excluded.pontos,
+        preco_minimo = excluded.preco_minimo,
+        preco_maximo = excluded.preco_maximo,
+        preco_medio = excluded.preco_medio,
+        m2 = excluded.m2,
+        ultimo_preco = excluded.ultimo_preco,
+        primeiro_ponto_em = excluded.primeiro_ponto_em,
+        ultimo_ponto_em = excluded.ultimo_ponto_em,
+        ultima_mudanca_em = excluded.ultima_mudanca_em,
+        mudancas = excluded.mudancas,
+        atualizado_em = excluded.atualizado_em
+"""
+
+# Menor que os lotes de SQL puro: os pontos do lote inteiro ficam em memória
+RECALCULO_LOTE_PRODUTOS = 100
+
+def registrar_pontos(db: Session, pontos: Iterable[Tuple[int, float, datetime]]):
+    """
+    Aplica os pontos (produto_id, preço, data) às estatísticas (sem commit).
+    Um executemany só; ordenado por produto para que transações concorrentes
+    travem as linhas na mesma ordem
+    """
+    agora = datetime.utcnow()
+    parametros = [
+        {"produto_id": produto_id, "preco": preco, "data": data, "agora": agora}
+        for produto_id, preco, data in sorted(pontos, key=lambda ponto: (ponto[0], ponto[2]))
+        if preco is not None
+    ]
+    if parametros:
+        db.execute(text(SQL_REGISTRAR_PONTO), parametros)
+
+def carregar_estatisticas(db: Session, produto_ids: Iterable[int]) -> Dict[int, EstatisticaProduto]:
+    produto_ids = list(produto_ids)
+    if not produto_ids:
+        return {}
+    return {
+        estatistica.produto_id: estatistica
+        for estatistica in db.execute(select(EstatisticaProduto).where(EstatisticaProduto.produto_id.in_(produto_ids))).scalars()
+    }
+
+def _data_epoch(segundos: float) -> datetime:
+    return EPOCH + timedelta(seconds=float(segundos))
+
+def calcular_recalculo(
+    produto_ids: "np.ndarray",
+    tempos: "np.ndarray",
+    precos: "np.ndarray",
+    diarios: Dict[int, List[HistoricoPrecoDiario]],
+    agora: datetime
+) -> List[dict]:
+    """
+    Estatísticas completas por produto a partir dos pontos individuais (linhas
+    quentes + arquivo frio, ordenados por produto e tempo) e dos dias já
+    consolidados. Contagem, mínimo, máximo e média são exatos; no m2 cada dia
+    consolidado entra como seus pontos no preço médio do dia (a variação dentro
+    do dia se perdeu na consolidação) e mudanças dentro desses dias não são
+    contadas
+    """
+    import numpy as np
+    grupos = {}
+    if len(precos):
+        inicios = np.flatnonzero(np.r_[True, produto_ids[1:] != produto_ids[:-1]])
+        fins = np.r_[inicios[1:], len(precos)]
+        grupos = {int(produto_ids[i]): (i, f) for i, f in zip(inicios, fins)}
+
+    resultados = []
+    for produto_id in sorted(set(grupos) | set(diarios)):
+        inicio, fim = grupos.get(produto_id, (0, 0))
+        serie, instantes = precos[inicio:fim], tempos[inicio:fim]
+        dias = [dia for dia in diarios.get(produto_id, []) if dia.preco_medio is not None and dia.pontos]
+        pesos = np.array([dia.pontos for dia in dias], dtype=np.float64)
+        medias_dia = np.array([dia.preco_medio for dia in dias], dtype=np.float64)
+        pontos = len(serie) + int(pesos.sum())
+        if pontos == 0:
+            continue
+
+        media = (serie.sum() + (pesos * medias_dia).sum()) / pontos
+        m2 = ((serie - media) ** 2).sum() + (pesos * (medias_dia - media) ** 2).sum()
+        minimos = [dia.preco_minimo for dia in dias if dia.preco_minimo is not None]
+        maximos = [dia.preco_maximo for dia in dias if dia.preco_maximo is not None]
+        if len(serie):
+            minimos.append(serie.min())
+            maximos.append(serie.max())
+
+        mudou = np.flatnonzero(serie[1:] != serie[:-1]) + 1
+        if len(serie):
+            ultimo_preco, ultimo_ponto_em = float(serie[-1]), _data_epoch(instantes[-1])
+        else:
+            ultimo_preco, ultimo_ponto_em = dias[-1].preco_medio, datetime.combine(dias[-1].dia, datetime.min.time())
+        primeiros = [_data_epoch(instantes[0])] if len(serie) else []
+        if dias:
+            primeiros.append(datetime.combine(dias[0].dia, datetime.min.time()))
+
+        resultados.append({
+            "produto_id": produto_id,
+            "pontos": pontos,
+            "preco_minimo": float(min(minimos)),
+            "preco_maximo": float(max(maximos)),
+            "preco_medio": float(media),
+            "m2": float(m2),
+            "ultimo_preco": ultimo_preco,
+            "primeiro_ponto_em": min(primeiros),
+            "ultimo_ponto_em": ultimo_ponto_em,
+            "ultima_mudanca_em": _data_epoch(instantes[mudou[-1]]) if len(mudou) else None,
+            "mudancas": len(mudou),
+            "atualizado_em": agora,
+        })
+    return resultados
+
+def recalcular_estatisticas(produto_ids: Optional[List[int]] = None, lote: int = RECALCULO_LOTE_PRODUTOS) -> int:
+    """
+    Backfill: recalcula as estatísticas a partir de todas as camadas do
+    histórico (linhas quentes, arquivo frio e dias consolidados), em lotes de
+    produtos (uma transação por lote)
+    """
+    from analise_precos import carregar_series
+    db: Session = SessionLocal()
+    try:
+        if produto_ids is None:
+            produto_ids = [produto_id for (produto_id,) in db.query(ProdutoMonitorado.id).order_by(ProdutoMonitorado.id)]
+        for i in range(0, len(produto_ids), lote):
+            ids_lote = produto_ids[i:i + lote]
+            ids, tempos, precos = carregar_series(db, ids_lote, EPOCH)
+            diarios: Dict[int, List[HistoricoPrecoDiario]] = {}
+            for dia in db.execute(
+                select(HistoricoPrecoDiario)
+                .where(HistoricoPrecoDiario.produto_id.in_(ids_lote))
+                .order_by(HistoricoPrecoDiario.produto_id, HistoricoPrecoDiario.dia)
+            ).scalars():
+                diarios.setdefault(dia.produto_id, []).append(dia)
+            resultados = calcular_recalculo(ids, tempos, precos, diarios, datetime.utcnow())
+            if resultados:
+                db.execute(text(SQL_GRAVAR_RECALCULO), resultados)
+            db.commit()
+        return len(produto_ids)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    # python estatisticas.py [produto_id ...]
+    ids = [int(argumento) for argumento in sys.argv[1:]] or None
+    print(f"📊 Estatísticas recalculadas para {recalcular_estatisticas(ids)} produtos")
@@ -0,0 +1,148 @@
+import os
+import json
+import select
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Eventos ao vivo (preço/estoque/alertas) para as conexões SSE dos usuários.
+# O fan-out entre workers usa LISTEN/NOTIFY do PostgreSQL: quem grava publica
+# com pg_notify dentro da transação (só é entregue no commit) e cada worker
+# mantém uma conexão LISTEN que repassa os eventos aos assinantes locais.
+CANAL_EVENTOS = "vigia_eventos"
+HEARTBEAT_SEGUNDOS = int(os.getenv("EVENTOS_HEARTBEAT_SEGUNDOS", "15"))
+FILA_MAXIMA_POR_CONEXAO = int(os.getenv("EVENTOS_FILA_MAXIMA", "100"))
+
+class DistribuidorEventos:
+    """Fan-out dos eventos para as filas das conexões abertas neste worker"""
+    def __init__(self):
+        self._assinantes: Dict[int, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def configurar_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def assinar(self, usuario_id: int) -> asyncio.Queue:
+        fila = asyncio.Queue(maxsize=FILA_MAXIMA_POR_CONEXAO)
+        self._assinantes.setdefault(usuario_id, set()).add(fila)
+        return fila
+
+    def cancelar(self, usuario_id: int, fila: asyncio.Queue):
+        filas = self._assinantes.get(usuario_id)
+        if filas:
+            filas.discard(fila)
+            if not filas:
+                del self._assinantes[usuario_id]
+
+    @property
+    def total_conexoes(self) -> int:
+        return sum(len(filas) for filas in self._assinantes.values())
+
+    def entregar(self, evento: dict):
+        """Entrega um evento às conexões do usuário (executa no event loop)"""
+        for fila in list(self._assinantes.get(evento.get("usuario_id"), ())):
+            try:
+                fila.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Cliente lento: descarta o atraso acumulado e pede para
+                # recarregar o estado via REST em vez de bloquear o fan-out
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait({"usuario_id": evento["usuario_id"], "tipo": "resync", "dados": {}})
+
+    def entregar_threadsafe(self, payload: str):
+        """Chamado pela thread do LISTEN: agenda a entrega no event loop"""
+        if self._loop is None:
+            return
+        try:
+            evento = json.loads(payload)
+        except ValueError:
+            logger.warning(f"⚠️ Evento inválido ignorado: {payload[:100]}")
+            return
+        self._loop.call_soon_threadsafe(self.entregar, evento)
+
+distribuidor = DistribuidorEventos()
+
+def publicar_evento(db: Session, usuario_id: int, tipo: str, dados: dict):
+    """Publica um evento; no PostgreSQL só é entregue quando a transação fizer commit"""
+    payload = json.dumps({"usuario_id": usuario_id, "tipo": tipo, "dados": dados}, default=str)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:canal, :payload)"), {"canal": CANAL_EVENTOS, "payload": payload})
+    else:
+        # Sem NOTIFY (ex: SQLite local) a entrega é direta, apenas neste processo
+        distribuidor.entregar_threadsafe(payload)
+
+class OuvinteEventos(threading.Thread):
+    """Thread com conexão dedicada em LISTEN, reconectando em caso de falha"""
+    def __init__(self, database_url: str):
+        super().__init__(name="vigia-eventos", daemon=True)
+        self.database_url = database_url
+        self._parar = threading.Event()
+
+    def parar(self):
+        self._parar.set()
+
+    def run(self):
+        import psycopg2
+        import psycopg2.extensions
+        from indice_alertas import CANAL_ALERTAS, indice_alertas
+
+        while not self._parar.is_set():
+            conexao = None
+            try:
+                conexao = psycopg2.connect(self.database_url)
+                conexao.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conexao.cursor().execute(f"LISTEN {CANAL_EVENTOS}; LISTEN {CANAL_ALERTAS}")
+                # Mudanças de alertas podem ter sido perdidas enquanto desconectado:
+                # o índice é reconstruído no próximo uso
+                indice_alertas.invalidar()
+                indice_alertas.sincronizado = True
+                logger.info(f"📡 Ouvindo eventos nos canais {CANAL_EVENTOS} e {CANAL_ALERTAS}")
+                while not self._parar.is_set():
+                    if select.select([conexao], [], [], 5) == ([], [], []):
+                        continue
+                    conexao.poll()
+                    while conexao.notifies:
+                        notificacao = conexao.notifies.pop(0)
+                        if notificacao.channel == CANAL_ALERTAS:
+                            indice_alertas.aplicar_payload(notificacao.payload)
+                        else:
+                            distribuidor.entregar_threadsafe(notificacao.payload)
+            except Exception as e:
+                logger.error(f"❌ Erro no ouvinte de eventos: {e} - reconectando em 5s")
+                self._parar.wait(5)
+            finally:
+                indice_alertas.sincronizado = False
+                if conexao is not None:
+                    conexao.close()
+
+_ouvinte: Optional[OuvinteEventos] = None
+
+def iniciar_eventos(database_url: Optional[str]):
+    """Liga o distribuidor ao event loop atual e inicia o LISTEN (PostgreSQL)"""
+    global _ouvinte
+    from database import url_libpq
+    distribuidor.configurar_loop(asyncio.get_running_loop())
+    # Mesmo critério de publicar_evento/publicar_mudanca_alerta (dialeto do
+    # engine): com postgresql+psycopg2:// também há NOTIFY e precisa de LISTEN
+    url_listen = url_libpq(database_url)
+    if url_listen:
+        # sincronizado só vira True quando o LISTEN conectar (OuvinteEventos.run)
+        if _ouvinte is None:
+            _ouvinte = OuvinteEventos(url_listen)
+            _ouvinte.start()
+    else:
+        # Sem NOTIFY: um processo só, o índice de alertas local é sempre a verdade
+        from indice_alertas import indice_alertas
+        indice_alertas.sincronizado = True
+
+def parar_eventos():
+    global _ouvinte
+    if _ouvinte is not None:
+        _ouvinte.parar()
+        _ouvinte = None
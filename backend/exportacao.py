@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, List, Optional
+from sqlalchemy import select
+from replicas import abrir_sessao_leitura
+from models import ProdutoMonitorado, HistoricoPreco
+from arquivo_historico import consulta_arquivos, pontos_arquivados
+
+TAMANHO_LOTE_EXPORTACAO = 2000  # Linhas por lote lidas do cursor no servidor
+PRODUTOS_POR_LOTE_EXPORTACAO = 100  # Produtos cujos blobs arquivados ficam em memória de cada vez
+COLUNAS_EXPORTACAO = ["produto_id", "ml_id", "data", "preco", "estoque"]
+
+def _formatar_csv(linhas) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for produto_id, ml_id, data, preco, estoque in linhas:
+        writer.writerow([produto_id, ml_id, data.isoformat() if data else "", preco, estoque])
+    return buffer.getvalue()
+
+def _formatar_ndjson(linhas) -> str:
+    return "".join(
+        json.dumps({
+            "produto_id": produto_id,
+            "ml_id": ml_id,
+            "data": data.isoformat() if data else None,
+            "preco": preco,
+            "estoque": estoque
+        }) + "\n"
+        for produto_id, ml_id, data, preco, estoque in linhas
+    )
+
+async def gerar_exportacao_historico(usuario_id: int, produto_ids: Optional[List[int]], formato: str, comprimir: bool) -> AsyncIterator[bytes]:
+    """
+    Gera o histórico de preços do usuário em blocos de bytes (CSV ou NDJSON),
+    lendo por cursor no servidor (yield_per, de uma réplica quando configurada)
+    e comprimindo em gzip sob demanda.
+    A memória usada é limitada a um lote (e aos pontos arquivados de um lote
+    de produtos), independente do tamanho da exportação. Os pontos do arquivo
+    frio entram antes das linhas quentes de cada produto, mantendo a ordem
+    (produto, data).
+    """
+    formatar = _formatar_csv if formato == "csv" else _formatar_ndjson
+    compressor = zlib.compressobj(wbits=31) if comprimir else None  # wbits=31 -> formato gzip
+
+    def saida(texto: str) -> bytes:
+        dados = texto.encode("utf-8")
+        return compressor.compress(dados) if compressor else dados
+
+    async with abrir_sessao_leitura(usuario_id) as db:
+        consulta_produtos = (
+            select(ProdutoMonitorado.id, ProdutoMonitorado.ml_id)
+            .where(ProdutoMonitorado.usuario_id == usuario_id)
+            .order_by(ProdutoMonitorado.id)
+        )
+        if produto_ids:
+            consulta_produtos = consulta_produtos.where(ProdutoMonitorado.id.in_(produto_ids))
+        produtos = (await db.execute(consulta_produtos)).all()
+
+        if formato == "csv":
+            bloco = saida(",".join(COLUNAS_EXPORTACAO) + "\n")
+            if bloco:
+                yield bloco
+        for i in range(0, len(produtos), PRODUTOS_POR_LOTE_EXPORTACAO):
+            ml_id_por_produto = dict(produtos[i:i + PRODUTOS_POR_LOTE_EXPORTACAO])
+            arquivados = pontos_arquivados((await db.execute(consulta_arquivos(ml_id_por_produto))).all())
+            pendentes = sorted(arquivados, reverse=True)
+
+            def linhas_arquivadas(ate: int) -> list:
+                linhas = []
+                while pendentes and pendentes[-1] <= ate:
+                    produto_id = pendentes.pop()
+                    linhas.extend((produto_id, ml_id_por_produto[produto_id], data, preco, estoque) for _, data, preco, estoque in arquivados.pop(produto_id))
+                return linhas
+
+            consulta = (
+                select(HistoricoPreco.produto_id, HistoricoPreco.data, HistoricoPreco.preco, HistoricoPreco.estoque)
+                .where(HistoricoPreco.produto_id.in_(list(ml_id_por_produto)))
+                .order_by(HistoricoPreco.produto_id, HistoricoPreco.data)
+                .execution_options(yield_per=TAMANHO_LOTE_EXPORTACAO)
+            )
+            resultado = await db.stream(consulta)
+            async for lote in resultado.partitions():
+                linhas = []
+                for produto_id, data, preco, estoque in lote:
+                    if pendentes and pendentes[-1] <= produto_id:
+                        linhas.extend(linhas_arquivadas(produto_id))
+                    linhas.append((produto_id, ml_id_por_produto[produto_id], data, preco, estoque))
+                bloco = saida(formatar(linhas))
+                if bloco:
+                    yield bloco
+            restantes = linhas_arquivadas(float("inf"))
+            if restantes:
+                bloco = saida(formatar(restantes))
+                if bloco:
+                    yield bloco
+        if compressor:
+            yield compressor.flush()
@@ -0,0 +1,51 @@
+import hashlib
+from fastapi import Request, Response
+from metricas import cache_consultas
+
+# ETags fortes derivadas de marcadores de versão baratos (contagens, maior id,
+# maior timestamp) calculados antes de montar a resposta
+
+def gerar_etag(*partes) -> str:
+    """ETag forte a partir dos marcadores de versão do recurso"""
+    return '"' + hashlib.sha1("|".join(str(parte) for parte in partes).encode("utf-8")).hexdigest() + '"'
+
+def etag_corresponde(request: Request, etag: str) -> bool:
+    """Verifica If-None-Match (comparação fraca, conforme RFC 9110)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidatas = [candidata.strip().removeprefix("W/") for candidata in if_none_match.split(",")]
+    corresponde = if_none_match.strip() == "*" or etag in candidatas
+    cache_consultas.inc("etag", "acerto" if corresponde else "falha")
+    return corresponde
+
+def aplicar_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    # Cache privado que sempre revalida: o polling vira um 304 barato
+    response.headers["Cache-Control"] = "private, no-cache"
+
+def resposta_nao_modificada(etag: str) -> Response:
+    response = Response(status_code=304)
+    aplicar_etag(response, etag)
+    return response
+
+def aceita_codificacao(request: Request, codificacao: str) -> bool:
+    """
+    Accept-Encoding com q-values (RFC 9110): "gzip;q=0" recusa e "*" vale
+    para codificações não listadas
+    """
+    pesos = {}
+    for item in request.headers.get("accept-encoding", "").lower().split(","):
+        nome, *parametros = [parte.strip() for parte in item.split(";")]
+        if not nome:
+            continue
+        peso = 1.0
+        for parametro in parametros:
+            chave, _, valor = parametro.partition("=")
+            if chave.strip() == "q":
+                try:
+                    peso = float(valor)
+                except ValueError:
+                    peso = 0.0
+        pesos[nome] = peso
+    return pesos.get(codificacao, pesos.get("*", 0.0)) > 0
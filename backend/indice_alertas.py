@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Índice em memória dos alertas de preço alvo pendentes. Por produto, dois
+# arrays paralelos ordenados pelo limiar (array('d') + array('q'): 16 bytes
+# por alerta, sem objeto Python por alerta). Um preço novo dispara todos os
+# alertas com limiar >= preço: um bisect e uma fatia.
+#
+# Sincronização entre workers: criação, remoção e envio publicam no canal
+# CANAL_ALERTAS (pg_notify dentro da transação, entregue no commit) e o
+# ouvinte de eventos de cada worker aplica a mudança. Enquanto o LISTEN não
+# está conectado o índice não é usado (volta para a consulta ao banco) e, ao
+# reconectar, é reconstruído, porque notificações podem ter sido perdidas.
+CANAL_ALERTAS = "vigia_alertas"
+INDICE_ALERTAS_HABILITADO = os.getenv("INDICE_ALERTAS_HABILITADO", "1") == "1"
+INDICE_ALERTAS_RECONSTRUIR_MINUTOS = float(os.getenv("INDICE_ALERTAS_RECONSTRUIR_MINUTOS", "60"))
+
+SQL_ALERTAS_PENDENTES = """
+    SELECT id, produto_id, preco_alvo FROM alertas
+    WHERE enviado = false AND tipo = 'preco_alvo' AND preco_alvo IS NOT NULL
+    ORDER BY produto_id, preco_alvo, id
+"""
+
+# Mudanças ainda não confirmadas da sessão (caminho sem NOTIFY), em Session.info
+CHAVE_MUDANCAS_PENDENTES = "vigia_mudancas_alertas"
+
+Linha = Tuple[int, int, float]  # (alerta_id, produto_id, limiar)
+
+class IndiceAlertas:
+    def __init__(self):
+        self._limiares: Dict[int, array] = {}
+        self._ids: Dict[int, array] = {}
+        self._lock = threading.RLock()
+        self._carregado_em: Optional[float] = None
+        self._reconstruindo = False
+        self._pendentes: List[dict] = []  # mudanças recebidas durante a reconstrução
+        self.sincronizado = False  # LISTEN ativo neste processo (ou banco sem NOTIFY)
+
+    # --- consulta ---
+    def disparados(self, produto_id: int, preco: float) -> List[int]:
+        """Ids dos alertas com preço alvo >= preço"""
+        with self._lock:
+            limiares = self._limiares.get(produto_id)
+            if not limiares:
+                return []
+            return self._ids[produto_id][bisect_left(limiares, preco):].tolist()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(ids) for ids in self._ids.values())
+
+    @property
+    def carregado(self) -> bool:
+        return self._carregado_em is not None
+
+    def disponivel(self) -> bool:
+        return INDICE_ALERTAS_HABILITADO and self.sincronizado
+
+    # --- manutenção incremental ---
+    def adicionar(self, alerta_id: int, produto_id: int, limiar: float):
+        """Idempotente: o mesmo alerta pode chegar pela reconstrução e pela notificação"""
+        with self._lock:
+            limiares = self._limiares.get(produto_id)
+            if limiares is None:
+                self._limiares[produto_id] = array("d", [limiar])
+                self._ids[produto_id] = array("q", [alerta_id])
+                return
+            ids = self._ids[produto_id]
+            inicio, fim = bisect_left(limiares, limiar), bisect_right(limiares, limiar)
+            if alerta_id in ids[inicio:fim]:
+                return
+            limiares.insert(fim, limiar)
+            ids.insert(fim, alerta_id)
+
+    def remover(self, alerta_id: int, produto_id: int, limiar: Optional[float] = None):
+        with self._lock:
+            limiares = self._limiares.get(produto_id)
+            if limiares is None:
+                return
+            ids = self._ids[produto_id]
+            if limiar is not None:
+                inicio, fim = bisect_left(limiares, limiar), bisect_right(limiares, limiar)
+            else:
+                inicio, fim = 0, len(ids)
+            for posicao in range(inicio, fim):
+                if ids[posicao] == alerta_id:
+                    del limiares[posicao]
+                    del ids[posicao]
+                    break
+            if not ids:
+                del self._limiares[produto_id]
+                del self._ids[produto_id]
+
+    def remover_produto(self, produto_id: int):
+        with self._lock:
+            self._limiares.pop(produto_id, None)
+            self._ids.pop(produto_id, None)
+
+    def aplicar(self, mudanca: dict):
+        # Tudo sob o lock: uma carga não pode começar entre a checagem e a aplicação
+        with self._lock:
+            if self._reconstruindo:
+                self._pendentes.append(mudanca)
+                return
+            operacao = mudanca.get("op")
+            if operacao == "adicionar":
+                self.adicionar(mudanca["alerta_id"], mudanca["produto_id"], mudanca["limiar"])
+            elif operacao == "remover":
+                self.remover(mudanca["alerta_id"], mudanca["produto_id"], mudanca.get("limiar"))
+            elif operacao == "remover_produto":
+                self.remover_produto(mudanca["produto_id"])
+
+    def aplicar_payload(self, payload: str):
+        """Chamado pela thread do LISTEN"""
+        try:
+            self.aplicar(json.loads(payload))
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"⚠️ Mudança de alerta inválida ignorada: {payload[:100]}")
+
+    # --- reconstrução ---
+    def carregar(self, linhas: Union[Iterable[Linha], Callable[[], Iterable[Linha]]]) -> int:
+        """
+        Substitui o conteúdo por (alerta_id, produto_id, limiar) já ordenados
+        por produto e limiar: os arrays saem prontos, sem sort. Mudanças
+        notificadas durante a carga são reaplicadas no final. `linhas` pode
+        ser uma função (ex: a consulta ao banco), chamada só depois que as
+        mudanças passam a ser guardadas: nada notificado entre o snapshot e
+        a troca dos arrays se perde
+        """
+        with self._lock:
+            self._reconstruindo = True
+            self._pendentes = []
+        try:
+            if callable(linhas):
+                linhas = linhas()
+            limiares: Dict[int, array] = {}
+            ids: Dict[int, array] = {}
+            produto_atual, limiares_produto, ids_produto = None, None, None
+            for alerta_id, produto_id, limiar in linhas:
+                if produto_id != produto_atual:
+                    produto_atual = produto_id
+                    limiares_produto = limiares[produto_id] = array("d")
+                    ids_produto = ids[produto_id] = array("q")
+                limiares_produto.append(limiar)
+                ids_produto.append(alerta_id)
+        except Exception:
+            with self._lock:
+                self._reconstruindo = False
+                self._pendentes = []
+            raise
+        with self._lock:
+            self._limiares, self._ids = limiares, ids
+            self._carregado_em = time.monotonic()
+            self._reconstruindo = False
+            pendentes, self._pendentes = self._pendentes, []
+            for mudanca in pendentes:
+                self.aplicar(mudanca)
+            return sum(len(lista) for lista in self._ids.values())
+
+    def reconstruir(self, connection) -> int:
+        """Recarrega todos os alertas pendentes do banco (consulta em streaming)"""
+        return self.carregar(
+            lambda: connection.execution_options(stream_results=True, yield_per=10000).execute(text(SQL_ALERTAS_PENDENTES))
+        )
+
+    def invalidar(self):
+        with self._lock:
+            self._carregado_em = None
+
+    def precisa_reconstruir(self) -> bool:
+        return self._carregado_em is None or time.monotonic() - self._carregado_em > INDICE_ALERTAS_RECONSTRUIR_MINUTOS * 60
+
+indice_alertas = IndiceAlertas()
+_lock_reconstrucao = threading.Lock()
+
+def garantir_indice(db: Session) -> bool:
+    """
+    Índice pronto para uso neste processo? Reconstrói quando ainda não foi
+    carregado ou está velho (INDICE_ALERTAS_RECONSTRUIR_MINUTOS, contra deriva)
+    """
+    if not indice_alertas.disponivel():
+        return False
+    if indice_alertas.precisa_reconstruir():
+        with _lock_reconstrucao:
+            if indice_alertas.precisa_reconstruir():
+                inicio = time.perf_counter()
+                with db.get_bind().connect() as connection:
+                    total = indice_alertas.reconstruir(connection)
+                logger.info(f"🔔 Índice de alertas carregado: {total} alertas em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    return True
+
+def publicar_mudanca_alerta(db: Session, mudanca: dict):
+    """Publica a mudança para os índices de todos os workers (entregue no commit)"""
+    payload = json.dumps(mudanca)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:canal, :payload)"), {"canal": CANAL_ALERTAS, "payload": payload})
+    else:
+        # Sem NOTIFY (ex: SQLite local) o índice é só deste processo; como o
+        # NOTIFY, a mudança só vale no commit (rollback não deixa alerta fantasma)
+        db.info.setdefault(CHAVE_MUDANCAS_PENDENTES, []).append(mudanca)
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_mudancas_do_commit(session):
+    for mudanca in session.info.pop(CHAVE_MUDANCAS_PENDENTES, []):
+        indice_alertas.aplicar(mudanca)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_mudancas_do_rollback(session):
+    session.info.pop(CHAVE_MUDANCAS_PENDENTES, None)
+
+def alerta_criado(db: Session, alerta) -> None:
+    if alerta.tipo == "preco_alvo" and alerta.preco_alvo is not None:
+        publicar_mudanca_alerta(db, {"op": "adicionar", "alerta_id": alerta.id, "produto_id": alerta.produto_id, "limiar": alerta.preco_alvo})
+
+def alerta_removido(db: Session, alerta) -> None:
+    """Remoção ou envio: o alerta deixa de estar pendente"""
+    if alerta.tipo == "preco_alvo" and alerta.preco_alvo is not None:
+        publicar_mudanca_alerta(db, {"op": "remover", "alerta_id": alerta.id, "produto_id": alerta.produto_id, "limiar": alerta.preco_alvo})
+
+def produto_removido(db: Session, produto_id: int) -> None:
+    publicar_mudanca_alerta(db, {"op": "remover_produto", "produto_id": produto_id})
@@ -1,28 +1,20 @@
 import os
 import sys
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 import uvicorn
 from datetime import datetime, timezone
 import logging
-from database import initialize_database
-import requests
-
-# 🚨 CONFIGURAÇÃO GLOBAL DO REQUESTS - GARANTIR QUE NÃO HÁ HEADERS PADRÃO
-# Limpar qualquer configuração global que possa interferir
-requests.adapters.DEFAULT_RETRIES = 0  # Desabilitar retries automáticos
-
-# Verificar se não há sessão global configurada
-print("🔧 STARTUP: Verificando configuração global do requests...")
-default_session = requests.Session()
-print(f"🔧 STARTUP: Headers padrão da sessão: {dict(default_session.headers)}")
-if default_session.headers:
-    print("⚠️ STARTUP: Limpando headers padrão da sessão global...")
-    default_session.headers.clear()
-print("✅ STARTUP: Sessão requests limpa")
+from database import create_tables, estatisticas_pools, engine, async_engine
+from metricas import MiddlewareMetricas, METRICAS_TOKEN, registro, registrar_medidores_aplicacao
+from perfis import MiddlewarePerfil
+from replicas import MiddlewareLeituraAposEscrita
+from auth import get_current_admin
+from sqlalchemy import text
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -38,7 +30,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="VigIA Backend", 
     version="1.0.0",
-    description="API para monitoramento de preços do Mercado Livre"
+    description="API para monitoramento de preços do Mercado Livre",
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS
@@ -57,6 +50,43 @@ app.add_middleware(
     max_age=600
 )
 
+# Compressão negociada pelo Accept-Encoding: brotli quando disponível, senão gzip
+COMPRESSAO_TAMANHO_MINIMO = int(os.getenv("COMPRESSAO_TAMANHO_MINIMO", "1024"))
+# Respostas em streaming ficam fora da compressão para o progresso não ficar
+# preso no buffer: SSE e o NDJSON de /produtos/atualizar (o fallback gzip do
+# Starlette só envia os bytes comprimidos no final). A exportação comprime
+# sozinha, respeitando os q-values do Accept-Encoding
+ROTAS_SEM_COMPRESSAO = ["^/eventos/", "^/produtos/atualizar$", "^/historico/export$"]
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, quality=4, minimum_size=COMPRESSAO_TAMANHO_MINIMO, gzip_fallback=True, excluded_handlers=ROTAS_SEM_COMPRESSAO)
+except ImportError:
+    import re
+    from starlette.middleware.gzip import GZipMiddleware
+
+    class GZipMiddlewareComExclusoes(GZipMiddleware):
+        def __init__(self, app, excluded_handlers=(), **kwargs):
+            super().__init__(app, **kwargs)
+            self.excluidas = [re.compile(padrao) for padrao in excluded_handlers]
+
+        async def __call__(self, scope, receive, send):
+            if scope["type"] == "http" and any(padrao.search(scope["path"]) for padrao in self.excluidas):
+                await self.app(scope, receive, send)
+                return
+            await super().__call__(scope, receive, send)
+
+    app.add_middleware(GZipMiddlewareComExclusoes, minimum_size=COMPRESSAO_TAMANHO_MINIMO, excluded_handlers=ROTAS_SEM_COMPRESSAO)
+
+# Read-your-writes entre workers: cookie/header com o horário do último commit
+app.add_middleware(MiddlewareLeituraAposEscrita)
+
+# Profiler sob demanda (admin + X-Perfil: 1); fora do caminho quando não pedido
+app.add_middleware(MiddlewarePerfil)
+
+# Latência/status/bytes por rota. Adicionado por último = mais externo: mede a
+# requisição inteira e o tamanho da resposta já comprimida
+app.add_middleware(MiddlewareMetricas)
+
 # Event handlers
 @app.on_event("startup")
 async def startup_event():
@@ -68,28 +98,43 @@ async def startup_event():
     database_url = os.getenv('DATABASE_URL')
     ml_client_id = os.getenv('ML_CLIENT_ID')
     
-    # Inicializar banco de dados
-    if database_url:
-        logger.info("🗄️ Iniciando configuração do banco de dados...")
-        db_success = initialize_database()
-        
-        logger.info("🗄️ Database Status:")
-        logger.info(f"  - Configurado: {'✅' if database_url else '❌'}")
-        logger.info(f"  - Engine: {'✅' if db_success else '❌'}")
-        logger.info(f"  - Conexão: {'✅' if db_success else '❌'}")
-        logger.info(f"  - Tabelas: {'✅' if db_success else '❌'}")
-        logger.info(f"  - Tipo: postgresql")
-        
-        if not db_success:
-            logger.warning("⚠️ Banco configurado mas com problemas - algumas funcionalidades podem falhar")
-    else:
+    # Schema: no PostgreSQL as migrações rodam no deploy (alembic upgrade head,
+    # preDeployCommand do Railway), não a cada boot. SQLite local usa create_all.
+    if not database_url:
         logger.error("❌ DATABASE_URL não configurada - funcionalidades de banco não estarão disponíveis")
+    elif engine.dialect.name != "postgresql" or os.getenv("DB_MIGRAR_NA_INICIALIZACAO") == "1":
+        logger.info("🗄️ Criando/migrando tabelas na inicialização...")
+        await run_in_threadpool(create_tables)
     
     logger.info(f"🛒 ML Client: {'✅ Configurado' if ml_client_id else '❌ NÃO CONFIGURADO'}")
     
+    # Fan-out dos eventos ao vivo (LISTEN/NOTIFY)
+    from eventos import iniciar_eventos
+    iniciar_eventos(database_url)
+    
+    # Verificação de saúde das réplicas de leitura (DATABASE_REPLICA_URLS)
+    from replicas import iniciar_replicas
+    iniciar_replicas()
+    
+    # Medidores de pool, cache de identidade e conexões SSE em /metrics
+    registrar_medidores_aplicacao()
+    
+    # Jobs periódicos: só o worker líder (advisory lock) executa (SCHEDULER_MODO)
+    from scheduler import iniciar_scheduler
+    iniciar_scheduler(database_url)
+    
     if not database_url:
         logger.warning("⚠️ DATABASE_URL não configurada - algumas funcionalidades podem não funcionar")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    from eventos import parar_eventos
+    from replicas import parar_replicas
+    from scheduler import parar_scheduler
+    parar_eventos()
+    parar_replicas()
+    parar_scheduler()
+
 # Importar e incluir rotas (com tratamento de erro)
 try:
     from routers import router
@@ -167,9 +212,14 @@ def root():
 async def health():
     """Endpoint de verificação de saúde"""
     try:
-        # Verificar conexão com banco
-        from database import test_database_connection
-        database_status = "ok" if test_database_connection() else "error"
+        # Verificar conexão com banco (engine async: não bloqueia o event loop)
+        try:
+            async with async_engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            database_status = "ok"
+        except Exception as e:
+            logger.error(f"❌ Banco indisponível no health check: {e}")
+            database_status = "error"
         
         return {
             "status": "ok",
@@ -211,6 +261,32 @@ def debug_info():
         }
     }
 
+@app.get("/debug/pool", summary="Situação dos pools de conexão do banco", dependencies=[Depends(get_current_admin)])
+def debug_pool():
+    """
+    Conexões em uso/livres, overflow, espera na retirada e timeouts dos pools
+    deste worker (para dimensionar DB_MAX_CONEXOES e DB_REPLICA_MAX_CONEXOES) e a saúde
+    das réplicas de leitura. Apenas administradores
+    """
+    from replicas import roteador
+    return {**estatisticas_pools(), "replicas": roteador.status()}
+
+@app.get("/debug/scheduler", summary="Liderança e jobs do scheduler neste worker", dependencies=[Depends(get_current_admin)])
+def debug_scheduler():
+    """Modo, pid, liderança e próximas execuções. Apenas administradores"""
+    from scheduler import status_scheduler
+    return status_scheduler()
+
+@app.get("/metrics", summary="Métricas no formato Prometheus", include_in_schema=False)
+def metrics(request: Request):
+    """
+    Métricas deste worker (cada processo mantém as suas; o Prometheus agrega
+    por instância). Com METRICAS_TOKEN definido, exige Authorization: Bearer
+    """
+    if METRICAS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICAS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return PlainTextResponse(registro.renderizar(), media_type="text/plain; version=0.0.4")
+
 # Para execução local
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
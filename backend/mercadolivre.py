@@ -1,12 +1,17 @@
 import os
-import httpx
+import re
+import time
+import asyncio
+import threading
 import base64
 import hashlib
 import secrets
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, List, Dict
 from urllib.parse import urlencode
 
+# httpx é importado dentro das funções: só carrega na primeira chamada ao ML,
+# não no boot do worker
 ML_API_URL = "https://api.mercadolibre.com"
 ML_CLIENT_ID = os.getenv("ML_CLIENT_ID")
 ML_CLIENT_SECRET = os.getenv("ML_CLIENT_SECRET")
@@ -16,6 +21,64 @@ ML_REDIRECT_URI = os.getenv("ML_REDIRECT_URI", "https://vigia-meli.vercel.app/ap
 ml_tokens = {}
 pkce_store = {}
 
+class MLRateLimiter:
+    """
+    Token bucket compartilhado por todas as chamadas à API do ML no processo
+    (rotas e scheduler). Thread-safe: o scheduler roda em outra thread e em
+    outro event loop, por isso não usa asyncio.Semaphore.
+    """
+    def __init__(self, taxa_por_segundo: float, capacidade: int):
+        self.taxa = taxa_por_segundo
+        self.capacidade = capacidade
+        self._tokens = float(capacidade)
+        self._atualizado = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reservar(self) -> float:
+        """Reserva um token e retorna quantos segundos esperar por ele"""
+        with self._lock:
+            agora = time.monotonic()
+            self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.taxa
+    
+    async def acquire(self):
+        espera = self._reservar()
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+ml_rate_limiter = MLRateLimiter(
+    taxa_por_segundo=float(os.getenv("ML_RATE_LIMIT_POR_SEGUNDO", "10")),
+    capacidade=int(os.getenv("ML_RATE_LIMIT_BURST", "20"))
+)
+
+_transporte_medido = None
+
+def cliente_ml(**kwargs):
+    """
+    httpx.AsyncClient cujo transporte registra endpoint, status e latência de
+    cada chamada ao ML nas métricas (erros de rede contam como status "erro")
+    """
+    import httpx
+    from metricas import registrar_chamada_ml
+    global _transporte_medido
+    if _transporte_medido is None:
+        class TransporteMedido(httpx.AsyncHTTPTransport):
+            async def handle_async_request(self, request):
+                inicio = time.perf_counter()
+                try:
+                    response = await super().handle_async_request(request)
+                except Exception:
+                    registrar_chamada_ml(request.url.path, "erro", time.perf_counter() - inicio)
+                    raise
+                registrar_chamada_ml(request.url.path, str(response.status_code), time.perf_counter() - inicio)
+                return response
+        _transporte_medido = TransporteMedido
+    return httpx.AsyncClient(transport=_transporte_medido(), **kwargs)
+
 class MLTokenManager:
     @staticmethod
     def save_token(user_id: int, token_data: dict):
@@ -176,6 +239,7 @@ async def exchange_code_for_token(code: str, state: str = None) -> dict:
     Troca o código OAuth por token de acesso com PKCE
     Conforme: https://developers.mercadolivre.com.br/pt_br/autenticacao-e-autorizacao
     """
+    import httpx
     token_url = f"{ML_API_URL}/oauth/token"
     
     code_verifier = None
@@ -203,7 +267,7 @@ async def exchange_code_for_token(code: str, state: str = None) -> dict:
     
     print(f"🔄 [ML 2025] Trocando código OAuth por token...")
     
-    async with httpx.AsyncClient() as client:
+    async with cliente_ml() as client:
         try:
             response = await client.post(token_url, data=data, timeout=30.0)
             
@@ -238,6 +302,7 @@ async def buscar_produtos_ml(query: str, user_id: int, limit: int = 20):
     - Headers: Authorization Bearer
     - Escopos: read write offline_access
     """
+    import httpx
     if not user_id:
         print(f"❌ [ML 2025] ERRO: user_id obrigatório para busca autenticada")
         return None
@@ -274,7 +339,8 @@ async def buscar_produtos_ml(query: str, user_id: int, limit: int = 20):
     print(f"📤 [ML 2025] Headers: Authorization Bearer (presente)")
     
     try:
-        async with httpx.AsyncClient() as client:
+        await ml_rate_limiter.acquire()
+        async with cliente_ml() as client:
             resp = await client.get(search_url, headers=headers, params=params, timeout=25.0)
             
             print(f"📊 [ML 2025] Status HTTP: {resp.status_code}")
@@ -353,6 +419,7 @@ async def buscar_produto_ml(ml_id: str, user_id: int):
     - Endpoint: /items/{id}
     - Headers: Authorization Bearer
     """
+    import httpx
     if not user_id:
         print(f"❌ [ML 2025] ERRO: user_id obrigatório para busca de produto")
         return None
@@ -376,7 +443,8 @@ async def buscar_produto_ml(ml_id: str, user_id: int):
     print(f"🔑 [ML 2025] Token: {token[:15]}...")
     
     try:
-        async with httpx.AsyncClient() as client:
+        await ml_rate_limiter.acquire()
+        async with cliente_ml() as client:
             resp = await client.get(url, headers=headers, timeout=15.0)
             
             print(f"📊 [ML 2025] Status: {resp.status_code}")
@@ -428,10 +496,13 @@ async def buscar_avaliacoes_ml(ml_id: str, user_id: int):
     🔐 BUSCA AVALIAÇÕES - OAuth 2.0 + PKCE obrigatório
     
     Conforme documentação oficial ML 2025
+    Retorna None quando a busca falha (sem token, erro HTTP, 429) e [] quando
+    o item realmente não tem avaliações
     """
+    import httpx
     if not user_id:
         print(f"❌ [ML 2025] ERRO: user_id obrigatório para busca de avaliações")
-        return []
+        return None
         
     print(f"🔐 [ML 2025] BUSCA AVALIAÇÕES: produto={ml_id}, user_id={user_id}")
     
@@ -439,7 +510,7 @@ async def buscar_avaliacoes_ml(ml_id: str, user_id: int):
     token = MLTokenManager.get_token(user_id)
     if not token:
         print(f"❌ [ML 2025] Token ML ausente para avaliações: user {user_id}")
-        return []
+        return None
         
     url = f"{ML_API_URL}/reviews/item/{ml_id}"
     headers = {
@@ -451,7 +522,8 @@ async def buscar_avaliacoes_ml(ml_id: str, user_id: int):
     print(f"📡 [ML 2025] URL: {url}")
     
     try:
-        async with httpx.AsyncClient() as client:
+        await ml_rate_limiter.acquire()
+        async with cliente_ml() as client:
             resp = await client.get(url, headers=headers, timeout=15.0)
             
             print(f"📊 [ML 2025] Status: {resp.status_code}")
@@ -476,13 +548,114 @@ async def buscar_avaliacoes_ml(ml_id: str, user_id: int):
                 
                 print(f"❌ [ML 2025] Token avaliações não renovável")
                 MLTokenManager.revoke_token(user_id)
-                return []
+                return None
                 
             else:
                 print(f"❌ [ML 2025] Erro ao buscar avaliações: {resp.status_code}")
                 print(f"📄 [ML 2025] Response: {resp.text[:200]}")
-                return []
+                return None
                 
     except Exception as e:
         print(f"❌ [ML 2025] Erro na busca de avaliações: {e}")
-        return []
\ No newline at end of file
+        return None
+
+# --- MULTI-GET DE ITENS ---
+ML_MULTIGET_MAX_IDS = 20  # Limite de ids por chamada em /items?ids=
+
+ML_ID_REGEX = re.compile(r"(MLB)-?(\d+)", re.IGNORECASE)
+
+def extrair_ml_id(entrada: str) -> Optional[str]:
+    """
+    Extrai o ml_id (ex: MLB123456) de um id puro ou de uma URL do Mercado Livre
+    Aceita formatos como "MLB123456", "MLB-123456" e links de anúncio
+    """
+    if not entrada:
+        return None
+    match = ML_ID_REGEX.search(entrada.strip())
+    if not match:
+        return None
+    return f"{match.group(1).upper()}{match.group(2)}"
+
+def _formatar_item_ml(data: dict) -> dict:
+    """Converte o payload de /items no formato usado pelo VigIA"""
+    return {
+        "nome": data.get("title"),
+        "preco": data.get("price"),
+        "estoque": data.get("available_quantity"),
+        "url": data.get("permalink"),
+        "thumbnail": data.get("thumbnail"),
+        "vendedor_id": data.get("seller_id"),
+        "condition": data.get("condition"),
+        "currency_id": data.get("currency_id")
+    }
+
+async def buscar_produtos_por_ids_ml(ml_ids: List[str], user_id: int) -> Dict[str, dict]:
+    """
+    🔐 BUSCA VÁRIOS PRODUTOS - multi-get /items?ids= (até 20 ids por chamada)
+
+    Retorna um dicionário ml_id -> dados no mesmo formato de buscar_produto_ml.
+    Ids não encontrados (ou com erro) ficam fora do resultado.
+    """
+    import httpx
+    if not user_id:
+        print(f"❌ [ML 2025] ERRO: user_id obrigatório para multi-get")
+        return {}
+
+    ids_unicos = list(dict.fromkeys(ml_ids))
+    if not ids_unicos:
+        return {}
+
+    token = MLTokenManager.get_token(user_id)
+    if not token:
+        print(f"❌ [ML 2025] Token OAuth ausente/expirado para user {user_id}")
+        return {}
+
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+        "User-Agent": "VigIA/1.0"
+    }
+    lotes = [ids_unicos[i:i + ML_MULTIGET_MAX_IDS] for i in range(0, len(ids_unicos), ML_MULTIGET_MAX_IDS)]
+    print(f"📦 [ML 2025] MULTI-GET: {len(ids_unicos)} ids em {len(lotes)} chamadas, user_id={user_id}")
+
+    async def buscar_lote(client: httpx.AsyncClient, lote: List[str]) -> Dict[str, dict]:
+        params = {"ids": ",".join(lote)}
+        await ml_rate_limiter.acquire()
+        resp = await client.get(f"{ML_API_URL}/items", headers=headers, params=params, timeout=20.0)
+        if resp.status_code == 401:
+            new_token = MLTokenManager.refresh_token(user_id)
+            if not new_token:
+                print(f"❌ [ML 2025] Token não renovável no multi-get")
+                return {}
+            headers["Authorization"] = f"Bearer {new_token}"
+            await ml_rate_limiter.acquire()
+            resp = await client.get(f"{ML_API_URL}/items", headers=headers, params=params, timeout=20.0)
+        if resp.status_code != 200:
+            print(f"❌ [ML 2025] Erro HTTP multi-get: {resp.status_code}")
+            print(f"📄 [ML 2025] Response: {resp.text[:200]}")
+            return {}
+
+        encontrados = {}
+        for item in resp.json():
+            body = item.get("body") or {}
+            if item.get("code") == 200 and body.get("id"):
+                encontrados[body["id"]] = _formatar_item_ml(body)
+        return encontrados
+
+    resultado: Dict[str, dict] = {}
+    try:
+        async with cliente_ml() as client:
+            respostas = await asyncio.gather(
+                *(buscar_lote(client, lote) for lote in lotes),
+                return_exceptions=True
+            )
+        for resposta in respostas:
+            if isinstance(resposta, Exception):
+                print(f"❌ [ML 2025] Erro em lote do multi-get: {resposta}")
+                continue
+            resultado.update(resposta)
+    except Exception as e:
+        print(f"❌ [ML 2025] Erro no multi-get: {e}")
+
+    print(f"✅ [ML 2025] MULTI-GET: {len(resultado)}/{len(ids_unicos)} produtos obtidos")
+    return resultado
@@ -0,0 +1,255 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Métricas em memória (por worker) no formato texto do Prometheus, sem
+# dependência externa. Cada observação é um dict lookup + soma sob lock;
+# a renderização só acontece quando /metrics é consultado.
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BUCKETS_CONSULTA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _formatar_rotulos(nomes: Tuple[str, ...], valores: Tuple, extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Iterable[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+
+    def amostras(self) -> List[str]:
+        raise NotImplementedError
+
+    def renderizar(self) -> str:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        linhas.extend(self.amostras())
+        return "\n".join(linhas)
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Iterable[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self._valores: Dict[Tuple, float] = {}
+
+    def inc(self, *valores_rotulos, valor: float = 1):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0) + valor
+
+    def amostras(self) -> List[str]:
+        with self._lock:
+            itens = list(self._valores.items())
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}" for chave, valor in itens]
+
+class Medidor(Metrica):
+    """Gauge: valor atual, ajustado com inc/dec ou lido de uma função na renderização"""
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Iterable[str] = (), funcao: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        super().__init__(nome, ajuda, rotulos)
+        self._valores: Dict[Tuple, float] = {}
+        self._funcao = funcao
+
+    def inc(self, *valores_rotulos, valor: float = 1):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0) + valor
+
+    def dec(self, *valores_rotulos, valor: float = 1):
+        self.inc(*valores_rotulos, valor=-valor)
+
+    def amostras(self) -> List[str]:
+        if self._funcao is not None:
+            try:
+                itens = list(self._funcao().items())
+            except Exception:
+                itens = []
+        else:
+            with self._lock:
+                itens = list(self._valores.items())
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}" for chave, valor in itens]
+
+class ContadorFuncao(Medidor):
+    """Contador cujo valor já é mantido em outro lugar (ex: acertos do cache)"""
+    tipo = "counter"
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Iterable[str] = (), buckets: Tuple[float, ...] = BUCKETS_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+        # por série: [contagens por bucket (não cumulativas) + overflow, soma, total]
+        self._series: Dict[Tuple, list] = {}
+
+    def observar(self, valor: float, *valores_rotulos):
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def amostras(self) -> List[str]:
+        with self._lock:
+            series = [(chave, list(serie[0]), serie[1], serie[2]) for chave, serie in self._series.items()]
+        linhas = []
+        for chave, contagens, soma, total in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += contagem
+                le = 'le="' + _formatar_numero(limite) + '"'
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, chave)} {total}")
+        return linhas
+
+class Registro:
+    def __init__(self):
+        self._metricas: List[Metrica] = []
+
+    def registrar(self, metrica: Metrica) -> Metrica:
+        self._metricas.append(metrica)
+        return metrica
+
+    def renderizar(self) -> str:
+        return "\n".join(metrica.renderizar() for metrica in self._metricas) + "\n"
+
+registro = Registro()
+
+# --- HTTP ---
+http_requisicoes = registro.registrar(Contador("vigia_http_requisicoes_total", "Requisições HTTP por rota e status", ("metodo", "rota", "status")))
+http_duracao = registro.registrar(Histograma("vigia_http_duracao_segundos", "Latência das requisições HTTP", ("metodo", "rota")))
+http_resposta_bytes = registro.registrar(Histograma("vigia_http_resposta_bytes", "Tamanho das respostas HTTP (após compressão)", ("metodo", "rota"), BUCKETS_BYTES))
+http_em_andamento = registro.registrar(Medidor("vigia_http_em_andamento", "Requisições HTTP em andamento"))
+
+# --- Mercado Livre ---
+ml_chamadas = registro.registrar(Contador("vigia_ml_chamadas_total", "Chamadas à API do Mercado Livre por endpoint e status", ("endpoint", "status")))
+ml_duracao = registro.registrar(Histograma("vigia_ml_duracao_segundos", "Latência das chamadas à API do Mercado Livre", ("endpoint",)))
+
+# --- Banco ---
+db_consulta = registro.registrar(Histograma("vigia_db_consulta_segundos", "Tempo das consultas ao banco", ("engine",), BUCKETS_CONSULTA))
+
+# --- Caches ---
+cache_consultas = registro.registrar(Contador("vigia_cache_consultas_total", "Consultas aos caches por resultado", ("cache", "resultado")))
+
+# --- Notificações do ML ---
+notificacoes_ml = registro.registrar(Contador("vigia_notificacoes_ml_total", "Notificações recebidas do Mercado Livre por resultado", ("resultado",)))
+
+# Rotas que não entram nas métricas HTTP: o próprio /metrics e conexões SSE
+# (longas; acompanhadas pelo medidor de conexões)
+ROTAS_IGNORADAS = ("/metrics", "/eventos/")
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN")
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI puro (sem BaseHTTPMiddleware, que bufferiza o corpo e
+    custa uma task por requisição). O rótulo da rota é o template do FastAPI
+    (/produtos/{produto_id}), não o caminho, para manter a cardinalidade baixa.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(ROTAS_IGNORADAS):
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        estado = {"status": 500, "bytes": 0}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                estado["status"] = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                estado["bytes"] += len(mensagem.get("body", b""))
+            await send(mensagem)
+
+        http_em_andamento.inc()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            http_em_andamento.dec()
+            rota = scope.get("route")
+            rota = getattr(rota, "path", None) or "(sem rota)"
+            metodo = scope["method"]
+            http_requisicoes.inc(metodo, rota, str(estado["status"]))
+            http_duracao.observar(time.perf_counter() - inicio, metodo, rota)
+            http_resposta_bytes.observar(estado["bytes"], metodo, rota)
+
+def registrar_chamada_ml(caminho: str, status: str, duracao: float):
+    endpoint = normalizar_endpoint_ml(caminho)
+    ml_chamadas.inc(endpoint, status)
+    ml_duracao.observar(duracao, endpoint)
+
+def normalizar_endpoint_ml(caminho: str) -> str:
+    """/items/MLB123 -> /items/{id}: ids e números viram placeholder"""
+    partes = []
+    for parte in caminho.split("/"):
+        if parte.isdigit() or (len(parte) > 3 and parte[:3].isalpha() and parte[:3].isupper() and parte[3:].isdigit()):
+            partes.append("{id}")
+        else:
+            partes.append(parte)
+    return "/".join(partes)
+
+def instrumentar_engine(engine_sync, nome: str):
+    """Tempo de cada consulta via eventos de cursor do SQLAlchemy"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine_sync, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("vigia_inicio_consulta", []).append(time.perf_counter())
+
+    @event.listens_for(engine_sync, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("vigia_inicio_consulta")
+        if inicios:
+            db_consulta.observar(time.perf_counter() - inicios.pop(), nome)
+
+_medidores_registrados = False
+
+def registrar_medidores_aplicacao():
+    """Medidores lidos na renderização a partir do estado já mantido pelos módulos"""
+    global _medidores_registrados
+    if _medidores_registrados:
+        return
+    _medidores_registrados = True
+    from database import engine, async_engine
+    from auth import usuarios_cache
+    from eventos import distribuidor
+
+    def pools():
+        valores = {}
+        for nome, engine_sync in (("sync", engine), ("async", async_engine.sync_engine)):
+            pool = engine_sync.pool
+            if hasattr(pool, "checkedout"):
+                valores[(nome, "em_uso")] = pool.checkedout()
+                valores[(nome, "livres")] = pool.checkedin()
+                valores[(nome, "overflow")] = max(0, pool.overflow())
+        return valores
+
+    registro.registrar(Medidor("vigia_db_pool_conexoes", "Conexões do pool por estado", ("engine", "estado"), funcao=pools))
+    registro.registrar(ContadorFuncao(
+        "vigia_cache_usuarios_total", "Consultas ao cache de identidade por resultado", ("resultado",),
+        funcao=lambda: {("acerto",): usuarios_cache.acertos, ("falha",): usuarios_cache.falhas}
+    ))
+    registro.registrar(Medidor("vigia_sse_conexoes", "Conexões SSE abertas", funcao=lambda: {(): distribuidor.total_conexoes}))
@@ -0,0 +1,57 @@
+import os
+import re
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+from dotenv import load_dotenv
+from models import Base
+
+load_dotenv()
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configurar_logging", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Partições de historico_precos são criadas/removidas por particoes.py, fora
+# das migrações: o autogenerate não deve tentar recriá-las nem apagá-las
+PARTICOES_REGEX = re.compile(r"^historico_precos_(p\d{4}_\d{2}|padrao)$")
+
+def incluir_nome(nome, tipo, pais) -> bool:
+    return not (tipo == "table" and nome and PARTICOES_REGEX.match(nome))
+
+# Evita que dois processos (workers/réplicas subindo juntos) migrem ao mesmo tempo
+LOCK_MIGRACOES = 7261001
+
+def database_url() -> str:
+    url = config.get_main_option("sqlalchemy.url") or os.getenv("DATABASE_URL")
+    if not url:
+        raise ValueError("DATABASE_URL é obrigatória")
+    return url
+
+def run_migrations_offline():
+    context.configure(url=database_url(), target_metadata=target_metadata, literal_binds=True, include_name=incluir_nome)
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    engine = create_engine(database_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        postgres = connection.dialect.name == "postgresql"
+        if postgres:
+            connection.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": LOCK_MIGRACOES})
+            connection.commit()
+        try:
+            context.configure(connection=connection, target_metadata=target_metadata, include_name=incluir_nome)
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if postgres:
+                connection.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": LOCK_MIGRACOES})
+                connection.commit()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
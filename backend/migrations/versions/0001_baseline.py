@@ -0,0 +1,95 @@
+"""Baseline: tabelas existentes (antes criadas por create_all)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Bancos já em produção foram criados por Base.metadata.create_all: cada
+# tabela só é criada se ainda não existir, e as colunas adicionadas depois
+# disso são garantidas com ADD COLUMN IF NOT EXISTS.
+
+def _existe(tabela: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(tabela)
+
+def upgrade():
+    if not _existe('usuarios'):
+        op.create_table(
+            'usuarios',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('email', sa.String(), nullable=False),
+            sa.Column('nome', sa.String(), nullable=True),
+            sa.Column('senha_hash', sa.String(), nullable=True),
+            sa.Column('google_id', sa.String(), nullable=True, unique=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('is_admin', sa.Boolean(), nullable=True),
+            sa.Column('criado_em', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_usuarios_id', 'usuarios', ['id'])
+        op.create_index('ix_usuarios_email', 'usuarios', ['email'], unique=True)
+
+    if not _existe('produtos_monitorados'):
+        op.create_table(
+            'produtos_monitorados',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id'), nullable=True),
+            sa.Column('ml_id', sa.String(), nullable=True),
+            sa.Column('nome', sa.String(), nullable=True),
+            sa.Column('preco_atual', sa.Float(), nullable=True),
+            sa.Column('estoque_atual', sa.Integer(), nullable=True),
+            sa.Column('url', sa.String(), nullable=True),
+            sa.Column('criado_em', sa.DateTime(), nullable=True),
+            sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_produtos_monitorados_id', 'produtos_monitorados', ['id'])
+        op.create_index('ix_produtos_monitorados_ml_id', 'produtos_monitorados', ['ml_id'])
+    elif op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE produtos_monitorados ADD COLUMN IF NOT EXISTS atualizado_em TIMESTAMP")
+
+    if not _existe('historico_precos'):
+        op.create_table(
+            'historico_precos',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos_monitorados.id'), nullable=True),
+            sa.Column('preco', sa.Float(), nullable=True),
+            sa.Column('estoque', sa.Integer(), nullable=True),
+            sa.Column('data', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_historico_precos_id', 'historico_precos', ['id'])
+
+    if not _existe('alertas'):
+        op.create_table(
+            'alertas',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id'), nullable=True),
+            sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos_monitorados.id'), nullable=True),
+            sa.Column('preco_alvo', sa.Float(), nullable=True),
+            sa.Column('enviado', sa.Boolean(), nullable=True),
+            sa.Column('criado_em', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_alertas_id', 'alertas', ['id'])
+
+    if not _existe('resumos_avaliacoes'):
+        op.create_table(
+            'resumos_avaliacoes',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('ml_id', sa.String(), nullable=False),
+            sa.Column('hash_avaliacoes', sa.String(), nullable=False),
+            sa.Column('resumo', sa.Text(), nullable=True),
+            sa.Column('total_avaliacoes', sa.Integer(), nullable=True),
+            sa.Column('gerado_em', sa.DateTime(), nullable=True),
+            sa.Column('verificado_em', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_resumos_avaliacoes_id', 'resumos_avaliacoes', ['id'])
+        op.create_index('ix_resumos_avaliacoes_ml_id', 'resumos_avaliacoes', ['ml_id'], unique=True)
+
+def downgrade():
+    for tabela in ('resumos_avaliacoes', 'alertas', 'historico_precos', 'produtos_monitorados', 'usuarios'):
+        op.drop_table(tabela)
@@ -0,0 +1,40 @@
+"""Índices compostos/parciais das consultas quentes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (nome, tabela, colunas, where parcial)
+INDICES = [
+    # listar_historico: filtra por produto e ordena por data
+    ('ix_historico_precos_produto_id_data', 'historico_precos', ['produto_id', 'data'], None),
+    # verificar_alertas: alertas pendentes do produto
+    ('ix_alertas_produto_id_pendentes', 'alertas', ['produto_id'], 'enviado = false'),
+    ('ix_produtos_monitorados_usuario_id', 'produtos_monitorados', ['usuario_id'], None),
+    ('ix_alertas_usuario_id', 'alertas', ['usuario_id'], None),
+]
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY não bloqueia escritas, mas não pode rodar
+    # dentro de transação: autocommit_block
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas, where in INDICES:
+            op.create_index(
+                nome, tabela, colunas,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+            )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nome, tabela, _, _ in INDICES:
+            op.drop_index(nome, table_name=tabela, if_exists=True, postgresql_concurrently=True)
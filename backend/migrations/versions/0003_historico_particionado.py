@@ -0,0 +1,104 @@
+"""historico_precos particionada por mês + agregado diário
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from datetime import date, datetime
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+MESES_FUTUROS = 3
+
+def _proximo_mes(mes: date) -> date:
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+def upgrade():
+    op.create_table(
+        'historico_precos_diario',
+        sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos_monitorados.id'), primary_key=True),
+        sa.Column('dia', sa.Date(), primary_key=True),
+        sa.Column('preco_minimo', sa.Float(), nullable=True),
+        sa.Column('preco_maximo', sa.Float(), nullable=True),
+        sa.Column('preco_medio', sa.Float(), nullable=True),
+        sa.Column('estoque_final', sa.Integer(), nullable=True),
+        sa.Column('pontos', sa.Integer(), nullable=True),
+    )
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # A tabela atual vira "legado", a nova particionada assume o nome (e a
+    # sequence, preservando os ids) e os pontos são copiados. Roda numa única
+    # transação: em bases grandes, fazer em janela de manutenção.
+    op.execute("ALTER TABLE historico_precos RENAME TO historico_precos_legado")
+    op.execute("ALTER TABLE historico_precos_legado RENAME CONSTRAINT historico_precos_pkey TO historico_precos_legado_pkey")
+    op.execute("ALTER INDEX IF EXISTS ix_historico_precos_produto_id_data RENAME TO ix_historico_precos_legado_produto_id_data")
+    op.execute("ALTER TABLE historico_precos_legado ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE historico_precos_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE historico_precos (
+            id INTEGER NOT NULL DEFAULT nextval('historico_precos_id_seq'),
+            produto_id INTEGER REFERENCES produtos_monitorados(id),
+            preco DOUBLE PRECISION,
+            estoque INTEGER,
+            data TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT historico_precos_pkey PRIMARY KEY (id, data)
+        ) PARTITION BY RANGE (data)
+    """)
+    op.execute("ALTER SEQUENCE historico_precos_id_seq OWNED BY historico_precos.id")
+    op.execute("CREATE INDEX ix_historico_precos_produto_id_data ON historico_precos (produto_id, data)")
+    # Rede de segurança: pontos fora das partições mensais não falham o INSERT
+    op.execute("CREATE TABLE historico_precos_padrao PARTITION OF historico_precos DEFAULT")
+
+    mais_antigo = op.get_bind().execute(sa.text("SELECT MIN(data) FROM historico_precos_legado")).scalar()
+    hoje = datetime.utcnow().date()
+    mes = date((mais_antigo or hoje).year, (mais_antigo or hoje).month, 1)
+    ultimo = date(hoje.year, hoje.month, 1)
+    for _ in range(MESES_FUTUROS):
+        ultimo = _proximo_mes(ultimo)
+    while mes <= ultimo:
+        op.execute(
+            f"CREATE TABLE historico_precos_p{mes.year:04d}_{mes.month:02d} PARTITION OF historico_precos "
+            f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{_proximo_mes(mes).isoformat()}')"
+        )
+        mes = _proximo_mes(mes)
+
+    op.execute("""
+        INSERT INTO historico_precos (id, produto_id, preco, estoque, data)
+        SELECT id, produto_id, preco, estoque, COALESCE(data, NOW() AT TIME ZONE 'utc')
+        FROM historico_precos_legado
+    """)
+    op.execute("DROP TABLE historico_precos_legado")
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE historico_precos RENAME TO historico_precos_particionada")
+        op.execute("ALTER TABLE historico_precos_particionada RENAME CONSTRAINT historico_precos_pkey TO historico_precos_particionada_pkey")
+        op.execute("ALTER INDEX ix_historico_precos_produto_id_data RENAME TO ix_historico_precos_particionada_produto_id_data")
+        op.execute("ALTER TABLE historico_precos_particionada ALTER COLUMN id DROP DEFAULT")
+        op.execute("ALTER SEQUENCE historico_precos_id_seq OWNED BY NONE")
+        op.execute("""
+            CREATE TABLE historico_precos (
+                id INTEGER NOT NULL DEFAULT nextval('historico_precos_id_seq') PRIMARY KEY,
+                produto_id INTEGER REFERENCES produtos_monitorados(id),
+                preco DOUBLE PRECISION,
+                estoque INTEGER,
+                data TIMESTAMP WITHOUT TIME ZONE
+            )
+        """)
+        op.execute("ALTER SEQUENCE historico_precos_id_seq OWNED BY historico_precos.id")
+        op.execute("CREATE INDEX ix_historico_precos_id ON historico_precos (id)")
+        op.execute("CREATE INDEX ix_historico_precos_produto_id_data ON historico_precos (produto_id, data)")
+        op.execute("""
+            INSERT INTO historico_precos (id, produto_id, preco, estoque, data)
+            SELECT id, produto_id, preco, estoque, data FROM historico_precos_particionada
+        """)
+        op.execute("DROP TABLE historico_precos_particionada")
+    op.drop_table('historico_precos_diario')
@@ -0,0 +1,33 @@
+"""Perfis amostrados de requisições e ciclos do scheduler
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'perfis_execucao',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('origem', sa.String(), nullable=False),
+        sa.Column('alvo', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('solicitado_por', sa.Integer(), sa.ForeignKey('usuarios.id'), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=True),
+        sa.Column('concluido_em', sa.DateTime(), nullable=True),
+        sa.Column('duracao_ms', sa.Float(), nullable=True),
+        sa.Column('amostras', sa.Integer(), nullable=True),
+        sa.Column('pilhas', sa.Text(), nullable=True),
+    )
+    op.create_index('ix_perfis_execucao_id', 'perfis_execucao', ['id'])
+    op.create_index('ix_perfis_execucao_status', 'perfis_execucao', ['status'])
+
+def downgrade():
+    op.drop_table('perfis_execucao')
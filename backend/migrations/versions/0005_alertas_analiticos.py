@@ -0,0 +1,22 @@
+"""Alertas por condição analítica (mínimo, queda percentual, anomalia)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Com default constante o ADD COLUMN não reescreve a tabela (PostgreSQL 11+)
+    op.add_column('alertas', sa.Column('tipo', sa.String(), nullable=False, server_default='preco_alvo'))
+    op.add_column('alertas', sa.Column('parametro', sa.Float(), nullable=True))
+
+def downgrade():
+    op.drop_column('alertas', 'parametro')
+    op.drop_column('alertas', 'tipo')
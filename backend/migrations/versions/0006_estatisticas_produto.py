@@ -0,0 +1,61 @@
+"""Estatísticas de preço por produto mantidas incrementalmente
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# Backfill a partir do histórico bruto (nesta revisão ainda não há arquivo
+# frio; depois dele use estatisticas.recalcular_estatisticas)
+SQL_BACKFILL = """
+    INSERT INTO estatisticas_produto (
+        produto_id, pontos, preco_minimo, preco_maximo, preco_medio, m2, ultimo_preco,
+        primeiro_ponto_em, ultimo_ponto_em, ultima_mudanca_em, mudancas, atualizado_em
+    )
+    SELECT
+        produto_id, COUNT(*), MIN(preco), MAX(preco), AVG(preco),
+        CASE WHEN SUM(preco * preco) - SUM(preco) * SUM(preco) / COUNT(*) > 0
+            THEN SUM(preco * preco) - SUM(preco) * SUM(preco) / COUNT(*) ELSE 0 END,
+        MAX(ultimo_preco), MIN(data), MAX(data),
+        MAX(CASE WHEN anterior <> preco THEN data END),
+        SUM(CASE WHEN anterior <> preco THEN 1 ELSE 0 END),
+        CURRENT_TIMESTAMP AT TIME ZONE 'UTC'
+    FROM (
+        SELECT produto_id, preco, data,
+            LAG(preco) OVER (PARTITION BY produto_id ORDER BY data, id) AS anterior,
+            FIRST_VALUE(preco) OVER (PARTITION BY produto_id ORDER BY data DESC, id DESC) AS ultimo_preco
+        FROM historico_precos
+        WHERE preco IS NOT NULL
+    ) pontos
+    GROUP BY produto_id
+"""
+
+def upgrade():
+    op.create_table(
+        'estatisticas_produto',
+        sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos_monitorados.id'), primary_key=True),
+        sa.Column('pontos', sa.Integer(), nullable=False),
+        sa.Column('preco_minimo', sa.Float()),
+        sa.Column('preco_maximo', sa.Float()),
+        sa.Column('preco_medio', sa.Float()),
+        sa.Column('m2', sa.Float()),
+        sa.Column('ultimo_preco', sa.Float()),
+        sa.Column('primeiro_ponto_em', sa.DateTime()),
+        sa.Column('ultimo_ponto_em', sa.DateTime()),
+        sa.Column('ultima_mudanca_em', sa.DateTime(), nullable=True),
+        sa.Column('mudancas', sa.Integer(), nullable=False),
+        sa.Column('atualizado_em', sa.DateTime()),
+    )
+    # Pontos gravados por workers antigos durante o deploy ficam de fora:
+    # rode `python estatisticas.py` depois do deploy para recalcular
+    op.execute(SQL_BACKFILL)
+
+def downgrade():
+    op.drop_table('estatisticas_produto')
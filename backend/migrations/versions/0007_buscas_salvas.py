@@ -0,0 +1,47 @@
+"""Buscas salvas com snapshot dos resultados e eventos de novidades
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'buscas_salvas',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuarios.id'), nullable=True),
+        sa.Column('consulta', sa.String(), nullable=False),
+        sa.Column('preco_maximo', sa.Float(), nullable=True),
+        sa.Column('ativa', sa.Boolean(), nullable=True),
+        sa.Column('snapshot', sa.LargeBinary(), nullable=True),
+        sa.Column('resultados', sa.Integer(), nullable=True),
+        sa.Column('ultima_execucao_em', sa.DateTime(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_buscas_salvas_id', 'buscas_salvas', ['id'])
+    op.create_index('ix_buscas_salvas_usuario_id', 'buscas_salvas', ['usuario_id'])
+    op.create_table(
+        'eventos_busca',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('busca_id', sa.Integer(), sa.ForeignKey('buscas_salvas.id'), nullable=True),
+        sa.Column('ml_id', sa.String(), nullable=False),
+        sa.Column('tipo', sa.String(), nullable=False),
+        sa.Column('preco', sa.Float(), nullable=False),
+        sa.Column('preco_anterior', sa.Float(), nullable=True),
+        sa.Column('titulo', sa.String(), nullable=True),
+        sa.Column('url', sa.String(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_eventos_busca_id', 'eventos_busca', ['id'])
+    op.create_index('ix_eventos_busca_busca_id', 'eventos_busca', ['busca_id'])
+
+def downgrade():
+    op.drop_table('eventos_busca')
+    op.drop_table('buscas_salvas')
@@ -0,0 +1,32 @@
+"""Fila deduplicada das notificações de itens do Mercado Livre
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'notificacoes_ml',
+        sa.Column('ml_id', sa.String(), primary_key=True),
+        sa.Column('pendente', sa.Boolean(), nullable=False),
+        sa.Column('notificacoes', sa.Integer(), nullable=False),
+        sa.Column('primeira_notificacao_em', sa.DateTime(), nullable=False),
+        sa.Column('ultima_notificacao_em', sa.DateTime(), nullable=False),
+        sa.Column('processada_em', sa.DateTime(), nullable=True),
+    )
+    # O job reserva só as pendentes, das mais antigas para as mais novas
+    op.create_index(
+        'ix_notificacoes_ml_pendentes', 'notificacoes_ml', ['ultima_notificacao_em'],
+        postgresql_where=sa.text('pendente = true'),
+    )
+
+def downgrade():
+    op.drop_table('notificacoes_ml')
@@ -0,0 +1,28 @@
+"""Arquivo frio do histórico: blobs colunares por produto e mês
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'historico_arquivo',
+        sa.Column('produto_id', sa.Integer(), sa.ForeignKey('produtos_monitorados.id'), primary_key=True),
+        sa.Column('mes', sa.Date(), primary_key=True),
+        sa.Column('pontos', sa.Integer(), nullable=False),
+        sa.Column('primeiro_ponto_em', sa.DateTime(), nullable=False),
+        sa.Column('ultimo_ponto_em', sa.DateTime(), nullable=False),
+        sa.Column('dados', sa.LargeBinary(), nullable=False),
+        sa.Column('arquivado_em', sa.DateTime(), nullable=True),
+    )
+
+def downgrade():
+    op.drop_table('historico_arquivo')
@@ -0,0 +1,20 @@
+"""Conjunto de ids já vistos das buscas salvas, separado do snapshot de preços
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Buscas existentes começam pelos ids do snapshot (ver buscas_salvas.aplicar_execucao)
+    op.add_column('buscas_salvas', sa.Column('vistos', sa.LargeBinary(), nullable=True))
+
+def downgrade():
+    op.drop_column('buscas_salvas', 'vistos')
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, Text, LargeBinary, Index, Sequence, text
 from sqlalchemy.ext.declarative import declarative_base
 import logging
 
@@ -25,31 +25,150 @@ class Usuario(Base):
 class ProdutoMonitorado(Base):
     __tablename__ = 'produtos_monitorados'
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey('usuarios.id'))
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), index=True)
     ml_id = Column(String, index=True)
     nome = Column(String)
     preco_atual = Column(Float)
     estoque_atual = Column(Integer)
     url = Column(String)
     criado_em = Column(DateTime, default=datetime.utcnow)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class HistoricoPreco(Base):
+    # Particionada por mês no PostgreSQL (ver particoes.py): lá a PK é
+    # (id, data), criada pela migração 0003, porque a chave de partição precisa
+    # fazer parte dela. No modelo a PK fica só no id para que o create_all do
+    # SQLite local gere um INTEGER PRIMARY KEY autoincrementado (o id já é
+    # único pela sequence)
     __tablename__ = 'historico_precos'
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = (
+        Index('ix_historico_precos_produto_id_data', 'produto_id', 'data'),
+        {'postgresql_partition_by': 'RANGE (data)'},
+    )
+    id = Column(Integer, Sequence('historico_precos_id_seq'), primary_key=True)
     produto_id = Column(Integer, ForeignKey('produtos_monitorados.id'))
     preco = Column(Float)
     estoque = Column(Integer)
-    data = Column(DateTime, default=datetime.utcnow)
+    data = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class HistoricoPrecoDiario(Base):
+    # Agregado diário dos pontos que saíram da retenção do histórico bruto
+    __tablename__ = 'historico_precos_diario'
+    produto_id = Column(Integer, ForeignKey('produtos_monitorados.id'), primary_key=True)
+    dia = Column(Date, primary_key=True)
+    preco_minimo = Column(Float)
+    preco_maximo = Column(Float)
+    preco_medio = Column(Float)
+    estoque_final = Column(Integer)
+    pontos = Column(Integer)
+
+class HistoricoArquivo(Base):
+    # Camada fria do histórico: pontos de um produto em um mês, em colunas
+    # delta-codificadas e comprimidas (ver arquivo_historico.py)
+    __tablename__ = 'historico_arquivo'
+    produto_id = Column(Integer, ForeignKey('produtos_monitorados.id'), primary_key=True)
+    mes = Column(Date, primary_key=True)
+    pontos = Column(Integer, nullable=False)
+    primeiro_ponto_em = Column(DateTime, nullable=False)
+    ultimo_ponto_em = Column(DateTime, nullable=False)
+    dados = Column(LargeBinary, nullable=False)
+    arquivado_em = Column(DateTime, default=datetime.utcnow)
+
+class EstatisticaProduto(Base):
+    # Estatísticas corridas do preço, atualizadas a cada ponto novo (ver estatisticas.py)
+    __tablename__ = 'estatisticas_produto'
+    produto_id = Column(Integer, ForeignKey('produtos_monitorados.id'), primary_key=True)
+    pontos = Column(Integer, nullable=False)
+    preco_minimo = Column(Float)
+    preco_maximo = Column(Float)
+    preco_medio = Column(Float)
+    m2 = Column(Float)  # soma dos quadrados dos desvios (Welford): variância = m2 / pontos
+    ultimo_preco = Column(Float)
+    primeiro_ponto_em = Column(DateTime)
+    ultimo_ponto_em = Column(DateTime)
+    ultima_mudanca_em = Column(DateTime, nullable=True)
+    mudancas = Column(Integer, nullable=False)
+    atualizado_em = Column(DateTime)
 
 class Alerta(Base):
     __tablename__ = 'alertas'
+    __table_args__ = (
+        # Scheduler busca só os alertas pendentes de cada produto
+        Index('ix_alertas_produto_id_pendentes', 'produto_id', postgresql_where=text('enviado = false')),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey('usuarios.id'))
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), index=True)
     produto_id = Column(Integer, ForeignKey('produtos_monitorados.id'))
     preco_alvo = Column(Float)
+    # preco_alvo | minimo_90d | minimo_historico | queda_percentual | anomalia (ver analise_precos)
+    tipo = Column(String, nullable=False, default='preco_alvo', server_default='preco_alvo')
+    parametro = Column(Float, nullable=True)  # queda_percentual: % mínima em 30 dias; anomalia: z-score
     enviado = Column(Boolean, default=False)
     criado_em = Column(DateTime, default=datetime.utcnow)
 
+class ResumoAvaliacao(Base):
+    __tablename__ = 'resumos_avaliacoes'
+    id = Column(Integer, primary_key=True, index=True)
+    ml_id = Column(String, unique=True, index=True, nullable=False)
+    hash_avaliacoes = Column(String, nullable=False)  # sha256 dos textos usados no prompt
+    resumo = Column(Text)
+    total_avaliacoes = Column(Integer)
+    gerado_em = Column(DateTime, default=datetime.utcnow)
+    verificado_em = Column(DateTime, default=datetime.utcnow)  # última vez que o hash foi conferido
+
+class PerfilExecucao(Base):
+    """Perfil amostrado de uma requisição ou ciclo do scheduler (pilhas no formato "folded")"""
+    __tablename__ = 'perfis_execucao'
+    id = Column(Integer, primary_key=True, index=True)
+    origem = Column(String, nullable=False)  # requisicao | scheduler
+    alvo = Column(String, nullable=True)  # rota ou job; pedido do scheduler sem alvo vale para qualquer job
+    status = Column(String, nullable=False, default='pendente', index=True)  # pendente | coletando | concluido
+    solicitado_por = Column(Integer, ForeignKey('usuarios.id'), nullable=True)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    concluido_em = Column(DateTime, nullable=True)
+    duracao_ms = Column(Float, nullable=True)
+    amostras = Column(Integer, nullable=True)
+    pilhas = Column(Text, nullable=True)
+
+class BuscaSalva(Base):
+    """Consulta do ML reexecutada pelo scheduler; só as diferenças viram eventos (ver buscas_salvas.py)"""
+    __tablename__ = 'buscas_salvas'
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), index=True)
+    consulta = Column(String, nullable=False)
+    preco_maximo = Column(Float, nullable=True)
+    ativa = Column(Boolean, default=True)
+    snapshot = Column(LargeBinary, nullable=True)  # ids e preços (centavos) da última página, compactados
+    vistos = Column(LargeBinary, nullable=True)  # todos os ids já vistos pela busca, compactados
+    resultados = Column(Integer, default=0)
+    ultima_execucao_em = Column(DateTime, nullable=True)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+
+class EventoBusca(Base):
+    __tablename__ = 'eventos_busca'
+    id = Column(Integer, primary_key=True, index=True)
+    busca_id = Column(Integer, ForeignKey('buscas_salvas.id'), index=True)
+    ml_id = Column(String, nullable=False)
+    tipo = Column(String, nullable=False)  # novo | queda_preco
+    preco = Column(Float, nullable=False)
+    preco_anterior = Column(Float, nullable=True)
+    titulo = Column(String, nullable=True)
+    url = Column(String, nullable=True)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+
+class NotificacaoItemML(Base):
+    """Fila deduplicada das notificações "items" do ML: uma linha por ml_id (ver notificacoes_ml.py)"""
+    __tablename__ = 'notificacoes_ml'
+    __table_args__ = (
+        Index('ix_notificacoes_ml_pendentes', 'ultima_notificacao_em', postgresql_where=text('pendente = true')),
+    )
+    ml_id = Column(String, primary_key=True)
+    pendente = Column(Boolean, nullable=False, default=True)
+    notificacoes = Column(Integer, nullable=False, default=1)
+    primeira_notificacao_em = Column(DateTime, nullable=False)
+    ultima_notificacao_em = Column(DateTime, nullable=False)
+    processada_em = Column(DateTime, nullable=True)
+
 logger.info("✅ Modelos SQLAlchemy carregados com sucesso")
 
 # Pydantic Schemas
@@ -85,14 +204,41 @@ class ProdutoMonitoradoBase(BaseModel):
 class ProdutoMonitoradoCreate(ProdutoMonitoradoBase):
     pass
 
+class EstatisticasProdutoOut(BaseModel):
+    pontos: int
+    preco_minimo: float
+    preco_maximo: float
+    preco_medio: float
+    primeiro_ponto_em: datetime
+    ultimo_ponto_em: datetime
+    ultima_mudanca_em: Optional[datetime] = None
+    mudancas: int
+    class Config:
+        orm_mode = True
+
 class ProdutoMonitoradoOut(ProdutoMonitoradoBase):
     id: int
     preco_atual: float
     estoque_atual: int
     criado_em: datetime
+    estatisticas: Optional[EstatisticasProdutoOut] = None  # preenchido na listagem
     class Config:
         orm_mode = True
 
+class ProdutoBatchCreate(BaseModel):
+    itens: List[str]  # ml_ids (MLB123...) ou URLs de anúncios
+
+class ProdutoBatchItemOut(BaseModel):
+    entrada: str
+    ml_id: Optional[str] = None
+    status: str  # criado | duplicado | invalido | nao_encontrado
+    produto: Optional[ProdutoMonitoradoOut] = None
+
+class ProdutoBatchOut(BaseModel):
+    total: int
+    criados: int
+    resultados: List[ProdutoBatchItemOut]
+
 class HistoricoPrecoOut(BaseModel):
     id: int
     preco: float
@@ -102,7 +248,9 @@ class HistoricoPrecoOut(BaseModel):
         orm_mode = True
 
 class AlertaBase(BaseModel):
-    preco_alvo: float
+    preco_alvo: Optional[float] = None
+    tipo: str = "preco_alvo"
+    parametro: Optional[float] = None
 
 class AlertaCreate(AlertaBase):
     produto_id: int
@@ -112,4 +260,66 @@ class AlertaOut(AlertaBase):
     enviado: bool
     criado_em: datetime
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class ResumoAvaliacaoOut(BaseModel):
+    ml_id: str
+    resumo: str
+    total_avaliacoes: int
+    gerado_em: datetime
+    origem: str  # cache | cache_expirado | gerado
+
+class PerfilOut(BaseModel):
+    id: int
+    origem: str
+    alvo: Optional[str] = None
+    status: str
+    criado_em: datetime
+    concluido_em: Optional[datetime] = None
+    duracao_ms: Optional[float] = None
+    amostras: Optional[int] = None
+    class Config:
+        orm_mode = True
+
+class PerfilSchedulerCreate(BaseModel):
+    ciclos: int = 1
+    job: Optional[str] = None  # ver JOBS_PERFILAVEIS em routers.py
+
+class AnalisePrecoOut(BaseModel):
+    produto_id: int
+    pontos: int
+    preco_atual: float
+    minimo_historico: float
+    minimo_90d: Optional[float] = None
+    media_movel_7: float
+    media_movel_30: float
+    variacao_30d_pct: Optional[float] = None
+    zscore_90d: Optional[float] = None
+    no_minimo_90d: bool
+    anomalia: bool
+
+class BuscaSalvaCreate(BaseModel):
+    consulta: str
+    preco_maximo: Optional[float] = None
+
+class BuscaSalvaOut(BuscaSalvaCreate):
+    id: int
+    ativa: bool
+    resultados: int
+    ultima_execucao_em: Optional[datetime] = None
+    criado_em: datetime
+    class Config:
+        orm_mode = True
+
+class EventoBuscaOut(BaseModel):
+    id: int
+    busca_id: int
+    ml_id: str
+    tipo: str
+    preco: float
+    preco_anterior: Optional[float] = None
+    titulo: Optional[str] = None
+    url: Optional[str] = None
+    criado_em: datetime
+    class Config:
+        orm_mode = True
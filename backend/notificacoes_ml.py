@@ -0,0 +1,168 @@
+import os
+import re
+import hmac
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, or_, select, text, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import ProdutoMonitorado, EstatisticaProduto, NotificacaoItemML
+from mercadolivre import buscar_produtos_por_ids_ml, ML_CLIENT_ID
+from atualizacao import gravar_atualizacoes
+
+# Notificações do tópico "items" do Mercado Livre no lugar do polling cego:
+# o webhook só enfileira o ml_id (uma linha por item, notificações repetidas
+# se fundem) e responde na hora; o job do scheduler reserva lotes da fila com
+# SKIP LOCKED e atualiza só esses itens. Com ML_NOTIFICACOES_HABILITADAS=1 o
+# polling periódico vira rede de segurança: itens que recebem notificações
+# são conferidos a cada ML_POLLING_COBERTOS_HORAS e os demais a cada
+# ML_POLLING_LENTO_MINUTOS. O webhook exige ML_WEBHOOK_SECRET: sem ele toda
+# notificação é recusada e o polling continua no intervalo normal.
+ML_WEBHOOK_SECRET = os.getenv("ML_WEBHOOK_SECRET")
+ML_NOTIFICACOES_HABILITADAS = os.getenv("ML_NOTIFICACOES_HABILITADAS", "0") == "1" and bool(ML_WEBHOOK_SECRET)
+if os.getenv("ML_NOTIFICACOES_HABILITADAS", "0") == "1" and not ML_WEBHOOK_SECRET:
+    print("⚠️ ML_NOTIFICACOES_HABILITADAS=1 sem ML_WEBHOOK_SECRET: webhook recusa notificações, polling segue normal")
+ML_WEBHOOK_TOLERANCIA_SEGUNDOS = int(os.getenv("ML_WEBHOOK_TOLERANCIA_SEGUNDOS", "300"))
+ML_POLLING_LENTO_MINUTOS = int(os.getenv("ML_POLLING_LENTO_MINUTOS", "120"))
+ML_POLLING_COBERTOS_HORAS = int(os.getenv("ML_POLLING_COBERTOS_HORAS", "24"))
+NOTIFICACOES_JANELA_DIAS = int(os.getenv("NOTIFICACOES_JANELA_DIAS", "7"))  # item "coberto" se notificado nesse período
+NOTIFICACOES_LOTE = int(os.getenv("NOTIFICACOES_LOTE", "200"))
+NOTIFICACOES_INTERVALO_SEGUNDOS = int(os.getenv("NOTIFICACOES_INTERVALO_SEGUNDOS", "30"))
+
+RECURSO_ITEM = re.compile(r"^/items/(MLB\d+)$")
+
+# Dedup: notificação de um item já na fila só atualiza contagem e horário
+SQL_ENFILEIRAR = """
+    INSERT INTO notificacoes_ml (ml_id, pendente, notificacoes, primeira_notificacao_em, ultima_notificacao_em)
+    VALUES (:ml_id, true, 1, :agora, :agora)
+    ON CONFLICT (ml_id) DO UPDATE SET
+        pendente = true,
+        notificacoes = notificacoes_ml.notificacoes + 1,
+        ultima_notificacao_em = excluded.ultima_notificacao_em
+"""
+
+# Reserva um lote: a linha volta a "pendente" se chegar outra notificação
+# enquanto o item é atualizado. Sem SKIP LOCKED no SQLite (um processo só)
+SQL_RESERVAR = """
+    UPDATE notificacoes_ml SET pendente = false, processada_em = :agora
+    WHERE ml_id IN (
+        SELECT ml_id FROM notificacoes_ml WHERE pendente = true
+        ORDER BY ultima_notificacao_em LIMIT :lote {trava}
+    )
+    RETURNING ml_id
+"""
+
+def assinar(corpo: bytes, ts: str, segredo: str) -> str:
+    return hmac.new(segredo.encode(), ts.encode() + b"." + corpo, hashlib.sha256).hexdigest()
+
+def webhook_configurado() -> bool:
+    return bool(ML_WEBHOOK_SECRET)
+
+def verificar_assinatura(corpo: bytes, cabecalho: Optional[str], agora: Optional[float] = None) -> bool:
+    """
+    Cabeçalho X-Signature "ts=<epoch>,v1=<hmac-sha256(segredo, ts.corpo)>"
+    (ex: repassado pelo proxy de entrada). Sem ML_WEBHOOK_SECRET nada é
+    aceito. O ts limita a reapresentação de notificações antigas
+    """
+    if not ML_WEBHOOK_SECRET:
+        return False
+    if not cabecalho:
+        return False
+    partes = dict(parte.strip().split("=", 1) for parte in cabecalho.split(",") if "=" in parte)
+    ts, assinatura = partes.get("ts"), partes.get("v1")
+    if not ts or not assinatura or not ts.isdigit():
+        return False
+    if abs((agora or time.time()) - int(ts)) > ML_WEBHOOK_TOLERANCIA_SEGUNDOS:
+        return False
+    return hmac.compare_digest(assinar(corpo, ts, ML_WEBHOOK_SECRET), assinatura)
+
+def ml_id_da_notificacao(notificacao: dict) -> Optional[str]:
+    """ml_id de uma notificação do tópico items, ou None se não se aplica"""
+    if notificacao.get("topic") != "items":
+        return None
+    recurso = RECURSO_ITEM.match(str(notificacao.get("resource") or ""))
+    return recurso.group(1) if recurso else None
+
+def aplicacao_confere(notificacao: dict) -> bool:
+    return ML_CLIENT_ID is not None and str(notificacao.get("application_id")) == str(ML_CLIENT_ID)
+
+def reservar_notificacoes(db: Session, lote: int = NOTIFICACOES_LOTE) -> List[str]:
+    trava = "FOR UPDATE SKIP LOCKED" if db.get_bind().dialect.name == "postgresql" else ""
+    ml_ids = db.execute(text(SQL_RESERVAR.format(trava=trava)), {"agora": datetime.utcnow(), "lote": lote}).scalars().all()
+    db.commit()
+    return ml_ids
+
+def reenfileirar(db: Session, ml_ids: List[str]):
+    """Itens reservados que não foram atualizados voltam para a fila"""
+    db.execute(update(NotificacaoItemML).where(NotificacaoItemML.ml_id.in_(ml_ids)).values(pendente=True))
+    db.commit()
+
+def produtos_por_usuario(db: Session, ml_ids: List[str]) -> Dict[int, List[str]]:
+    por_usuario = {}
+    for usuario_id, ml_id in db.query(ProdutoMonitorado.usuario_id, ProdutoMonitorado.ml_id).filter(ProdutoMonitorado.ml_id.in_(ml_ids)):
+        por_usuario.setdefault(usuario_id, []).append(ml_id)
+    return por_usuario
+
+def processar_notificacoes(lote: int = NOTIFICACOES_LOTE) -> int:
+    """
+    Atualiza os itens notificados, em lotes, até esvaziar a fila. Itens que
+    o ML não devolveu, ou cujo lote do usuário falhou, voltam para a fila e
+    são tentados de novo na próxima execução do job (não nesta, para uma
+    falha persistente não virar um laço)
+    """
+    processados = 0
+    while True:
+        db: Session = SessionLocal()
+        try:
+            ml_ids = reservar_notificacoes(db, lote)
+            por_usuario = produtos_por_usuario(db, ml_ids) if ml_ids else {}
+        finally:
+            db.close()
+        if not ml_ids:
+            return processados
+        falhas = set()
+        for usuario_id, ml_ids_usuario in por_usuario.items():
+            try:
+                dados = asyncio.run(buscar_produtos_por_ids_ml(ml_ids_usuario, usuario_id))
+                if dados:
+                    gravar_atualizacoes(usuario_id, dados)
+                falhas.update(ml_id for ml_id in ml_ids_usuario if ml_id not in dados)
+            except Exception as e:
+                print(f"❌ Erro ao atualizar itens notificados do user {usuario_id}: {e}")
+                falhas.update(ml_ids_usuario)
+        if falhas:
+            db = SessionLocal()
+            try:
+                reenfileirar(db, list(falhas))
+            finally:
+                db.close()
+        processados += len(ml_ids) - len(falhas)
+        print(f"📬 {len(ml_ids) - len(falhas)} itens notificados atualizados ({len(por_usuario)} usuários, {len(falhas)} de volta à fila)")
+        if falhas or len(ml_ids) < lote:
+            return processados
+
+def ml_ids_para_polling(db: Session, agora: Optional[datetime] = None) -> List[Tuple[int, str]]:
+    """
+    (usuario_id, ml_id) que o polling periódico deve atualizar agora. Sem
+    notificações habilitadas, todos; com elas, só os que passaram do seu
+    intervalo (a última atualização vem das estatísticas incrementais)
+    """
+    consulta = select(ProdutoMonitorado.usuario_id, ProdutoMonitorado.ml_id)
+    if not ML_NOTIFICACOES_HABILITADAS:
+        return db.execute(consulta).all()
+    agora = agora or datetime.utcnow()
+    coberto = NotificacaoItemML.ml_id.is_not(None)
+    corte = case(
+        (coberto, agora - timedelta(hours=ML_POLLING_COBERTOS_HORAS)),
+        else_=agora - timedelta(minutes=ML_POLLING_LENTO_MINUTOS)
+    )
+    return db.execute(
+        consulta
+        .outerjoin(EstatisticaProduto, EstatisticaProduto.produto_id == ProdutoMonitorado.id)
+        .outerjoin(NotificacaoItemML, (NotificacaoItemML.ml_id == ProdutoMonitorado.ml_id)
+                   & (NotificacaoItemML.ultima_notificacao_em >= agora - timedelta(days=NOTIFICACOES_JANELA_DIAS)))
+        .where(or_(EstatisticaProduto.ultimo_ponto_em.is_(None), EstatisticaProduto.ultimo_ponto_em < corte))
+    ).all()
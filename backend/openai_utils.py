@@ -1,22 +1,60 @@
 import os
-import openai
+from typing import TYPE_CHECKING, Optional
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
-async def gerar_resumo_avaliacoes(avaliacoes: list) -> str:
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+# OPENAI_BASE_URL permite apontar para um stub local (ver scripts/stub_openai.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+LIMITE_AVALIACOES_RESUMO = 10  # Limitar para não estourar o contexto
+RESUMO_MAX_TOKENS = 200
+
+_client: Optional["AsyncOpenAI"] = None
+
+def get_openai_client() -> "AsyncOpenAI":
+    """
+    Cliente criado no primeiro uso (sem OPENAI_API_KEY o construtor falha).
+    O pacote openai também só é importado aqui: pesa no boot do worker
+    """
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL)
+    return _client
+
+def textos_para_resumo(avaliacoes: list) -> list:
+    """Textos das avaliações que entram no prompt do resumo"""
+    textos = [a.get("content", "") for a in avaliacoes or [] if a.get("content")]
+    return textos[:LIMITE_AVALIACOES_RESUMO]
+
+def montar_prompt_resumo(textos: list) -> str:
+    return (
+        "Resuma em português, de forma clara e objetiva, os principais pontos positivos e negativos das avaliações a seguir sobre um produto do Mercado Livre:\n"
+        + "\n".join(textos)
+    )
+
+async def gerar_resumo_avaliacoes(avaliacoes: list, uso: Optional[dict] = None) -> str:
+    """
+    Gera o resumo das avaliações. Se `uso` for informado, é preenchido com
+    prompt_tokens, completion_tokens e total_tokens da chamada.
+    """
     if not avaliacoes:
         return "Sem avaliações suficientes para resumo."
-    textos = [a.get("content", "") for a in avaliacoes if a.get("content")]
+    textos = textos_para_resumo(avaliacoes)
     if not textos:
         return "Sem avaliações textuais."
-    prompt = (
-        "Resuma em português, de forma clara e objetiva, os principais pontos positivos e negativos das avaliações a seguir sobre um produto do Mercado Livre:\n"
-        + "\n".join(textos[:10])  # Limitar para não estourar o contexto
-    )
-    response = await openai.ChatCompletion.acreate(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=200,
+    response = await get_openai_client().chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[{"role": "user", "content": montar_prompt_resumo(textos)}],
+        max_tokens=RESUMO_MAX_TOKENS,
         temperature=0.7,
     )
-    return response.choices[0].message.content.strip() 
\ No newline at end of file
+    if uso is not None and response.usage:
+        uso.update({
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens
+        })
+    return response.choices[0].message.content.strip()
@@ -0,0 +1,138 @@
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+from sqlalchemy import text
+from database import engine
+
+# Manutenção das partições mensais de historico_precos (somente PostgreSQL):
+# cria as partições dos próximos meses e aplica a retenção, consolidando em
+# historico_precos_diario as partições que já saíram da janela e removendo-as
+# com DROP TABLE (barato, sem DELETE/VACUUM na tabela inteira).
+PARTICOES_MESES_FUTUROS = int(os.getenv("PARTICOES_MESES_FUTUROS", "3"))
+HISTORICO_RETENCAO_DIAS = int(os.getenv("HISTORICO_RETENCAO_DIAS", "365"))
+
+TABELA = "historico_precos"
+PARTICAO_PADRAO = f"{TABELA}_padrao"
+PARTICAO_REGEX = re.compile(rf"^{TABELA}_p(\d{{4}})_(\d{{2}})$")
+
+def inicio_mes(dia: date) -> date:
+    return date(dia.year, dia.month, 1)
+
+def proximo_mes(mes: date) -> date:
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+def nome_particao(mes: date) -> str:
+    return f"{TABELA}_p{mes.year:04d}_{mes.month:02d}"
+
+def _postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+def listar_particoes(connection) -> List[Tuple[str, date]]:
+    """Partições mensais existentes, como (nome, primeiro dia do mês)"""
+    nomes = connection.execute(text("""
+        SELECT filho.relname FROM pg_inherits
+        JOIN pg_class pai ON pai.oid = pg_inherits.inhparent
+        JOIN pg_class filho ON filho.oid = pg_inherits.inhrelid
+        WHERE pai.relname = :tabela
+    """), {"tabela": TABELA}).scalars().all()
+    particoes = []
+    for nome in nomes:
+        encontrado = PARTICAO_REGEX.match(nome)
+        if encontrado:
+            particoes.append((nome, date(int(encontrado.group(1)), int(encontrado.group(2)), 1)))
+    return sorted(particoes, key=lambda particao: particao[1])
+
+def criar_particao(connection, mes: date):
+    """
+    Cria a partição do mês. Se a partição padrão recebeu pontos desse mês
+    (ex: job parado), eles são movidos para a nova partição antes do ATTACH
+    """
+    nome, inicio, fim = nome_particao(mes), mes.isoformat(), proximo_mes(mes).isoformat()
+    connection.execute(text(f"CREATE TABLE {nome} (LIKE {TABELA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(f"""
+        WITH movidos AS (
+            DELETE FROM {PARTICAO_PADRAO} WHERE data >= '{inicio}' AND data < '{fim}' RETURNING *
+        )
+        INSERT INTO {nome} SELECT * FROM movidos
+    """))
+    connection.execute(text(f"ALTER TABLE {TABELA} ATTACH PARTITION {nome} FOR VALUES FROM ('{inicio}') TO ('{fim}')"))
+
+def criar_particoes_futuras(meses: int = PARTICOES_MESES_FUTUROS) -> List[str]:
+    """Garante as partições do mês atual e dos próximos `meses` meses"""
+    if not _postgres():
+        return []
+    criadas = []
+    with engine.begin() as connection:
+        existentes = {nome for nome, _ in listar_particoes(connection)}
+        mes = inicio_mes(datetime.utcnow().date())
+        for _ in range(meses + 1):
+            nome = nome_particao(mes)
+            if nome not in existentes:
+                criar_particao(connection, mes)
+                criadas.append(nome)
+            mes = proximo_mes(mes)
+    if criadas:
+        print(f"🗂️ Partições criadas: {', '.join(criadas)}")
+    return criadas
+
+# Consolida os pontos de uma origem por produto/dia; se o dia já tiver
+# agregado (ex: pontos da partição padrão), combina os dois
+SQL_CONSOLIDAR = """
+    INSERT INTO historico_precos_diario (produto_id, dia, preco_minimo, preco_maximo, preco_medio, estoque_final, pontos)
+    SELECT produto_id, CAST(data AS DATE), MIN(preco), MAX(preco), AVG(preco),
+           (ARRAY_AGG(estoque ORDER BY data DESC))[1], COUNT(*)
+    FROM {origem}
+    WHERE produto_id IS NOT NULL {filtro}
+    GROUP BY produto_id, CAST(data AS DATE)
+    ON CONFLICT (produto_id, dia) DO UPDATE SET
+        preco_minimo = LEAST(historico_precos_diario.preco_minimo, EXCLUDED.preco_minimo),
+        preco_maximo = GREATEST(historico_precos_diario.preco_maximo, EXCLUDED.preco_maximo),
+        preco_medio = (historico_precos_diario.preco_medio * historico_precos_diario.pontos + EXCLUDED.preco_medio * EXCLUDED.pontos)
+                      / (historico_precos_diario.pontos + EXCLUDED.pontos),
+        estoque_final = EXCLUDED.estoque_final,
+        pontos = historico_precos_diario.pontos + EXCLUDED.pontos
+"""
+
+def aplicar_retencao(dias: int = HISTORICO_RETENCAO_DIAS) -> dict:
+    """
+    Consolida e remove as partições inteiramente anteriores ao corte (hoje -
+    dias). A granularidade é o mês: uma partição só sai quando o mês inteiro
+    passou do corte. Pontos antigos caídos na partição padrão são consolidados
+    e apagados individualmente.
+    """
+    resultado = {"particoes_removidas": [], "pontos_padrao": 0}
+    if not _postgres() or dias <= 0:
+        return resultado
+    corte = datetime.utcnow().date() - timedelta(days=dias)
+    with engine.connect() as connection:
+        particoes = listar_particoes(connection)
+        connection.commit()
+        for nome, mes in particoes:
+            if proximo_mes(mes) > corte:
+                break
+            # Consolidação e DROP na mesma transação: ou os dois ou nenhum
+            with connection.begin():
+                connection.execute(text(SQL_CONSOLIDAR.format(origem=nome, filtro="")))
+                connection.execute(text(f"DROP TABLE {nome}"))
+            resultado["particoes_removidas"].append(nome)
+
+        with connection.begin():
+            connection.execute(
+                text(SQL_CONSOLIDAR.format(origem=PARTICAO_PADRAO, filtro="AND data < :corte")),
+                {"corte": corte}
+            )
+            resultado["pontos_padrao"] = connection.execute(
+                text(f"DELETE FROM {PARTICAO_PADRAO} WHERE data < :corte"), {"corte": corte}
+            ).rowcount
+
+    if resultado["particoes_removidas"] or resultado["pontos_padrao"]:
+        print(f"🧹 Retenção do histórico ({dias} dias): partições removidas {resultado['particoes_removidas']}, {resultado['pontos_padrao']} pontos da partição padrão")
+    return resultado
+
+def manter_particoes():
+    criar_particoes_futuras()
+    aplicar_retencao()
+
+if __name__ == "__main__":
+    manter_particoes()
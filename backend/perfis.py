@@ -0,0 +1,255 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Set
+from sqlalchemy import select
+from database import SessionLocal, AsyncSessionLocal
+from models import PerfilExecucao
+
+logger = logging.getLogger(__name__)
+
+# Profiler estatístico sob demanda (somente admin). Uma thread lê as pilhas
+# com sys._current_frames() a cada PERFIL_INTERVALO_MS e conta as pilhas no
+# formato "folded" (frame;frame;frame N), pronto para flamegraph.pl ou
+# speedscope. Sem pedido, requisições não pagam nada além de checar o header
+# e cada ciclo do scheduler faz uma consulta; com pedido, no máximo um perfil
+# por processo, limitado a PERFIL_MAX_SEGUNDOS.
+PERFIS_HABILITADOS = os.getenv("PERFIS_HABILITADOS", "1") == "1"
+PERFIL_INTERVALO_MS = max(1.0, float(os.getenv("PERFIL_INTERVALO_MS", "5")))
+PERFIL_MAX_SEGUNDOS = float(os.getenv("PERFIL_MAX_SEGUNDOS", "30"))
+PERFIS_MAX_GUARDADOS = int(os.getenv("PERFIS_MAX_GUARDADOS", "100"))
+PERFIL_PROFUNDIDADE_MAXIMA = 128
+
+HEADER_PERFIL = "x-perfil"
+PARAMETRO_PERFIL = b"perfil=1"
+
+# Threads de infraestrutura que só ficariam esperando em I/O
+THREADS_IGNORADAS = ("vigia-eventos", "vigia-scheduler-lider", "vigia-perfil")
+# Frames folha de threads ociosas (event loop sem trabalho, pools esperando tarefa)
+FOLHAS_OCIOSAS = {
+    ("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"),
+    ("threading.py", "_wait_for_tstate_lock"), ("thread.py", "_worker"),
+}
+
+_ocupado = threading.Lock()
+
+def _descrever_frame(frame) -> str:
+    codigo = frame.f_code
+    arquivo = "/".join(codigo.co_filename.replace("\\", "/").rsplit("/", 2)[-2:])
+    return f"{codigo.co_name} ({arquivo}:{frame.f_lineno})".replace(";", ",")
+
+def _pilha_folded(frame, nome_thread: str) -> Optional[str]:
+    codigo = frame.f_code
+    if (os.path.basename(codigo.co_filename), codigo.co_name) in FOLHAS_OCIOSAS:
+        return None
+    frames = []
+    while frame is not None and len(frames) < PERFIL_PROFUNDIDADE_MAXIMA:
+        frames.append(_descrever_frame(frame))
+        frame = frame.f_back
+    frames.append(nome_thread)
+    return ";".join(reversed(frames))
+
+class Amostrador(threading.Thread):
+    """
+    Amostra as pilhas das threads alvo (ou de todas, exceto as de
+    infraestrutura) até parar() ou até PERFIL_MAX_SEGUNDOS
+    """
+    def __init__(self, threads_alvo: Optional[Set[int]] = None):
+        super().__init__(name="vigia-perfil", daemon=True)
+        self.threads_alvo = threads_alvo
+        self.pilhas: Counter = Counter()
+        self.amostras = 0
+        self.inicio = time.perf_counter()
+        self.fim: Optional[float] = None
+        self._parar = threading.Event()
+
+    def run(self):
+        intervalo = PERFIL_INTERVALO_MS / 1000
+        limite = self.inicio + PERFIL_MAX_SEGUNDOS
+        while not self._parar.wait(intervalo) and time.perf_counter() < limite:
+            nomes: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                nome = nomes.get(ident, str(ident))
+                if ident == self.ident or nome in THREADS_IGNORADAS:
+                    continue
+                if self.threads_alvo is not None and ident not in self.threads_alvo:
+                    continue
+                pilha = _pilha_folded(frame, nome)
+                if pilha is not None:
+                    self.pilhas[pilha] += 1
+            self.amostras += 1
+
+    def parar(self) -> str:
+        self._parar.set()
+        self.join()
+        self.fim = time.perf_counter()
+        return "\n".join(f"{pilha} {contagem}" for pilha, contagem in self.pilhas.most_common())
+
+    @property
+    def duracao_ms(self) -> float:
+        return ((self.fim or time.perf_counter()) - self.inicio) * 1000
+
+def _concluir(perfil: PerfilExecucao, amostrador: Amostrador, pilhas: str):
+    perfil.status = "concluido"
+    perfil.concluido_em = datetime.utcnow()
+    perfil.duracao_ms = round(amostrador.duracao_ms, 1)
+    perfil.amostras = amostrador.amostras
+    perfil.pilhas = pilhas
+
+def _aplicar_retencao(db):
+    """Mantém só os PERFIS_MAX_GUARDADOS perfis concluídos mais recentes"""
+    antigos = db.execute(
+        select(PerfilExecucao.id).where(PerfilExecucao.status == "concluido")
+        .order_by(PerfilExecucao.id.desc()).offset(PERFIS_MAX_GUARDADOS)
+    ).scalars().all()
+    if antigos:
+        db.query(PerfilExecucao).filter(PerfilExecucao.id.in_(antigos)).delete(synchronize_session=False)
+
+# --- REQUISIÇÕES ---
+def pedido_de_perfil(scope) -> bool:
+    """Header X-Perfil: 1 ou ?perfil=1"""
+    if PARAMETRO_PERFIL in scope.get("query_string", b"").split(b"&"):
+        return True
+    return any(nome == HEADER_PERFIL.encode() and valor == b"1" for nome, valor in scope.get("headers", ()))
+
+async def _admin_da_requisicao(scope) -> Optional[int]:
+    from fastapi import HTTPException
+    from auth import autenticar_token
+    for nome, valor in scope.get("headers", ()):
+        if nome == b"authorization" and valor[:7].lower() == b"bearer ":
+            try:
+                usuario = await autenticar_token(valor[7:].decode("latin-1"))
+            except HTTPException:
+                return None
+            return usuario.id if usuario.is_admin else None
+    return None
+
+class MiddlewarePerfil:
+    """
+    Perfila a requisição quando um admin pede (X-Perfil: 1 ou ?perfil=1). O
+    id do perfil volta no header X-Perfil-Id; as pilhas ficam em
+    GET /admin/perfis/{id}. Amostra todas as threads do worker durante a
+    requisição (handler async no event loop, rotas síncronas no threadpool),
+    então requisições concorrentes no mesmo worker também aparecem.
+    Pedido de quem não é admin, ou com outro perfil em andamento, é ignorado.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not PERFIS_HABILITADOS or scope["type"] != "http" or not pedido_de_perfil(scope):
+            await self.app(scope, receive, send)
+            return
+        usuario_id = await _admin_da_requisicao(scope)
+        if usuario_id is None or not _ocupado.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with AsyncSessionLocal() as db:
+                try:
+                    perfil = PerfilExecucao(origem="requisicao", alvo=f"{scope['method']} {scope['path']}", status="coletando", solicitado_por=usuario_id)
+                    db.add(perfil)
+                    await db.commit()
+                    perfil_id = perfil.id
+                except Exception as e:
+                    # Sem onde gravar o perfil, a requisição segue normalmente
+                    logger.error(f"❌ Erro ao registrar perfil da requisição: {e}")
+                    await self.app(scope, receive, send)
+                    return
+
+                async def enviar(mensagem):
+                    if mensagem["type"] == "http.response.start":
+                        mensagem["headers"] = list(mensagem.get("headers", [])) + [(b"x-perfil-id", str(perfil_id).encode())]
+                    await send(mensagem)
+
+                amostrador = Amostrador()
+                amostrador.start()
+                try:
+                    await self.app(scope, receive, enviar)
+                finally:
+                    pilhas = amostrador.parar()
+                    rota = scope.get("route")
+                    if getattr(rota, "path", None):
+                        perfil.alvo = f"{scope['method']} {rota.path}"
+                    _concluir(perfil, amostrador, pilhas)
+                    try:
+                        await db.run_sync(_aplicar_retencao)
+                        await db.commit()
+                        logger.info(f"🔬 Perfil {perfil_id} ({perfil.alvo}): {amostrador.amostras} amostras em {amostrador.duracao_ms:.0f} ms")
+                    except Exception as e:
+                        logger.error(f"❌ Erro ao gravar perfil {perfil_id}: {e}")
+        finally:
+            _ocupado.release()
+
+# --- SCHEDULER ---
+def _reservar_pedido_scheduler(db, job: str) -> Optional[PerfilExecucao]:
+    """Pega um pedido pendente para este job (SKIP LOCKED: um ciclo por pedido)"""
+    return db.execute(
+        select(PerfilExecucao)
+        .where(PerfilExecucao.origem == "scheduler", PerfilExecucao.status == "pendente")
+        .where((PerfilExecucao.alvo == None) | (PerfilExecucao.alvo == job))  # noqa: E711
+        .order_by(PerfilExecucao.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).scalar_one_or_none()
+
+@contextmanager
+def perfilar_ciclo(job: str):
+    """
+    Envolve um ciclo de job do scheduler: se houver pedido pendente
+    (POST /admin/perfis/scheduler), amostra só a thread do job durante o
+    ciclo. Sem pedido, custa uma consulta por ciclo. Falhas do profiler
+    nunca interrompem o job.
+    """
+    if not PERFIS_HABILITADOS:
+        yield
+        return
+
+    db = SessionLocal()
+    perfil, amostrador = None, None
+    try:
+        try:
+            perfil = _reservar_pedido_scheduler(db, job)
+            # Com outro perfil em andamento no processo, o pedido fica para o próximo ciclo
+            if perfil is not None and _ocupado.acquire(blocking=False):
+                try:
+                    perfil.status = "coletando"
+                    perfil.alvo = job
+                    db.commit()
+                except Exception:
+                    _ocupado.release()
+                    raise
+                amostrador = Amostrador({threading.get_ident()})
+                amostrador.start()
+            else:
+                db.rollback()
+        except Exception as e:
+            logger.error(f"❌ Erro ao reservar perfil do scheduler: {e}")
+            db.rollback()
+        try:
+            yield
+        finally:
+            if amostrador is not None:
+                try:
+                    _concluir(perfil, amostrador, amostrador.parar())
+                    _aplicar_retencao(db)
+                    db.commit()
+                    logger.info(f"🔬 Perfil {perfil.id} ({job}): {amostrador.amostras} amostras em {amostrador.duracao_ms:.0f} ms")
+                except Exception as e:
+                    logger.error(f"❌ Erro ao gravar perfil do scheduler: {e}")
+                    db.rollback()
+                finally:
+                    _ocupado.release()
+    finally:
+        db.close()
+
+def pedir_perfis_scheduler(db, usuario_id: int, ciclos: int, job: Optional[str]) -> list:
+    perfis = [PerfilExecucao(origem="scheduler", alvo=job, status="pendente", solicitado_por=usuario_id) for _ in range(ciclos)]
+    db.add_all(perfis)
+    return perfis
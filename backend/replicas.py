@@ -0,0 +1,234 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
+from database import AsyncSessionLocal, build_async_url, argumentos_pool, configurar_ping, estatisticas_pool
+from metricas import instrumentar_engine
+
+logger = logging.getLogger(__name__)
+
+# Roteamento das rotas somente-leitura para réplicas do PostgreSQL.
+# - read-your-writes: por alguns segundos depois do commit de uma mutação do
+#   usuário as leituras dele vão para o primário. O horário do commit fica na
+#   memória deste worker e volta ao cliente no cookie/header vigia_escrita,
+#   que qualquer worker ou réplica da aplicação confere na leitura seguinte;
+# - failover: réplica que falha na conexão ou atrasa demais sai do rodízio
+#   até a próxima verificação saudável; sem réplica saudável, lê do primário.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+LEITURA_APOS_ESCRITA_SEGUNDOS = float(os.getenv("DB_LEITURA_APOS_ESCRITA_SEGUNDOS", "10"))
+REPLICA_ATRASO_MAXIMO_SEGUNDOS = float(os.getenv("DB_REPLICA_ATRASO_MAXIMO_SEGUNDOS", "30"))
+REPLICA_VERIFICACAO_SEGUNDOS = float(os.getenv("DB_REPLICA_VERIFICACAO_SEGUNDOS", "10"))
+COOKIE_ESCRITA = "vigia_escrita"
+HEADER_ESCRITA = "x-vigia-escrita"
+
+# Estado da requisição atual: {"usuario_id": quem está escrevendo (mutação
+# autenticada), "escrita_em": commit feito nela, "cliente_escrita_em": o que o
+# cliente mandou}. Um dict compartilhado porque as sessões síncronas rodam no
+# threadpool com uma cópia do contexto
+_requisicao: ContextVar[Optional[dict]] = ContextVar("vigia_requisicao_escrita", default=None)
+
+# Atraso de replay; 0 quando tudo que foi recebido já foi aplicado (evita
+# falso atraso com o primário ocioso) ou quando o servidor não é réplica
+SQL_ATRASO_REPLICA = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+class Replica:
+    def __init__(self, database_url: str):
+        url, connect_args = build_async_url(database_url)
+        self.nome = url.host or url.database or "replica"
+        self.engine = create_async_engine(url, connect_args=connect_args, pool_recycle=1800, echo=False, **argumentos_pool(url, "replica"))
+        configurar_ping(self.engine.sync_engine)
+        instrumentar_engine(self.engine.sync_engine, "replica")
+        self.sessoes = async_sessionmaker(self.engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        self.saudavel = True
+        self.atraso: Optional[float] = None
+        self.ultimo_erro: Optional[str] = None
+
+    def marcar_falha(self, erro: Exception):
+        if self.saudavel:
+            logger.warning(f"⚠️ Réplica {self.nome} fora do rodízio: {erro}")
+        self.saudavel = False
+        self.ultimo_erro = str(erro)[:200]
+
+    async def verificar(self):
+        try:
+            async with self.engine.connect() as connection:
+                atraso = float((await asyncio.wait_for(connection.execute(text(SQL_ATRASO_REPLICA)), 5)).scalar() or 0)
+        except Exception as e:
+            self.marcar_falha(e)
+            return
+        self.atraso = atraso
+        if atraso > REPLICA_ATRASO_MAXIMO_SEGUNDOS:
+            self.marcar_falha(Exception(f"atraso de replicação {atraso:.1f}s"))
+        elif not self.saudavel:
+            logger.info(f"✅ Réplica {self.nome} de volta ao rodízio (atraso {atraso:.1f}s)")
+            self.saudavel = True
+            self.ultimo_erro = None
+
+class RoteadorLeitura:
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._escritas: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._proxima = 0
+
+    def registrar_escrita(self, usuario_id: int):
+        if not self.replicas:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            self._escritas[usuario_id] = agora
+            if len(self._escritas) > 10000:
+                self._escritas = {k: v for k, v in self._escritas.items() if agora - v < LEITURA_APOS_ESCRITA_SEGUNDOS}
+
+    def escrita_recente(self, usuario_id: int) -> bool:
+        ultima = self._escritas.get(usuario_id)
+        if ultima is not None and time.monotonic() - ultima < LEITURA_APOS_ESCRITA_SEGUNDOS:
+            return True
+        # Escrita feita em outro worker: o cliente devolve o horário do commit
+        requisicao = _requisicao.get()
+        informada = requisicao and requisicao.get("cliente_escrita_em")
+        return bool(informada) and -5 < time.time() - informada < LEITURA_APOS_ESCRITA_SEGUNDOS
+
+    def escolher(self, usuario_id: Optional[int]) -> Optional[Replica]:
+        """Réplica saudável em rodízio, ou None para ler do primário"""
+        if usuario_id is not None and self.escrita_recente(usuario_id):
+            return None
+        saudaveis = [replica for replica in self.replicas if replica.saudavel]
+        if not saudaveis:
+            return None
+        self._proxima = (self._proxima + 1) % len(saudaveis)
+        return saudaveis[self._proxima]
+
+    async def monitorar(self):
+        while True:
+            await asyncio.gather(*(replica.verificar() for replica in self.replicas))
+            await asyncio.sleep(REPLICA_VERIFICACAO_SEGUNDOS)
+
+    def status(self) -> list:
+        return [
+            {
+                "nome": replica.nome, "saudavel": replica.saudavel, "atraso_segundos": replica.atraso, "ultimo_erro": replica.ultimo_erro,
+                "pool": estatisticas_pool(replica.engine.sync_engine)
+            }
+            for replica in self.replicas
+        ]
+
+roteador = RoteadorLeitura(DATABASE_REPLICA_URLS)
+_monitor: Optional[asyncio.Task] = None
+
+def registrar_escrita(usuario_id: int):
+    roteador.registrar_escrita(usuario_id)
+
+def marcar_requisicao_de_escrita(usuario_id: int):
+    """Mutação autenticada: os commits desta requisição contam como escritas do usuário"""
+    requisicao = _requisicao.get()
+    if requisicao is not None:
+        requisicao["usuario_id"] = usuario_id
+
+@event.listens_for(Session, "after_commit")
+def _commit_da_requisicao(session):
+    # Carimba depois do commit (não no início da requisição): escritas longas
+    # não gastam a janela de LEITURA_APOS_ESCRITA_SEGUNDOS antes de gravar
+    requisicao = _requisicao.get()
+    if requisicao is None or requisicao.get("usuario_id") is None:
+        return
+    registrar_escrita(requisicao["usuario_id"])
+    requisicao["escrita_em"] = time.time()
+
+def _ler_escrita_informada(headers) -> Optional[float]:
+    valor = None
+    for nome, conteudo in headers:
+        if nome == HEADER_ESCRITA.encode():
+            valor = conteudo.decode("latin-1")
+        elif nome == b"cookie" and valor is None:
+            for parte in conteudo.decode("latin-1").split(";"):
+                chave, _, dado = parte.strip().partition("=")
+                if chave == COOKIE_ESCRITA:
+                    valor = dado
+    try:
+        return float(valor) if valor else None
+    except ValueError:
+        return None
+
+class MiddlewareLeituraAposEscrita:
+    """
+    Liga o read-your-writes entre workers: lê o horário da última escrita
+    informado pelo cliente e, se houve commit nesta requisição, devolve o novo
+    horário (cookie curto + header X-Vigia-Escrita, que o frontend pode
+    reenviar). Commits feitos depois do início da resposta (streaming,
+    BackgroundTasks) ficam só na memória do worker
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not roteador.replicas:
+            await self.app(scope, receive, send)
+            return
+        requisicao = {"cliente_escrita_em": _ler_escrita_informada(scope["headers"])}
+        token = _requisicao.set(requisicao)
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start" and requisicao.get("escrita_em"):
+                valor = f"{requisicao['escrita_em']:.3f}"
+                mensagem["headers"] = list(mensagem.get("headers", [])) + [
+                    (HEADER_ESCRITA.encode(), valor.encode()),
+                    (b"set-cookie", f"{COOKIE_ESCRITA}={valor}; Max-Age={int(LEITURA_APOS_ESCRITA_SEGUNDOS)}; Path=/; HttpOnly; Secure; SameSite=None".encode()),
+                ]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _requisicao.reset(token)
+
+@asynccontextmanager
+async def abrir_sessao_leitura(usuario_id: Optional[int] = None) -> AsyncIterator[AsyncSession]:
+    """Sessão para consultas somente-leitura: réplica quando possível, senão primário"""
+    replica = roteador.escolher(usuario_id)
+    db = None
+    if replica is not None:
+        db = replica.sessoes()
+        try:
+            await db.connection()
+        except (DBAPIError, OSError) as e:
+            await db.close()
+            replica.marcar_falha(e)
+            replica, db = None, None
+    if db is None:
+        db = AsyncSessionLocal()
+    try:
+        yield db
+    except DBAPIError as e:
+        if replica is not None and e.connection_invalidated:
+            replica.marcar_falha(e)
+        raise
+    finally:
+        await db.close()
+
+def iniciar_replicas():
+    """Inicia a verificação periódica de saúde/atraso das réplicas"""
+    global _monitor
+    if roteador.replicas and _monitor is None:
+        logger.info(f"📚 Leituras roteadas para {len(roteador.replicas)} réplica(s)")
+        _monitor = asyncio.get_running_loop().create_task(roteador.monitorar())
+
+def parar_replicas():
+    global _monitor
+    if _monitor is not None:
+        _monitor.cancel()
+        _monitor = None
@@ -0,0 +1,231 @@
+import os
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import SessionLocal, AsyncSessionLocal
+from models import ResumoAvaliacao, ProdutoMonitorado
+from mercadolivre import buscar_avaliacoes_ml
+from openai_utils import gerar_resumo_avaliacoes, textos_para_resumo, montar_prompt_resumo, RESUMO_MAX_TOKENS
+from metricas import cache_consultas
+
+# Cache persistente dos resumos de avaliações (tabela resumos_avaliacoes).
+# Dentro do TTL o resumo salvo é devolvido sem chamar ML nem OpenAI; depois
+# dele as avaliações são conferidas pelo hash e o modelo só é chamado se mudaram.
+RESUMO_TTL = timedelta(hours=int(os.getenv("RESUMO_TTL_HORAS", "24")))
+
+# Pipeline em segundo plano: concorrência e orçamento por execução
+RESUMO_PIPELINE_CONCORRENCIA = int(os.getenv("RESUMO_PIPELINE_CONCORRENCIA", "4"))
+RESUMO_ORCAMENTO_TOKENS = int(os.getenv("RESUMO_ORCAMENTO_TOKENS", "50000"))
+RESUMO_ORCAMENTO_USD = float(os.getenv("RESUMO_ORCAMENTO_USD", "0.10"))
+OPENAI_PRECO_1K_TOKENS = float(os.getenv("OPENAI_PRECO_1K_TOKENS", "0.002"))
+
+# ml_ids com revalidação em segundo plano em andamento neste processo
+_revalidando = set()
+
+def calcular_hash_avaliacoes(avaliacoes: list) -> str:
+    """Hash dos textos de avaliação que entram no prompt"""
+    return hashlib.sha256("\n".join(textos_para_resumo(avaliacoes)).encode("utf-8")).hexdigest()
+
+async def carregar_resumo(db: AsyncSession, ml_id: str) -> Optional[ResumoAvaliacao]:
+    return (await db.execute(select(ResumoAvaliacao).where(ResumoAvaliacao.ml_id == ml_id))).scalars().first()
+
+async def revalidar_resumo(db: AsyncSession, ml_id: str, user_id: int, cache: Optional[ResumoAvaliacao] = None) -> Optional[ResumoAvaliacao]:
+    """Confere as avaliações atuais e regenera o resumo somente se mudaram"""
+    avaliacoes = await buscar_avaliacoes_ml(ml_id, user_id)
+    agora = datetime.utcnow()
+
+    # Busca falhou (sem token, erro, 429): nada é gravado, nem um resumo
+    # vazio que ficaria no cache pelo TTL inteiro; tenta de novo no próximo pedido
+    if avaliacoes is None:
+        return cache
+    # Sem avaliações: não sobrescrever um resumo bom
+    if not avaliacoes and cache:
+        return cache
+
+    hash_atual = calcular_hash_avaliacoes(avaliacoes)
+    if cache and cache.hash_avaliacoes == hash_atual:
+        cache.verificado_em = agora
+        await db.commit()
+        print(f"♻️ Resumo {ml_id}: avaliações inalteradas, mantendo cache")
+        return cache
+
+    print(f"🤖 Resumo {ml_id}: gerando ({len(avaliacoes)} avaliações)")
+    resumo = await gerar_resumo_avaliacoes(avaliacoes)
+    if cache is None:
+        cache = ResumoAvaliacao(ml_id=ml_id)
+        db.add(cache)
+    cache.hash_avaliacoes = hash_atual
+    cache.resumo = resumo
+    cache.total_avaliacoes = len(avaliacoes)
+    cache.gerado_em = agora
+    cache.verificado_em = agora
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Outra requisição gravou o mesmo ml_id em paralelo
+        await db.rollback()
+        return await carregar_resumo(db, ml_id)
+    return cache
+
+async def revalidar_resumo_em_segundo_plano(ml_id: str, user_id: int):
+    if ml_id in _revalidando:
+        return
+    _revalidando.add(ml_id)
+    # Sessão própria: a da requisição já foi fechada quando a tarefa roda
+    try:
+        async with AsyncSessionLocal() as db:
+            await revalidar_resumo(db, ml_id, user_id, await carregar_resumo(db, ml_id))
+    except Exception as e:
+        print(f"❌ Erro ao revalidar resumo {ml_id} em segundo plano: {e}")
+    finally:
+        _revalidando.discard(ml_id)
+
+async def obter_resumo(db: AsyncSession, ml_id: str, user_id: int, background_tasks=None) -> Tuple[Optional[ResumoAvaliacao], str]:
+    """
+    Retorna (resumo, origem). Com background_tasks, um resumo expirado é
+    devolvido na hora e a revalidação roda depois da resposta.
+    """
+    cache = await carregar_resumo(db, ml_id)
+    if cache and datetime.utcnow() - cache.verificado_em < RESUMO_TTL:
+        cache_consultas.inc("resumo", "acerto")
+        return cache, "cache"
+    if cache and background_tasks is not None:
+        cache_consultas.inc("resumo", "expirado")
+        background_tasks.add_task(revalidar_resumo_em_segundo_plano, ml_id, user_id)
+        return cache, "cache_expirado"
+    cache_consultas.inc("resumo", "falha")
+    return await revalidar_resumo(db, ml_id, user_id, cache), "gerado"
+
+# --- PIPELINE DE PRÉ-GERAÇÃO ---
+class OrcamentoResumos:
+    """
+    Orçamento de tokens e custo de uma execução do pipeline. Cada chamada
+    reserva uma estimativa antes de ir ao modelo (chamadas concorrentes não
+    estouram o limite) e depois é ajustada pelo uso real.
+    """
+    def __init__(self, max_tokens: int, max_custo_usd: float, preco_1k_tokens: float):
+        self.max_tokens = max_tokens
+        self.max_custo_usd = max_custo_usd
+        self.preco_1k_tokens = preco_1k_tokens
+        self.tokens = 0
+
+    @property
+    def custo_usd(self) -> float:
+        return self.tokens / 1000 * self.preco_1k_tokens
+
+    def reservar(self, tokens: int) -> bool:
+        novo_total = self.tokens + tokens
+        if novo_total > self.max_tokens or novo_total / 1000 * self.preco_1k_tokens > self.max_custo_usd:
+            return False
+        self.tokens = novo_total
+        return True
+
+    def ajustar(self, estimado: int, real: int):
+        self.tokens += real - estimado
+
+def estimar_tokens_resumo(avaliacoes: list) -> int:
+    """Estimativa conservadora (~4 caracteres por token) do prompt + resposta"""
+    return len(montar_prompt_resumo(textos_para_resumo(avaliacoes))) // 4 + RESUMO_MAX_TOKENS
+
+async def pre_gerar_resumos(
+    concorrencia: int = RESUMO_PIPELINE_CONCORRENCIA,
+    max_tokens: int = RESUMO_ORCAMENTO_TOKENS,
+    max_custo_usd: float = RESUMO_ORCAMENTO_USD
+) -> dict:
+    """
+    Percorre os produtos monitorados, busca as avaliações com concorrência
+    limitada e gera resumos apenas para os itens cujas avaliações mudaram,
+    até esgotar o orçamento da execução. Grava tudo em uma transação no final.
+    Roda no scheduler (asyncio.run em thread própria), por isso usa a
+    sessão síncrona: o engine async pertence ao loop da aplicação.
+    """
+    db: Session = SessionLocal()
+    try:
+        # Um usuário com token por ml_id basta para buscar as avaliações
+        alvos = {}
+        for ml_id, usuario_id in db.query(ProdutoMonitorado.ml_id, ProdutoMonitorado.usuario_id).distinct():
+            alvos.setdefault(ml_id, usuario_id)
+        hashes = dict(
+            db.query(ResumoAvaliacao.ml_id, ResumoAvaliacao.hash_avaliacoes).filter(ResumoAvaliacao.ml_id.in_(list(alvos)))
+        ) if alvos else {}
+    finally:
+        db.close()
+
+    orcamento = OrcamentoResumos(max_tokens, max_custo_usd, OPENAI_PRECO_1K_TOKENS)
+    semaforo = asyncio.Semaphore(concorrencia)
+    print(f"🤖 Pipeline de resumos: {len(alvos)} itens, concorrência {concorrencia}, orçamento {max_tokens} tokens / US$ {max_custo_usd:.2f}")
+
+    async def processar(ml_id: str, usuario_id: int):
+        async with semaforo:
+            avaliacoes = await buscar_avaliacoes_ml(ml_id, usuario_id)
+            if not avaliacoes:
+                return ml_id, "sem_avaliacoes", None
+            hash_atual = calcular_hash_avaliacoes(avaliacoes)
+            if hashes.get(ml_id) == hash_atual:
+                return ml_id, "inalterado", None
+            estimativa = estimar_tokens_resumo(avaliacoes)
+            if not orcamento.reservar(estimativa):
+                return ml_id, "sem_orcamento", None
+            uso = {}
+            try:
+                resumo = await gerar_resumo_avaliacoes(avaliacoes, uso=uso)
+            finally:
+                orcamento.ajustar(estimativa, uso.get("total_tokens", estimativa))
+            return ml_id, "gerado", (hash_atual, resumo, len(avaliacoes))
+
+    resultados = await asyncio.gather(*(processar(ml_id, uid) for ml_id, uid in alvos.items()), return_exceptions=True)
+
+    contagem = {"gerado": 0, "inalterado": 0, "sem_avaliacoes": 0, "sem_orcamento": 0, "erro": 0}
+    gerados = {}
+    inalterados = []
+    for resultado in resultados:
+        if isinstance(resultado, Exception):
+            print(f"❌ Pipeline de resumos: {resultado}")
+            contagem["erro"] += 1
+            continue
+        ml_id, situacao, dados = resultado
+        contagem[situacao] += 1
+        if situacao == "gerado":
+            gerados[ml_id] = dados
+        elif situacao == "inalterado":
+            inalterados.append(ml_id)
+
+    if gerados or inalterados:
+        db = SessionLocal()
+        try:
+            agora = datetime.utcnow()
+            existentes = {
+                r.ml_id: r for r in db.query(ResumoAvaliacao).filter(ResumoAvaliacao.ml_id.in_(list(gerados) + inalterados))
+            }
+            for ml_id in inalterados:
+                if ml_id in existentes:
+                    existentes[ml_id].verificado_em = agora
+            for ml_id, (hash_atual, resumo, total) in gerados.items():
+                cache = existentes.get(ml_id)
+                if cache is None:
+                    cache = ResumoAvaliacao(ml_id=ml_id)
+                    db.add(cache)
+                cache.hash_avaliacoes = hash_atual
+                cache.resumo = resumo
+                cache.total_avaliacoes = total
+                cache.gerado_em = agora
+                cache.verificado_em = agora
+            db.commit()
+        except Exception as e:
+            print(f"❌ Erro ao gravar resumos do pipeline: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    resumo_execucao = {**contagem, "tokens": orcamento.tokens, "custo_usd": round(orcamento.custo_usd, 4)}
+    print(f"✅ Pipeline de resumos concluído: {resumo_execucao}")
+    return resumo_execucao
+
+if __name__ == "__main__":
+    # Execução manual: OPENAI_BASE_URL=http://localhost:8099/v1 python resumos.py
+    asyncio.run(pre_gerar_resumos())
@@ -1,31 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from models import (
     UsuarioOut, UsuarioCreate, LoginRequest, MLAuthRequest,
-    ProdutoMonitoradoOut, ProdutoMonitoradoCreate, 
-    HistoricoPrecoOut, AlertaOut, AlertaCreate, 
-    Usuario, ProdutoMonitorado, HistoricoPreco, Alerta
+    ProdutoMonitoradoOut, ProdutoMonitoradoCreate, ProdutoBatchCreate, ProdutoBatchOut,
+    HistoricoPrecoOut, AlertaOut, AlertaCreate, ResumoAvaliacaoOut, PerfilOut, PerfilSchedulerCreate, AnalisePrecoOut,
+    BuscaSalvaCreate, BuscaSalvaOut, EventoBuscaOut,
+    Usuario, ProdutoMonitorado, HistoricoPreco, Alerta, PerfilExecucao, EstatisticaProduto, HistoricoPrecoDiario,
+    HistoricoArquivo, BuscaSalva, EventoBusca
 )
-from sqlalchemy import text
-from database import get_db
-from auth import create_access_token, get_current_user, google_oauth_login
-from passlib.context import CryptContext
-from datetime import datetime
+from sqlalchemy import text, func, select, delete
+from database import get_db, get_async_db
+from senhas import gerar_hash_senha, verificar_senha
+from auth import criar_token_usuario, get_current_user, get_current_admin, get_async_db_leitura, google_oauth_login, autenticar_token, UsuarioAutenticado
+from datetime import datetime, timedelta
 from mercadolivre import (
     buscar_produto_ml, buscar_avaliacoes_ml, buscar_produtos_ml, MLTokenManager,
-    get_ml_auth_url, exchange_code_for_token, MLTokenManager, ML_API_URL, ml_tokens
+    get_ml_auth_url, exchange_code_for_token, MLTokenManager, ML_API_URL, ml_tokens,
+    buscar_produtos_por_ids_ml, extrair_ml_id, ML_MULTIGET_MAX_IDS, cliente_ml
 )
+from atualizacao import gravar_atualizacoes, publicar_mudanca_preco
+from eventos import distribuidor, HEARTBEAT_SEGUNDOS
+from exportacao import gerar_exportacao_historico
+from resumos import obter_resumo
+from http_cache import gerar_etag, etag_corresponde, aplicar_etag, resposta_nao_modificada, aceita_codificacao
+from perfis import pedir_perfis_scheduler
+from analise_precos import analisar_produtos
+from estatisticas import registrar_pontos
+from indice_alertas import alerta_criado, alerta_removido, produto_removido
+from buscas_salvas import executar_e_gravar, BUSCAS_MAX_POR_USUARIO
+from notificacoes_ml import webhook_configurado, verificar_assinatura, aplicacao_confere, ml_id_da_notificacao, SQL_ENFILEIRAR
+from metricas import notificacoes_ml
+from arquivo_historico import consulta_arquivos, consulta_versao_arquivo, pontos_arquivados
 import asyncio
+import json
 from openai_utils import gerar_resumo_avaliacoes
-import httpx
 from pydantic import BaseModel
 import traceback
 import os
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+LIMITE_IMPORTACAO_LOTE = 500  # Máximo de itens por POST /produtos/batch
+LIMITE_CICLOS_PERFIL = 20  # Máximo de ciclos do scheduler por pedido de perfil
+TIPOS_ALERTA = ("preco_alvo", "minimo_90d", "minimo_historico", "queda_percentual", "anomalia")
+JOBS_PERFILAVEIS = (
+    "atualizar_todos_produtos", "processar_fila_notificacoes", "atualizar_buscas_salvas",
+    "gerar_resumos_pendentes", "manter_historico"
+)
+LIMITE_EVENTOS_BUSCA = 200  # Máximo de eventos por GET /buscas/{id}/eventos
 
 # Modelos para resposta
 class MLTestResponse(BaseModel):
@@ -40,11 +66,11 @@ class MLAuthResponse(BaseModel):
 
 # --- AUTENTICAÇÃO ---
 @router.post("/auth/register", response_model=UsuarioOut)
-async def register(usuario: UsuarioCreate, db: Session = Depends(get_db)):
+async def register(usuario: UsuarioCreate, db: AsyncSession = Depends(get_async_db)):
     print(f"✅ DEBUG: Tentando registrar usuário: {usuario.email}")
     
     # Verificar se usuário já existe
-    existing_user = db.query(Usuario).filter(Usuario.email == usuario.email).first()
+    existing_user = (await db.execute(select(Usuario).where(Usuario.email == usuario.email))).scalar_one_or_none()
     if existing_user:
         print(f"❌ DEBUG: Email já existe: {usuario.email}")
         raise HTTPException(status_code=400, detail="Email já cadastrado")
@@ -53,7 +79,7 @@ async def register(usuario: UsuarioCreate, db: Session = Depends(get_db)):
     if not usuario.senha or len(usuario.senha) < 6:
         raise HTTPException(status_code=400, detail="Senha deve ter pelo menos 6 caracteres")
         
-    senha_hash = pwd_context.hash(usuario.senha)
+    senha_hash = await gerar_hash_senha(usuario.senha)
     print(f"🔒 DEBUG: Senha hash gerado: Sim")
     
     # Criar usuário
@@ -67,21 +93,21 @@ async def register(usuario: UsuarioCreate, db: Session = Depends(get_db)):
     
     db.add(db_usuario)
     try:
-        db.commit()
-        db.refresh(db_usuario)
+        await db.commit()
+        await db.refresh(db_usuario)
         print(f"✅ DEBUG: Usuário criado com sucesso: ID {db_usuario.id}")
     except Exception as e:
         print(f"❌ DEBUG: Erro ao criar usuário: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
     
     return db_usuario
 
 @router.post("/auth/login") 
-async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     print(f"🔐 DEBUG: Tentativa de login: {login_data.email}")
     
-    user = db.query(Usuario).filter(Usuario.email == login_data.email).first()
+    user = (await db.execute(select(Usuario).where(Usuario.email == login_data.email))).scalar_one_or_none()
     if not user:
         print(f"❌ DEBUG: Usuário não encontrado: {login_data.email}")
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
@@ -91,13 +117,20 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
         print(f"❌ DEBUG: Usuário {login_data.email} não tem senha configurada")
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
         
-    if not pwd_context.verify(login_data.senha, user.senha_hash):
+    senha_valida, novo_hash = await verificar_senha(login_data.senha, user.senha_hash)
+    if not senha_valida:
         print(f"❌ DEBUG: Senha incorreta para: {login_data.email}")
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
     
+    if novo_hash:
+        # Custo do bcrypt mudou (BCRYPT_ROUNDS): regrava o hash com o custo atual
+        user.senha_hash = novo_hash
+        await db.commit()
+        print(f"🔒 DEBUG: Hash de senha atualizado para: {user.email}")
+    
     print(f"✅ DEBUG: Login bem-sucedido: {user.email}")
     
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = criar_token_usuario(user)
     return {
         "access_token": access_token, 
         "token_type": "bearer",
@@ -115,7 +148,7 @@ async def login_google(token_id: str, db: Session = Depends(get_db)):
 
 # --- AUTENTICAÇÃO MERCADO LIVRE ---
 @router.get("/auth/mercadolivre/url", response_model=MLAuthResponse)
-async def get_mercadolivre_auth_url(current_user: Usuario = Depends(get_current_user)):
+async def get_mercadolivre_auth_url(current_user: UsuarioAutenticado = Depends(get_current_user)):
     """Gera URL de autorização do Mercado Livre para o usuário"""
     try:
         state = f"user_{current_user.id}_{datetime.now().timestamp()}"
@@ -130,7 +163,7 @@ async def get_mercadolivre_auth_url(current_user: Usuario = Depends(get_current_
         raise HTTPException(status_code=500, detail=f"Erro ao gerar URL de autorização: {str(e)}")
 
 @router.post("/auth/mercadolivre/callback", summary="OAuth 2.0 Callback - Conforme doc oficial ML 2025")
-async def mercadolivre_callback(auth_data: MLAuthRequest, current_user: Usuario = Depends(get_current_user)):
+async def mercadolivre_callback(auth_data: MLAuthRequest, current_user: UsuarioAutenticado = Depends(get_current_user)):
     """
     Processa callback do OAuth 2.0 + PKCE do Mercado Livre
     Conforme documentação oficial 2025: https://developers.mercadolivre.com.br/pt_br/autenticacao-e-autorizacao
@@ -153,8 +186,7 @@ async def mercadolivre_callback(auth_data: MLAuthRequest, current_user: Usuario
         
         # CRÍTICO: Verificar imediatamente se o token funciona
         print(f"🧪 [OAUTH 2025] Testando token recém-salvo para user {current_user.id}")
-        import httpx
-        async with httpx.AsyncClient() as client:
+        async with cliente_ml() as client:
             test_response = await client.get(
                 f"{ML_API_URL}/users/me",
                 headers={"Authorization": f"Bearer {token_data['access_token']}"},
@@ -184,7 +216,7 @@ async def mercadolivre_callback(auth_data: MLAuthRequest, current_user: Usuario
         raise HTTPException(status_code=400, detail=f"Erro no callback OAuth: {str(e)}")
 
 @router.delete("/auth/mercadolivre/revoke")
-async def revoke_mercadolivre_auth(current_user: Usuario = Depends(get_current_user)):
+async def revoke_mercadolivre_auth(current_user: UsuarioAutenticado = Depends(get_current_user)):
     """Revoga autorização do Mercado Livre para o usuário"""
     MLTokenManager.revoke_token(current_user.id)
     return {"success": True, "message": "Autorização do Mercado Livre revogada"}
@@ -211,7 +243,7 @@ def validate_ml_oauth_compliance(user_id: int) -> dict:
     }
 
 @router.get("/auth/mercadolivre/status")
-async def mercadolivre_auth_status(current_user: Usuario = Depends(get_current_user)):
+async def mercadolivre_auth_status(current_user: UsuarioAutenticado = Depends(get_current_user)):
     """Verifica status da autorização OAuth 2.0 + PKCE do Mercado Livre"""
     print(f"🔍 [ML STATUS] Verificando status para user {current_user.id}")
     
@@ -227,8 +259,7 @@ async def mercadolivre_auth_status(current_user: Usuario = Depends(get_current_u
             try:
                 print(f"🧪 [ML STATUS] Testando token para user {current_user.id}")
                 # Fazer uma chamada simples para verificar se token funciona
-                import httpx
-                async with httpx.AsyncClient() as client:
+                async with cliente_ml() as client:
                     test_response = await client.get(
                         f"{ML_API_URL}/users/me",
                         headers={"Authorization": f"Bearer {token}"},
@@ -266,12 +297,12 @@ async def mercadolivre_auth_status(current_user: Usuario = Depends(get_current_u
 
 # --- USUÁRIOS ---
 @router.get("/usuarios/me", response_model=UsuarioOut)
-async def get_me(current_user: Usuario = Depends(get_current_user)):
+async def get_me(current_user: UsuarioAutenticado = Depends(get_current_user)):
     return current_user
 
 # --- PRODUTOS MONITORADOS ---
 @router.post("/produtos/", response_model=ProdutoMonitoradoOut)
-async def adicionar_produto(produto: ProdutoMonitoradoCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+async def adicionar_produto(produto: ProdutoMonitoradoCreate, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
     print(f"➕ Adicionando produto para user {current_user.id}: {produto.ml_id}")
     
     db_produto = ProdutoMonitorado(
@@ -284,33 +315,155 @@ async def adicionar_produto(produto: ProdutoMonitoradoCreate, db: Session = Depe
         criado_em=datetime.utcnow()
     )
     db.add(db_produto)
-    db.commit()
-    db.refresh(db_produto)
+    await db.commit()
+    await db.refresh(db_produto)
     
     print(f"✅ Produto adicionado: ID {db_produto.id}")
     return db_produto
 
+@router.post("/produtos/batch", response_model=ProdutoBatchOut)
+async def adicionar_produtos_lote(lote: ProdutoBatchCreate, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    """
+    📦 IMPORTAÇÃO EM LOTE - ml_ids ou URLs
+
+    Valida e precifica todos os itens com multi-get do ML (20 ids por chamada),
+    insere produtos e o primeiro ponto de histórico em uma única transação
+    e retorna o resultado de cada item.
+    """
+    if not lote.itens:
+        raise HTTPException(status_code=400, detail="Informe ao menos um item")
+    if len(lote.itens) > LIMITE_IMPORTACAO_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo de {LIMITE_IMPORTACAO_LOTE} itens por lote")
+    
+    print(f"📦 Importação em lote para user {current_user.id}: {len(lote.itens)} itens")
+    
+    entradas = [(entrada, extrair_ml_id(entrada)) for entrada in lote.itens]
+    ids_validos = list(dict.fromkeys(ml_id for _, ml_id in entradas if ml_id))
+    
+    ja_monitorados = set()
+    if ids_validos:
+        ja_monitorados = set((await db.execute(
+            select(ProdutoMonitorado.ml_id).where(
+                ProdutoMonitorado.usuario_id == current_user.id,
+                ProdutoMonitorado.ml_id.in_(ids_validos)
+            )
+        )).scalars())
+    
+    a_buscar = [ml_id for ml_id in ids_validos if ml_id not in ja_monitorados]
+    dados_ml = await buscar_produtos_por_ids_ml(a_buscar, current_user.id) if a_buscar else {}
+    
+    agora = datetime.utcnow()
+    novos = {}
+    for ml_id in a_buscar:
+        dados = dados_ml.get(ml_id)
+        if not dados:
+            continue
+        novos[ml_id] = ProdutoMonitorado(
+            usuario_id=current_user.id,
+            ml_id=ml_id,
+            nome=dados["nome"],
+            url=dados["url"],
+            preco_atual=dados["preco"] or 0.0,
+            estoque_atual=dados["estoque"] or 0,
+            criado_em=agora
+        )
+    
+    produtos_out = {}
+    if novos:
+        db.add_all(novos.values())
+        try:
+            # flush em lote obtém os ids via INSERT ... RETURNING
+            await db.flush()
+            db.add_all([
+                HistoricoPreco(
+                    produto_id=produto.id,
+                    preco=produto.preco_atual,
+                    estoque=produto.estoque_atual,
+                    data=agora
+                )
+                for produto in novos.values()
+            ])
+            await db.run_sync(lambda sessao: registrar_pontos(sessao, [(produto.id, produto.preco_atual, agora) for produto in novos.values()]))
+            # Serializar antes do commit evita um refresh por produto
+            produtos_out = {ml_id: ProdutoMonitoradoOut.model_validate(produto, from_attributes=True) for ml_id, produto in novos.items()}
+            await db.commit()
+        except Exception as e:
+            print(f"❌ Erro na importação em lote: {e}")
+            await db.rollback()
+            raise HTTPException(status_code=500, detail="Erro ao importar produtos")
+    
+    resultados = []
+    vistos = set()
+    for entrada, ml_id in entradas:
+        if not ml_id:
+            status_item = "invalido"
+        elif ml_id in ja_monitorados or ml_id in vistos:
+            status_item = "duplicado"
+        elif ml_id in produtos_out:
+            status_item = "criado"
+        else:
+            status_item = "nao_encontrado"
+        resultados.append({
+            "entrada": entrada,
+            "ml_id": ml_id,
+            "status": status_item,
+            "produto": produtos_out.get(ml_id) if status_item == "criado" else None
+        })
+        if ml_id:
+            vistos.add(ml_id)
+    
+    print(f"✅ Lote importado para user {current_user.id}: {len(produtos_out)} criados de {len(lote.itens)}")
+    return {"total": len(lote.itens), "criados": len(produtos_out), "resultados": resultados}
+
 @router.get("/produtos/", response_model=List[ProdutoMonitoradoOut])
-async def listar_produtos(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+async def listar_produtos(request: Request, response: Response, db: AsyncSession = Depends(get_async_db_leitura), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    # Marcador de versão: inclusões/remoções mudam contagem ou maior id, edições mudam
+    # atualizado_em; pontos novos de preço mudam o atualizado_em das estatísticas
+    total, maior_id, ultima_alteracao, ultima_estatistica = (await db.execute(
+        select(func.count(ProdutoMonitorado.id), func.max(ProdutoMonitorado.id), func.max(ProdutoMonitorado.atualizado_em), func.max(EstatisticaProduto.atualizado_em))
+        .outerjoin(EstatisticaProduto, EstatisticaProduto.produto_id == ProdutoMonitorado.id)
+        .where(ProdutoMonitorado.usuario_id == current_user.id)
+    )).one()
+    etag = gerar_etag("produtos", current_user.id, total, maior_id, ultima_alteracao, ultima_estatistica)
+    if etag_corresponde(request, etag):
+        return resposta_nao_modificada(etag)
+    
     print(f"📋 Listando produtos para user {current_user.id}")
     
-    produtos = db.query(ProdutoMonitorado).filter(ProdutoMonitorado.usuario_id == current_user.id).all()
+    # Estatísticas de preço na mesma consulta (uma linha por produto, sem varrer o histórico)
+    linhas = (await db.execute(
+        select(ProdutoMonitorado, EstatisticaProduto)
+        .outerjoin(EstatisticaProduto, EstatisticaProduto.produto_id == ProdutoMonitorado.id)
+        .where(ProdutoMonitorado.usuario_id == current_user.id)
+    )).all()
+    produtos = []
+    for produto, estatistica in linhas:
+        produto.estatisticas = estatistica
+        produtos.append(produto)
+    aplicar_etag(response, etag)
     return produtos
 
 @router.delete("/produtos/{produto_id}", status_code=204)
-async def remover_produto(produto_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    produto = db.query(ProdutoMonitorado).filter(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id).first()
+async def remover_produto(produto_id: int, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    produto = (await db.execute(select(ProdutoMonitorado).where(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id))).scalar_one_or_none()
     if not produto:
         print(f"❌ Produto {produto_id} não encontrado para user {current_user.id}")
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     print(f"🗑️ Removendo produto {produto_id} para user {current_user.id}")
-    db.delete(produto)
-    db.commit()
+    # Histórico e alertas referenciam o produto (FK sem cascade)
+    await db.execute(delete(HistoricoPreco).where(HistoricoPreco.produto_id == produto_id))
+    await db.execute(delete(Alerta).where(Alerta.produto_id == produto_id))
+    await db.execute(delete(EstatisticaProduto).where(EstatisticaProduto.produto_id == produto_id))
+    await db.execute(delete(HistoricoPrecoDiario).where(HistoricoPrecoDiario.produto_id == produto_id))
+    await db.execute(delete(HistoricoArquivo).where(HistoricoArquivo.produto_id == produto_id))
+    await db.run_sync(produto_removido, produto_id)
+    await db.delete(produto)
+    await db.commit()
     return
 
 @router.put("/produtos/{produto_id}", response_model=ProdutoMonitoradoOut)
-async def atualizar_produto(produto_id: int, produto: ProdutoMonitoradoCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    db_produto = db.query(ProdutoMonitorado).filter(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id).first()
+async def atualizar_produto(produto_id: int, produto: ProdutoMonitoradoCreate, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    db_produto = (await db.execute(select(ProdutoMonitorado).where(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id))).scalar_one_or_none()
     if not db_produto:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     
@@ -318,19 +471,19 @@ async def atualizar_produto(produto_id: int, produto: ProdutoMonitoradoCreate, d
     db_produto.ml_id = produto.ml_id
     db_produto.nome = produto.nome
     db_produto.url = produto.url
-    db.commit()
-    db.refresh(db_produto)
+    await db.commit()
+    await db.refresh(db_produto)
     return db_produto
 
 @router.put("/produtos/{produto_id}/atualizar", response_model=ProdutoMonitoradoOut)
-async def atualizar_produto_ml(produto_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+async def atualizar_produto_ml(produto_id: int, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
     """
     🔐 ATUALIZAR PRODUTO COM ML - SEMPRE AUTENTICADO
     
     Esta função busca dados atualizados do produto diretamente do ML
     usando o token OAuth do usuário autenticado.
     """
-    produto = db.query(ProdutoMonitorado).filter(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id).first()
+    produto = (await db.execute(select(ProdutoMonitorado).where(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id))).scalar_one_or_none()
     if not produto:
         print(f"❌ Produto {produto_id} não encontrado para atualização: user {current_user.id}")
         raise HTTPException(status_code=404, detail="Produto não encontrado")
@@ -345,16 +498,57 @@ async def atualizar_produto_ml(produto_id: int, db: Session = Depends(get_db), c
     print(f"✅ Dados ML obtidos: {dados_ml.get('nome', 'N/A')[:50]}... - R$ {dados_ml.get('preco', 0)}")
     
     # Atualizar produto no banco
+    preco_anterior, estoque_anterior = produto.preco_atual, produto.estoque_atual
     produto.nome = dados_ml["nome"]
     produto.preco_atual = dados_ml["preco"]
     produto.estoque_atual = dados_ml["estoque"]
     produto.url = dados_ml["url"]
-    db.commit()
-    db.refresh(produto)
+    await db.run_sync(lambda sessao: publicar_mudanca_preco(sessao, produto, preco_anterior, estoque_anterior))
+    await db.commit()
+    await db.refresh(produto)
     
     print(f"💾 Produto {produto_id} atualizado no banco")
     return produto
 
+@router.post("/produtos/atualizar", summary="Atualiza todos os produtos do usuário (progresso em NDJSON)")
+async def atualizar_todos_produtos_ml(db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    """
+    🔄 ATUALIZAÇÃO EM MASSA - todos os produtos do usuário
+
+    Busca os produtos no ML em lotes de multi-get concorrentes (dividindo o
+    rate limit com o scheduler) e grava tudo em uma única transação.
+    A resposta é um stream NDJSON: "inicio", um "progresso" por lote e "concluido".
+    """
+    usuario_id = current_user.id
+    ml_ids = list(dict.fromkeys((await db.execute(
+        select(ProdutoMonitorado.ml_id).where(ProdutoMonitorado.usuario_id == usuario_id)
+    )).scalars()))
+    # A gravação usa sessão própria: liberar a conexão antes do stream longo
+    await db.close()
+    lotes = [ml_ids[i:i + ML_MULTIGET_MAX_IDS] for i in range(0, len(ml_ids), ML_MULTIGET_MAX_IDS)]
+    print(f"🔄 Atualização em massa para user {usuario_id}: {len(ml_ids)} produtos em {len(lotes)} lotes")
+    
+    async def buscar_lote(lote):
+        return len(lote), await buscar_produtos_por_ids_ml(lote, usuario_id)
+    
+    async def progresso():
+        yield json.dumps({"evento": "inicio", "total": len(ml_ids)}) + "\n"
+        dados = {}
+        buscados = 0
+        for tarefa in asyncio.as_completed([buscar_lote(lote) for lote in lotes]):
+            tamanho, parcial = await tarefa
+            buscados += tamanho
+            dados.update(parcial)
+            yield json.dumps({"evento": "progresso", "buscados": buscados, "encontrados": len(dados), "total": len(ml_ids)}) + "\n"
+        try:
+            resumo = await run_in_threadpool(gravar_atualizacoes, usuario_id, dados)
+            yield json.dumps({"evento": "concluido", **resumo}) + "\n"
+        except Exception as e:
+            print(f"❌ Erro ao gravar atualização em massa para user {usuario_id}: {e}")
+            yield json.dumps({"evento": "erro", "detail": "Erro ao gravar atualizações"}) + "\n"
+    
+    return StreamingResponse(progresso(), media_type="application/x-ndjson")
+
 # --- BUSCA DE PRODUTOS - VERSÃO ROBUSTA ---
 @router.get("/search/{query}")
 async def search_products_public(query: str):
@@ -406,7 +600,7 @@ async def search_products_public(query: str):
         }
 
 @router.get("/produtos/search/{query}", summary="Busca produtos - 100% autenticada conforme ML 2025")
-async def search_produtos_ml(query: str, current_user: Usuario = Depends(get_current_user)):
+async def search_produtos_ml(query: str, current_user: UsuarioAutenticado = Depends(get_current_user)):
     """
     🎯 BUSCA MERCADO LIVRE - 100% AUTENTICADA VIA OAUTH 2.0 + PKCE
     
@@ -475,8 +669,8 @@ async def search_produtos_ml(query: str, current_user: Usuario = Depends(get_cur
 
 # --- HISTÓRICO DE PREÇOS ---
 @router.post("/produtos/{produto_id}/historico", response_model=HistoricoPrecoOut)
-async def registrar_historico(produto_id: int, preco: float, estoque: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    produto = db.query(ProdutoMonitorado).filter(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id).first()
+async def registrar_historico(produto_id: int, preco: float, estoque: int, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    produto = (await db.execute(select(ProdutoMonitorado).where(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id))).scalar_one_or_none()
     if not produto:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     historico = HistoricoPreco(
@@ -486,42 +680,364 @@ async def registrar_historico(produto_id: int, preco: float, estoque: int, db: S
         data=datetime.utcnow()
     )
     db.add(historico)
-    db.commit()
-    db.refresh(historico)
+    await db.run_sync(lambda sessao: registrar_pontos(sessao, [(produto_id, preco, historico.data)]))
+    await db.commit()
+    await db.refresh(historico)
     return historico
 
 @router.get("/produtos/{produto_id}/historico", response_model=List[HistoricoPrecoOut])
-async def listar_historico(produto_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    produto = db.query(ProdutoMonitorado).filter(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id).first()
+async def listar_historico(
+    produto_id: int,
+    request: Request,
+    response: Response,
+    dias: Optional[int] = Query(None, ge=1, description="Apenas os últimos N dias (lê só as partições recentes)"),
+    db: AsyncSession = Depends(get_async_db_leitura),
+    current_user: UsuarioAutenticado = Depends(get_current_user)
+):
+    produto = (await db.execute(
+        select(ProdutoMonitorado.id).where(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id)
+    )).first()
     if not produto:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
-    historico = db.query(HistoricoPreco).filter(HistoricoPreco.produto_id == produto_id).order_by(HistoricoPreco.data.desc()).all()
+    
+    filtros = [HistoricoPreco.produto_id == produto_id]
+    corte = None
+    if dias:
+        # Corte literal (não NOW()) para o planner descartar as partições antigas
+        corte = datetime.utcnow() - timedelta(days=dias)
+        filtros.append(HistoricoPreco.data >= corte)
+    
+    # Histórico é append-only: contagem + último id identificam a versão das
+    # linhas quentes; o arquivo frio só muda quando o arquivador roda
+    total, ultimo_id = (await db.execute(
+        select(func.count(HistoricoPreco.id), func.max(HistoricoPreco.id)).where(*filtros)
+    )).one()
+    versao_arquivo = (await db.execute(consulta_versao_arquivo(produto_id))).one()
+    etag = gerar_etag("historico", produto_id, dias, total, ultimo_id, *versao_arquivo)
+    if etag_corresponde(request, etag):
+        return resposta_nao_modificada(etag)
+    
+    historico = (await db.execute(
+        select(HistoricoPreco).where(*filtros).order_by(HistoricoPreco.data.desc())
+    )).scalars().all()
+    if versao_arquivo[0]:
+        arquivados = pontos_arquivados((await db.execute(consulta_arquivos([produto_id], corte))).all(), corte).get(produto_id, [])
+        historico = sorted(
+            [HistoricoPrecoOut.model_validate(ponto, from_attributes=True) for ponto in historico]
+            + [HistoricoPrecoOut(id=ponto_id, preco=preco, estoque=estoque, data=data) for ponto_id, data, preco, estoque in arquivados],
+            key=lambda ponto: ponto.data, reverse=True
+        )
+    aplicar_etag(response, etag)
     return historico
 
+# --- ANÁLISE DE PREÇOS ---
+@router.get("/produtos/analise", response_model=List[AnalisePrecoOut], summary="Mínimos, médias móveis, variação e anomalias de todos os produtos")
+async def analisar_meus_produtos(db: AsyncSession = Depends(get_async_db_leitura), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    """
+    📈 "É um bom preço?" - análise vetorizada dos produtos do usuário (uma
+    consulta para todas as séries). Produtos sem histórico ficam de fora
+    """
+    produto_ids = (await db.execute(select(ProdutoMonitorado.id).where(ProdutoMonitorado.usuario_id == current_user.id))).scalars().all()
+    analises = await db.run_sync(lambda sessao: analisar_produtos(sessao, produto_ids))
+    return list(analises.values())
+
+@router.get("/produtos/{produto_id}/analise", response_model=AnalisePrecoOut)
+async def analisar_produto(produto_id: int, db: AsyncSession = Depends(get_async_db_leitura), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    produto = (await db.execute(
+        select(ProdutoMonitorado.id).where(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id)
+    )).first()
+    if not produto:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    analise = (await db.run_sync(lambda sessao: analisar_produtos(sessao, [produto_id]))).get(produto_id)
+    if analise is None:
+        raise HTTPException(status_code=404, detail="Produto ainda sem histórico de preços")
+    return analise
+
+@router.get("/historico/export", summary="Exporta histórico de preços em CSV ou NDJSON (streaming)")
+async def exportar_historico(
+    request: Request,
+    formato: str = "csv",
+    produto_ids: Optional[List[int]] = Query(None),
+    current_user: UsuarioAutenticado = Depends(get_current_user)
+):
+    """
+    📤 EXPORTAÇÃO DE HISTÓRICO
+
+    Exporta o histórico de um produto, de uma lista (?produto_ids=1&produto_ids=2)
+    ou de todos os produtos do usuário. As linhas são lidas por cursor no
+    servidor e enviadas em stream, com gzip quando o cliente aceita.
+    """
+    if formato not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato deve ser 'csv' ou 'ndjson'")
+    
+    comprimir = aceita_codificacao(request, "gzip")
+    print(f"📤 Exportando histórico ({formato}, gzip={comprimir}) para user {current_user.id}: produtos={produto_ids or 'todos'}")
+    
+    # Vary: o corpo muda com o Accept-Encoding (caches/proxies não podem misturar)
+    headers = {"Content-Disposition": f'attachment; filename="historico.{formato}"', "Vary": "Accept-Encoding"}
+    if comprimir:
+        headers["Content-Encoding"] = "gzip"
+    media_type = "text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        gerar_exportacao_historico(current_user.id, produto_ids, formato, comprimir),
+        media_type=media_type,
+        headers=headers
+    )
+
+# --- RESUMO DE AVALIAÇÕES (IA) ---
+@router.get("/produtos/{produto_id}/resumo_avaliacoes", response_model=ResumoAvaliacaoOut)
+async def resumo_avaliacoes(
+    produto_id: int,
+    background_tasks: BackgroundTasks,
+    segundo_plano: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UsuarioAutenticado = Depends(get_current_user)
+):
+    """
+    🤖 RESUMO DAS AVALIAÇÕES - cache persistente por ml_id
+
+    Dentro do TTL o resumo salvo volta na hora. Expirado, é revalidado pelo
+    hash das avaliações (em segundo plano por padrão) e só é regenerado se
+    as avaliações mudaram.
+    """
+    produto = (await db.execute(
+        select(ProdutoMonitorado).where(ProdutoMonitorado.id == produto_id, ProdutoMonitorado.usuario_id == current_user.id)
+    )).scalars().first()
+    if not produto:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    
+    resumo, origem = await obter_resumo(db, produto.ml_id, current_user.id, background_tasks if segundo_plano else None)
+    if not resumo:
+        raise HTTPException(status_code=503, detail="Não foi possível gerar o resumo agora")
+    
+    print(f"🤖 Resumo do produto {produto_id} ({produto.ml_id}): {origem}")
+    return {
+        "ml_id": resumo.ml_id,
+        "resumo": resumo.resumo,
+        "total_avaliacoes": resumo.total_avaliacoes or 0,
+        "gerado_em": resumo.gerado_em,
+        "origem": origem
+    }
+
 # --- ALERTAS ---
 @router.post("/alertas/", response_model=AlertaOut)
-async def criar_alerta(alerta: AlertaCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+async def criar_alerta(alerta: AlertaCreate, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    """
+    Tipos: preco_alvo (preço <= preco_alvo), minimo_90d, minimo_historico,
+    queda_percentual (queda >= parametro % em 30 dias) e anomalia (z-score
+    do preço <= -parametro, padrão 2.0)
+    """
+    if alerta.tipo not in TIPOS_ALERTA:
+        raise HTTPException(status_code=400, detail=f"tipo deve ser um de: {', '.join(TIPOS_ALERTA)}")
+    if alerta.tipo == "preco_alvo" and alerta.preco_alvo is None:
+        raise HTTPException(status_code=400, detail="preco_alvo é obrigatório para alertas de preço alvo")
+    if alerta.tipo == "queda_percentual" and not alerta.parametro:
+        raise HTTPException(status_code=400, detail="parametro (% de queda) é obrigatório para alertas de queda percentual")
+    produto = (await db.execute(
+        select(ProdutoMonitorado.id).where(ProdutoMonitorado.id == alerta.produto_id, ProdutoMonitorado.usuario_id == current_user.id)
+    )).scalar_one_or_none()
+    if produto is None:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
     db_alerta = Alerta(
         usuario_id=current_user.id,
         produto_id=alerta.produto_id,
         preco_alvo=alerta.preco_alvo,
+        tipo=alerta.tipo,
+        parametro=alerta.parametro,
         enviado=False
     )
     db.add(db_alerta)
-    db.commit()
-    db.refresh(db_alerta)
+    await db.flush()
+    # Índice de alertas dos workers (notificação entregue no commit)
+    await db.run_sync(alerta_criado, db_alerta)
+    await db.commit()
+    await db.refresh(db_alerta)
     return db_alerta
 
 @router.get("/alertas/", response_model=List[AlertaOut])
-async def listar_alertas(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    alertas = db.query(Alerta).filter(Alerta.usuario_id == current_user.id).all()
+async def listar_alertas(db: AsyncSession = Depends(get_async_db_leitura), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    alertas = (await db.execute(select(Alerta).where(Alerta.usuario_id == current_user.id))).scalars().all()
     return alertas
 
 @router.delete("/alertas/{alerta_id}", status_code=204)
-async def remover_alerta(alerta_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    alerta = db.query(Alerta).filter(Alerta.id == alerta_id, Alerta.usuario_id == current_user.id).first()
+async def remover_alerta(alerta_id: int, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    alerta = (await db.execute(select(Alerta).where(Alerta.id == alerta_id, Alerta.usuario_id == current_user.id))).scalar_one_or_none()
     if not alerta:
         raise HTTPException(status_code=404, detail="Alerta não encontrado")
-    db.delete(alerta)
-    db.commit()
-    return
\ No newline at end of file
+    if not alerta.enviado:
+        await db.run_sync(alerta_removido, alerta)
+    await db.delete(alerta)
+    await db.commit()
+    return
+
+# --- BUSCAS SALVAS ---
+@router.post("/buscas/", response_model=BuscaSalvaOut)
+async def criar_busca(
+    busca: BuscaSalvaCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UsuarioAutenticado = Depends(get_current_user)
+):
+    """
+    Monitora uma consulta do ML (ex: "iphone 15 128gb" com preco_maximo 4000).
+    A linha de base é registrada agora, em segundo plano; a cada execução do
+    scheduler só anúncios novos e quedas de preço geram eventos
+    """
+    consulta = busca.consulta.strip()
+    if not consulta:
+        raise HTTPException(status_code=400, detail="consulta é obrigatória")
+    if busca.preco_maximo is not None and busca.preco_maximo <= 0:
+        raise HTTPException(status_code=400, detail="preco_maximo deve ser positivo")
+    total = (await db.execute(select(func.count()).select_from(BuscaSalva).where(BuscaSalva.usuario_id == current_user.id))).scalar()
+    if total >= BUSCAS_MAX_POR_USUARIO:
+        raise HTTPException(status_code=400, detail=f"Máximo de {BUSCAS_MAX_POR_USUARIO} buscas salvas por usuário")
+    db_busca = BuscaSalva(usuario_id=current_user.id, consulta=consulta, preco_maximo=busca.preco_maximo, ativa=True, resultados=0)
+    db.add(db_busca)
+    await db.commit()
+    await db.refresh(db_busca)
+    background_tasks.add_task(executar_e_gravar, current_user.id, [(db_busca.id, db_busca.consulta)])
+    return db_busca
+
+@router.get("/buscas/", response_model=List[BuscaSalvaOut])
+async def listar_buscas(db: AsyncSession = Depends(get_async_db_leitura), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    return (await db.execute(select(BuscaSalva).where(BuscaSalva.usuario_id == current_user.id).order_by(BuscaSalva.id))).scalars().all()
+
+@router.get("/buscas/{busca_id}/eventos", response_model=List[EventoBuscaOut])
+async def listar_eventos_busca(
+    busca_id: int,
+    limite: int = Query(50, ge=1, le=LIMITE_EVENTOS_BUSCA),
+    db: AsyncSession = Depends(get_async_db_leitura),
+    current_user: UsuarioAutenticado = Depends(get_current_user)
+):
+    """Novidades da busca (anúncios novos e quedas de preço), mais recentes primeiro"""
+    busca = (await db.execute(select(BuscaSalva.id).where(BuscaSalva.id == busca_id, BuscaSalva.usuario_id == current_user.id))).scalar_one_or_none()
+    if not busca:
+        raise HTTPException(status_code=404, detail="Busca não encontrada")
+    return (await db.execute(
+        select(EventoBusca).where(EventoBusca.busca_id == busca_id).order_by(EventoBusca.id.desc()).limit(limite)
+    )).scalars().all()
+
+@router.delete("/buscas/{busca_id}", status_code=204)
+async def remover_busca(busca_id: int, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_user)):
+    busca = (await db.execute(select(BuscaSalva).where(BuscaSalva.id == busca_id, BuscaSalva.usuario_id == current_user.id))).scalar_one_or_none()
+    if not busca:
+        raise HTTPException(status_code=404, detail="Busca não encontrada")
+    await db.execute(delete(EventoBusca).where(EventoBusca.busca_id == busca_id))
+    await db.delete(busca)
+    await db.commit()
+    return
+
+# --- NOTIFICAÇÕES DO MERCADO LIVRE (WEBHOOK) ---
+@router.post("/notificacoes/mercadolivre", include_in_schema=False)
+async def receber_notificacao_ml(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Callback do tópico "items" configurado na aplicação do ML. Só confere e
+    enfileira o ml_id (o ML espera resposta rápida); a atualização roda no
+    job processar_fila_notificacoes. Notificações que não se aplicam voltam
+    200 para o ML não reenviar
+    """
+    if not webhook_configurado():
+        notificacoes_ml.inc("sem_segredo")
+        raise HTTPException(status_code=403, detail="Webhook desabilitado: ML_WEBHOOK_SECRET não configurado")
+    corpo = await request.body()
+    if not verificar_assinatura(corpo, request.headers.get("x-signature")):
+        notificacoes_ml.inc("assinatura_invalida")
+        raise HTTPException(status_code=401, detail="Assinatura inválida")
+    try:
+        notificacao = json.loads(corpo)
+    except ValueError:
+        notificacoes_ml.inc("invalida")
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    if not isinstance(notificacao, dict):
+        notificacoes_ml.inc("invalida")
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    if not aplicacao_confere(notificacao):
+        notificacoes_ml.inc("aplicacao_invalida")
+        raise HTTPException(status_code=403, detail="application_id não confere")
+    ml_id = ml_id_da_notificacao(notificacao)
+    if ml_id is None:
+        notificacoes_ml.inc("ignorada")
+        return {"status": "ignorada"}
+    # Só itens monitorados por algum usuário entram na fila
+    monitorado = (await db.execute(select(ProdutoMonitorado.id).where(ProdutoMonitorado.ml_id == ml_id).limit(1))).scalar_one_or_none()
+    if monitorado is None:
+        notificacoes_ml.inc("nao_monitorado")
+        return {"status": "ignorada"}
+    await db.execute(text(SQL_ENFILEIRAR), {"ml_id": ml_id, "agora": datetime.utcnow()})
+    await db.commit()
+    notificacoes_ml.inc("enfileirada")
+    return {"status": "enfileirada", "ml_id": ml_id}
+
+# --- EVENTOS AO VIVO (SSE) ---
+@router.get("/eventos/stream", summary="Eventos ao vivo de preço, estoque e alertas (Server-Sent Events)")
+async def stream_eventos(request: Request, token: Optional[str] = None):
+    """
+    📡 EVENTOS AO VIVO - Server-Sent Events
+
+    EventSource não envia headers, então o JWT pode vir em ?token= (ou no
+    Authorization). Eventos: "preco", "alerta" e "resync" (a conexão ficou
+    para trás e o cliente deve recarregar via REST). Comentários ": ping"
+    servem de heartbeat.
+    """
+    if not token:
+        authorization = request.headers.get("authorization", "")
+        token = authorization[7:] if authorization.lower().startswith("bearer ") else None
+    if not token:
+        raise HTTPException(status_code=401, detail="Não autenticado")
+    usuario = await autenticar_token(token)
+    usuario_id = usuario.id
+    
+    fila = distribuidor.assinar(usuario_id)
+    print(f"📡 SSE conectado para user {usuario_id} ({distribuidor.total_conexoes} conexões no worker)")
+    
+    async def gerar():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=HEARTBEAT_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento['dados'], default=str)}\n\n"
+        finally:
+            distribuidor.cancelar(usuario_id, fila)
+            print(f"📡 SSE desconectado para user {usuario_id}")
+    
+    return StreamingResponse(
+        gerar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- PERFIS (ADMIN) ---
+@router.get("/admin/perfis", response_model=List[PerfilOut], summary="Perfis amostrados de requisições e do scheduler")
+async def listar_perfis(db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_admin)):
+    """
+    Para perfilar uma requisição, repita-a como admin com o header
+    X-Perfil: 1 (ou ?perfil=1); o id volta no header X-Perfil-Id
+    """
+    return (await db.execute(select(PerfilExecucao).order_by(PerfilExecucao.id.desc()).limit(100))).scalars().all()
+
+@router.get("/admin/perfis/{perfil_id}", summary="Pilhas do perfil no formato folded (flamegraph.pl / speedscope)")
+async def obter_perfil(perfil_id: int, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_admin)):
+    perfil = await db.get(PerfilExecucao, perfil_id)
+    if not perfil:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    if perfil.status != "concluido":
+        raise HTTPException(status_code=409, detail=f"Perfil ainda não concluído (status: {perfil.status})")
+    return PlainTextResponse(perfil.pilhas or "", headers={"Content-Disposition": f'attachment; filename="perfil-{perfil_id}.folded"'})
+
+@router.post("/admin/perfis/scheduler", response_model=List[PerfilOut], summary="Perfila os próximos ciclos do scheduler")
+async def pedir_perfil_scheduler(pedido: PerfilSchedulerCreate, db: AsyncSession = Depends(get_async_db), current_user: UsuarioAutenticado = Depends(get_current_admin)):
+    """
+    Registra pedidos pendentes; o worker líder perfila os próximos `ciclos`
+    do `job` indicado (ou de qualquer job) e grava as pilhas ao final de cada ciclo
+    """
+    if not 1 <= pedido.ciclos <= LIMITE_CICLOS_PERFIL:
+        raise HTTPException(status_code=400, detail=f"ciclos deve estar entre 1 e {LIMITE_CICLOS_PERFIL}")
+    if pedido.job is not None and pedido.job not in JOBS_PERFILAVEIS:
+        raise HTTPException(status_code=400, detail=f"job deve ser um de: {', '.join(JOBS_PERFILAVEIS)}")
+    perfis = pedir_perfis_scheduler(db, current_user.id, pedido.ciclos, pedido.job)
+    await db.commit()
+    return perfis
@@ -1,51 +1,203 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from typing import Optional
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from mercadolivre import buscar_produto_ml
-from models import ProdutoMonitorado, HistoricoPreco, Alerta, Usuario
+from database import SessionLocal, url_libpq
+from mercadolivre import buscar_produtos_por_ids_ml
+from atualizacao import gravar_atualizacoes
+from resumos import pre_gerar_resumos
+from particoes import manter_particoes
+from arquivo_historico import arquivar_historico, aplicar_retencao_arquivo
+from perfis import perfilar_ciclo
+from buscas_salvas import buscas_ativas_por_usuario, executar_buscas, gravar_execucoes, BUSCAS_INTERVALO_MINUTOS
+from notificacoes_ml import ml_ids_para_polling, processar_notificacoes, NOTIFICACOES_INTERVALO_SEGUNDOS
 import asyncio
-from datetime import datetime
-from email_utils import enviar_alerta_email
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 scheduler = BackgroundScheduler()
 
 # Função para atualizar todos os produtos monitorados periodicamente
 def atualizar_todos_produtos():
-    db: Session = SessionLocal()
-    try:
-        produtos = db.query(ProdutoMonitorado).all()
-        for produto in produtos:
-            dados_ml = asyncio.run(buscar_produto_ml(produto.ml_id))
-            if dados_ml:
-                produto.nome = dados_ml["nome"]
-                produto.preco_atual = dados_ml["preco"]
-                produto.estoque_atual = dados_ml["estoque"]
-                produto.url = dados_ml["url"]
-                db.commit()
-                db.refresh(produto)
-                # Registrar histórico
-                historico = HistoricoPreco(
-                    produto_id=produto.id,
-                    preco=produto.preco_atual,
-                    estoque=produto.estoque_atual,
-                    data=datetime.utcnow()
-                )
-                db.add(historico)
-                db.commit()
-                # Verificar alertas
-                alertas = db.query(Alerta).filter(Alerta.produto_id == produto.id, Alerta.enviado == False).all()
-                for alerta in alertas:
-                    if produto.preco_atual <= alerta.preco_alvo:
-                        usuario = db.query(Usuario).filter(Usuario.id == alerta.usuario_id).first()
-                        if usuario:
-                            enviar_alerta_email(usuario.email, produto.nome, produto.preco_atual, produto.url)
-                            alerta.enviado = True
-                            db.commit()
-    finally:
-        db.close()
+    with perfilar_ciclo("atualizar_todos_produtos"):
+        db: Session = SessionLocal()
+        try:
+            # Com notificações do ML habilitadas, só os itens que passaram do
+            # intervalo de polling de segurança (ver notificacoes_ml)
+            ml_ids_por_usuario = {}
+            for usuario_id, ml_id in ml_ids_para_polling(db):
+                ml_ids_por_usuario.setdefault(usuario_id, []).append(ml_id)
+        finally:
+            db.close()
+        
+        # Uma rodada de multi-get por usuário (token OAuth é por usuário),
+        # respeitando o mesmo rate limit das rotas
+        for usuario_id, ml_ids in ml_ids_por_usuario.items():
+            try:
+                dados = asyncio.run(buscar_produtos_por_ids_ml(ml_ids, usuario_id))
+                if dados:
+                    gravar_atualizacoes(usuario_id, dados)
+            except Exception as e:
+                print(f"❌ Erro ao atualizar produtos do user {usuario_id}: {e}")
+
+# Atualizar só os itens que o ML notificou como alterados
+def processar_fila_notificacoes():
+    with perfilar_ciclo("processar_fila_notificacoes"):
+        try:
+            processar_notificacoes()
+        except Exception as e:
+            print(f"❌ Erro ao processar a fila de notificações do ML: {e}")
+
+# Reexecutar as buscas salvas e registrar só as novidades
+def atualizar_buscas_salvas():
+    with perfilar_ciclo("atualizar_buscas_salvas"):
+        for usuario_id, buscas in buscas_ativas_por_usuario().items():
+            try:
+                dados = asyncio.run(executar_buscas(usuario_id, buscas))
+                if dados:
+                    gravar_execucoes(usuario_id, dados)
+            except Exception as e:
+                print(f"❌ Erro ao executar buscas salvas do user {usuario_id}: {e}")
+
+# Pré-gerar resumos de avaliações fora do caminho das requisições
+def gerar_resumos_pendentes():
+    with perfilar_ciclo("gerar_resumos_pendentes"):
+        try:
+            asyncio.run(pre_gerar_resumos())
+        except Exception as e:
+            print(f"❌ Erro no pipeline de resumos: {e}")
+
+# Arquivo frio, partições futuras do histórico e retenção dos pontos antigos
+def manter_historico():
+    with perfilar_ciclo("manter_historico"):
+        try:
+            # Arquivo (HISTORICO_ARQUIVO_DIAS) antes da retenção das partições;
+            # meses arquivados que saem da retenção viram agregados diários
+            arquivar_historico()
+            manter_particoes()
+            aplicar_retencao_arquivo()
+        except Exception as e:
+            print(f"❌ Erro na manutenção das partições do histórico: {e}")
 
 # Agendar para rodar a cada 30 minutos
 scheduler.add_job(atualizar_todos_produtos, 'interval', minutes=30)
+scheduler.add_job(processar_fila_notificacoes, 'interval', seconds=NOTIFICACOES_INTERVALO_SEGUNDOS)
+scheduler.add_job(atualizar_buscas_salvas, 'interval', minutes=BUSCAS_INTERVALO_MINUTOS)
+scheduler.add_job(gerar_resumos_pendentes, 'interval', hours=int(os.getenv("RESUMO_PIPELINE_INTERVALO_HORAS", "6")))
+scheduler.add_job(manter_historico, 'cron', hour=3, minute=15)
 
 def start_scheduler():
-    scheduler.start() 
\ No newline at end of file
+    scheduler.start()
+
+# Com vários workers/réplicas, só o processo que detém o advisory lock roda os
+# jobs; os demais ficam com o scheduler pausado e só atendem HTTP.
+#   SCHEDULER_MODO=lider     (padrão) eleição via pg_try_advisory_lock
+#   SCHEDULER_MODO=sempre    roda neste processo sem eleição (um único worker)
+#   SCHEDULER_MODO=desligado não roda jobs neste processo
+SCHEDULER_MODO = os.getenv("SCHEDULER_MODO", "lider")
+SCHEDULER_LOCK_ID = 7261002
+SCHEDULER_HEARTBEAT_SEGUNDOS = int(os.getenv("SCHEDULER_HEARTBEAT_SEGUNDOS", "15"))
+
+class LiderancaScheduler(threading.Thread):
+    """
+    Disputa a liderança com uma conexão dedicada segurando o advisory lock
+    (nível de sessão). Se o líder morre, a sessão cai, o Postgres solta o lock
+    e outro processo assume na próxima tentativa. O heartbeat detecta a perda
+    da própria conexão: nesse caso o scheduler é pausado antes de reconectar.
+    """
+    def __init__(self, database_url: str):
+        super().__init__(name="vigia-scheduler-lider", daemon=True)
+        self.database_url = database_url
+        self.lider = False
+        self.lider_desde: Optional[float] = None
+        self.ultimo_heartbeat: Optional[float] = None
+        self._parar = threading.Event()
+
+    def parar(self):
+        self._parar.set()
+
+    def _assumir(self):
+        self.lider = True
+        self.lider_desde = time.time()
+        scheduler.resume()
+        logger.info(f"👑 Liderança do scheduler assumida (pid {os.getpid()})")
+
+    def _renunciar(self, motivo: str):
+        if self.lider:
+            scheduler.pause()
+            logger.warning(f"⚠️ Liderança do scheduler perdida: {motivo}")
+        self.lider = False
+        self.lider_desde = None
+
+    def run(self):
+        import psycopg2
+
+        while not self._parar.is_set():
+            conexao = None
+            try:
+                # keepalive curto: se este processo some da rede, o servidor
+                # derruba a sessão (e solta o lock) rapidamente
+                conexao = psycopg2.connect(
+                    self.database_url, application_name="vigia-scheduler",
+                    keepalives=1, keepalives_idle=10, keepalives_interval=5, keepalives_count=3
+                )
+                conexao.autocommit = True
+                cursor = conexao.cursor()
+                while not self._parar.is_set():
+                    if self.lider:
+                        cursor.execute("SELECT 1")
+                    else:
+                        cursor.execute("SELECT pg_try_advisory_lock(%s)", (SCHEDULER_LOCK_ID,))
+                        if cursor.fetchone()[0]:
+                            self._assumir()
+                    self.ultimo_heartbeat = time.time()
+                    self._parar.wait(SCHEDULER_HEARTBEAT_SEGUNDOS)
+            except Exception as e:
+                self._renunciar(str(e))
+                logger.error(f"❌ Erro na eleição do scheduler: {e} - tentando de novo em {SCHEDULER_HEARTBEAT_SEGUNDOS}s")
+                self._parar.wait(SCHEDULER_HEARTBEAT_SEGUNDOS)
+            finally:
+                if conexao is not None:
+                    conexao.close()  # encerra a sessão: o lock é liberado
+        self._renunciar("processo encerrando")
+
+_lideranca: Optional[LiderancaScheduler] = None
+
+def iniciar_scheduler(database_url: Optional[str]):
+    """Inicia o scheduler conforme SCHEDULER_MODO (chamado no startup do app)"""
+    global _lideranca
+    if SCHEDULER_MODO == "desligado" or scheduler.running:
+        return
+    # postgresql+psycopg2:// também é PostgreSQL: sem eleição, todo worker rodaria os jobs
+    url_lock = url_libpq(database_url)
+    if SCHEDULER_MODO == "sempre" or not url_lock:
+        scheduler.start()
+        logger.info("⏰ Scheduler iniciado neste processo (sem eleição)")
+        return
+    scheduler.start(paused=True)
+    _lideranca = LiderancaScheduler(url_lock)
+    _lideranca.start()
+
+def parar_scheduler():
+    global _lideranca
+    if _lideranca is not None:
+        _lideranca.parar()
+        _lideranca.join(timeout=5)
+        _lideranca = None
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+def status_scheduler() -> dict:
+    return {
+        "modo": SCHEDULER_MODO,
+        "pid": os.getpid(),
+        "rodando": scheduler.running,
+        "lider": _lideranca.lider if _lideranca else (scheduler.running and SCHEDULER_MODO != "desligado"),
+        "lider_desde": _lideranca.lider_desde if _lideranca else None,
+        "ultimo_heartbeat": _lideranca.ultimo_heartbeat if _lideranca else None,
+        # Jobs pendentes (scheduler ainda não iniciado, ex: SCHEDULER_MODO=desligado) não têm next_run_time
+        "jobs": [{"id": job.id, "nome": job.name, "proxima_execucao": getattr(job, "next_run_time", None)} for job in scheduler.get_jobs()],
+    }
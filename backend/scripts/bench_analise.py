@@ -0,0 +1,109 @@
+"""
+Benchmark da análise de preços: versão vetorizada (analise_precos) x laço
+Python por produto, sobre séries sintéticas na nossa escala.
+
+    python scripts/bench_analise.py [--produtos 5000] [--pontos 365] [--banco]
+
+Cada produto recebe um ponto por dia (um ciclo do scheduler) com passeio
+aleatório de preço. As duas versões são conferidas entre si antes de medir.
+Com --banco também mede analisar_produtos() contra o DATABASE_URL
+(carregamento + cálculo de todos os produtos monitorados).
+"""
+import os
+import sys
+import math
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from analise_precos import calcular_analises, DIA_SEGUNDOS, ANALISE_MIN_PONTOS_ZSCORE
+
+def gerar_series(produtos: int, pontos: int, agora: float, semente: int = 42):
+    rng = np.random.default_rng(semente)
+    produto_ids = np.repeat(np.arange(1, produtos + 1), pontos)
+    tempos = np.tile(agora - np.arange(pontos)[::-1] * DIA_SEGUNDOS, produtos)
+    base = rng.uniform(20, 5000, produtos)
+    passos = rng.normal(0, 0.01, (produtos, pontos)).cumsum(axis=1)
+    precos = np.round((base[:, None] * np.exp(passos)).ravel(), 2)
+    return produto_ids, tempos, precos
+
+def analisar_laco(produto_ids, tempos, precos, agora: float) -> dict:
+    """Referência ingênua: um laço Python por produto e por ponto"""
+    series = {}
+    for produto_id, tempo, preco in zip(produto_ids.tolist(), tempos.tolist(), precos.tolist()):
+        series.setdefault(produto_id, []).append((tempo, preco))
+    resultado = {}
+    for produto_id, serie in series.items():
+        valores = [preco for _, preco in serie]
+        ultimo = valores[-1]
+        janela_90 = [preco for tempo, preco in serie if tempo >= agora - 90 * DIA_SEGUNDOS]
+        media = sum(janela_90) / len(janela_90) if janela_90 else None
+        desvio = math.sqrt(sum((p - media) ** 2 for p in janela_90) / len(janela_90)) if janela_90 else 0
+        referencia = serie[0][1]
+        for tempo, preco in serie:
+            if tempo >= agora - 30 * DIA_SEGUNDOS:
+                break
+            referencia = preco
+        resultado[produto_id] = {
+            "minimo_historico": min(valores),
+            "minimo_90d": min(janela_90) if janela_90 else None,
+            "media_movel_7": sum(valores[-7:]) / len(valores[-7:]),
+            "media_movel_30": sum(valores[-30:]) / len(valores[-30:]),
+            "variacao_30d_pct": round((ultimo - referencia) / referencia * 100, 2),
+            "zscore_90d": round((ultimo - media) / desvio, 3) if len(janela_90) >= ANALISE_MIN_PONTOS_ZSCORE and desvio > 0 else None,
+        }
+    return resultado
+
+def medir(funcao, rodadas: int) -> float:
+    tempos = []
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--produtos", type=int, default=5000)
+    parser.add_argument("--pontos", type=int, default=365)
+    parser.add_argument("--rodadas", type=int, default=3)
+    parser.add_argument("--banco", action="store_true")
+    args = parser.parse_args()
+
+    agora = time.time()
+    produto_ids, tempos, precos = gerar_series(args.produtos, args.pontos, agora)
+    print(f"{args.produtos} produtos x {args.pontos} pontos = {len(precos):,} pontos")
+
+    vetorizado = calcular_analises(produto_ids, tempos, precos, agora)
+    referencia = analisar_laco(produto_ids, tempos, precos, agora)
+    for produto_id, esperado in referencia.items():
+        obtido = vetorizado[produto_id]
+        for chave, valor in esperado.items():
+            if valor is None or obtido[chave] is None:
+                assert valor is obtido[chave], (produto_id, chave, valor, obtido[chave])
+            else:
+                assert math.isclose(valor, obtido[chave], rel_tol=1e-6, abs_tol=1e-2), (produto_id, chave, valor, obtido[chave])
+    print("✅ Resultados iguais à referência")
+
+    t_vetorizado = medir(lambda: calcular_analises(produto_ids, tempos, precos, agora), args.rodadas)
+    t_laco = medir(lambda: analisar_laco(produto_ids, tempos, precos, agora), args.rodadas)
+    print(f"vetorizado {t_vetorizado * 1000:8.1f} ms")
+    print(f"laço       {t_laco * 1000:8.1f} ms  ({t_laco / t_vetorizado:.1f}x mais lento)")
+
+    if args.banco:
+        from database import SessionLocal
+        from models import ProdutoMonitorado
+        from analise_precos import analisar_produtos
+        db = SessionLocal()
+        try:
+            todos = [produto_id for (produto_id,) in db.query(ProdutoMonitorado.id)]
+            inicio = time.perf_counter()
+            analises = analisar_produtos(db, todos)
+            print(f"banco      {(time.perf_counter() - inicio) * 1000:8.1f} ms  ({len(analises)} produtos com histórico)")
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark do arquivo frio do histórico (arquivo_historico): espaço ocupado e
+tempo de leitura de longo prazo, linhas quentes x blobs arquivados.
+
+    python scripts/bench_arquivo_historico.py [--produtos 50] [--dias 400] [--pontos-dia 48]
+
+Grava no DATABASE_URL um usuário e produtos sintéticos com um ponto a cada
+30 minutos (preço que muda a cada poucos dias, estoque oscilando, horário
+com atraso aleatório), mede o espaço em historico_precos (heap + índices) e
+o tempo de ler um ano de um produto e de analisar todos; arquiva tudo antes
+do mês atual e mede de novo.
+Os dados sintéticos são apagados no final.
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, select, text
+from database import SessionLocal, engine
+from models import Usuario, ProdutoMonitorado, HistoricoPreco, HistoricoArquivo, EstatisticaProduto
+from arquivo_historico import arquivar_historico, consulta_arquivos, pontos_arquivados
+from analise_precos import analisar_produtos
+
+SQL_TAMANHO_HISTORICO = """
+    SELECT COALESCE(SUM(pg_total_relation_size(filho.oid)), 0) FROM pg_inherits
+    JOIN pg_class pai ON pai.oid = pg_inherits.inhparent
+    JOIN pg_class filho ON filho.oid = pg_inherits.inhrelid
+    WHERE pai.relname = 'historico_precos'
+"""
+
+# Como o scheduler grava: ids intercalados entre produtos (um ciclo por vez),
+# horário com atraso aleatório de até 2 min (µs incluídos)
+SQL_PONTOS = """
+    INSERT INTO historico_precos (id, produto_id, preco, estoque, data)
+    SELECT nextval('historico_precos_id_seq'), produto_id, preco, estoque, data FROM (
+        SELECT p.id AS produto_id, g,
+               ROUND(CAST(100 + p.id % 900 + 15 * ((g / (:pontos_dia * 4) + p.id) % 5) AS NUMERIC), 2) AS preco,
+               20 + (g / 7 + p.id) % 11 AS estoque,
+               CAST(:agora AS TIMESTAMP) - g * (INTERVAL '1 day' / :pontos_dia) + random() * INTERVAL '2 minutes' AS data
+        FROM produtos_monitorados p, generate_series(0, :total - 1) g
+        WHERE p.usuario_id = :usuario_id
+        ORDER BY g DESC, p.id
+    ) pontos
+"""
+
+def tamanho_historico(connection) -> int:
+    connection.execute(text("VACUUM ANALYZE historico_precos")) if connection.dialect.name == "postgresql" else None
+    return connection.execute(text(SQL_TAMANHO_HISTORICO)).scalar()
+
+def medir(funcao, rodadas: int = 3) -> float:
+    tempos = []
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--produtos", type=int, default=50)
+    parser.add_argument("--dias", type=int, default=400)
+    parser.add_argument("--pontos-dia", type=int, default=48)
+    args = parser.parse_args()
+    if engine.dialect.name != "postgresql":
+        sys.exit("Benchmark precisa do PostgreSQL (tamanho das partições)")
+
+    db = SessionLocal()
+    usuario = Usuario(email=f"bench-arquivo-{int(time.time())}@vigia.local", is_active=True)
+    db.add(usuario)
+    db.commit()
+    try:
+        db.add_all([ProdutoMonitorado(usuario_id=usuario.id, ml_id=f"MLB9{i:08d}", nome="bench", preco_atual=0, estoque_atual=0, url="") for i in range(args.produtos)])
+        db.commit()
+        produto_ids = [produto_id for (produto_id,) in db.query(ProdutoMonitorado.id).filter(ProdutoMonitorado.usuario_id == usuario.id).order_by(ProdutoMonitorado.id)]
+
+        with engine.connect() as connection:
+            connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            antes = tamanho_historico(connection)
+            connection.execute(text("SELECT setseed(0.42)"))
+            connection.execute(text(SQL_PONTOS), {
+                "pontos_dia": args.pontos_dia, "total": args.dias * args.pontos_dia,
+                "agora": datetime.utcnow(), "usuario_id": usuario.id,
+            })
+            quente = tamanho_historico(connection) - antes
+        pontos = db.query(HistoricoPreco).filter(HistoricoPreco.produto_id.in_(produto_ids)).count()
+        print(f"{args.produtos} produtos x {args.dias} dias x {args.pontos_dia}/dia = {pontos:,} pontos")
+
+        agora = datetime.utcnow()
+        um_ano = agora - timedelta(days=365)
+        alvo = produto_ids[0]
+
+        def ler_ano():
+            quentes = db.execute(
+                select(HistoricoPreco.id, HistoricoPreco.data, HistoricoPreco.preco, HistoricoPreco.estoque)
+                .where(HistoricoPreco.produto_id == alvo, HistoricoPreco.data >= um_ano).order_by(HistoricoPreco.data.desc())
+            ).all()
+            arquivados = pontos_arquivados(db.execute(consulta_arquivos([alvo], um_ano)).all(), um_ano).get(alvo, [])
+            return len(quentes) + len(arquivados)
+
+        def analisar():
+            return analisar_produtos(db, produto_ids, agora)
+
+        pontos_ano = ler_ano()
+        analises_antes = analisar()
+        t_ler_quente, t_analise_quente = medir(ler_ano), medir(analisar)
+
+        inicio = time.perf_counter()
+        resultado = arquivar_historico(dias=1, produto_ids=produto_ids)
+        t_arquivar = time.perf_counter() - inicio
+        with engine.connect() as connection:
+            arquivo = connection.execute(text(
+                "SELECT COALESCE(SUM(pg_column_size(a.*)), 0), COALESCE(SUM(octet_length(dados)), 0), COUNT(*) FROM historico_arquivo a WHERE produto_id = ANY(:ids)"
+            ), {"ids": produto_ids}).one()
+
+        assert ler_ano() == pontos_ano, "leitura transparente perdeu pontos"
+        analises_depois = analisar()
+        assert analises_depois.keys() == analises_antes.keys()
+        for produto_id, analise in analises_antes.items():
+            assert analise["pontos"] == analises_depois[produto_id]["pontos"], produto_id
+            assert abs(analise["media_movel_30"] - analises_depois[produto_id]["media_movel_30"]) < 1e-6, produto_id
+        print("✅ Histórico e análise iguais antes e depois do arquivamento")
+        t_ler_arquivo, t_analise_arquivo = medir(ler_ano), medir(analisar)
+
+        print(f"arquivados {resultado['pontos']:,} pontos em {arquivo[2]} blobs ({t_arquivar:.1f}s)")
+        print(f"espaço quente   {quente / 1024 / 1024:8.1f} MiB  ({quente / pontos:6.1f} bytes/ponto, heap + índices)")
+        print(f"espaço arquivo  {arquivo[0] / 1024 / 1024:8.1f} MiB  ({arquivo[0] / resultado['pontos']:6.2f} bytes/ponto, {arquivo[1] / resultado['pontos']:.2f} de dados)")
+        print(f"ler 1 ano       quente {t_ler_quente * 1000:7.1f} ms   arquivo {t_ler_arquivo * 1000:7.1f} ms  ({pontos_ano:,} pontos)")
+        print(f"analisar todos  quente {t_analise_quente * 1000:7.1f} ms   arquivo {t_analise_arquivo * 1000:7.1f} ms")
+    finally:
+        db.rollback()
+        produto_ids = [produto_id for (produto_id,) in db.query(ProdutoMonitorado.id).filter(ProdutoMonitorado.usuario_id == usuario.id)]
+        for modelo in (HistoricoPreco, HistoricoArquivo, EstatisticaProduto):
+            db.execute(delete(modelo).where(modelo.produto_id.in_(produto_ids)))
+        db.execute(delete(ProdutoMonitorado).where(ProdutoMonitorado.usuario_id == usuario.id))
+        db.execute(delete(Usuario).where(Usuario.id == usuario.id))
+        db.commit()
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark de concorrência: sessão síncrona chamada dentro de handlers async
+(como as rotas faziam) x sessão async (asyncpg).
+
+    DATABASE_URL=postgresql://... python scripts/bench_concorrencia_db.py [--requisicoes 50] [--latencia 0.05]
+
+Cada "requisição" executa uma query com pg_sleep(latencia) simulando uma
+consulta lenta. Com a sessão síncrona o event loop fica bloqueado e as
+requisições são atendidas em série; com a async elas se sobrepõem até o
+limite do pool. Também mede o maior atraso do event loop (um tick a cada 10 ms).
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import SessionLocal, AsyncSessionLocal
+
+async def medir_atraso_loop(parar: asyncio.Event, atrasos: list):
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.01)
+        atrasos.append(time.perf_counter() - inicio - 0.01)
+
+async def requisicao_sync(latencia: float):
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT pg_sleep(:s)"), {"s": latencia})
+    finally:
+        db.close()
+
+async def requisicao_async(latencia: float):
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SELECT pg_sleep(:s)"), {"s": latencia})
+
+async def rodar(nome: str, requisicao, total: int, latencia: float):
+    atrasos = []
+    parar = asyncio.Event()
+    ticker = asyncio.create_task(medir_atraso_loop(parar, atrasos))
+    inicio = time.perf_counter()
+    await asyncio.gather(*(requisicao(latencia) for _ in range(total)))
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    await ticker
+    print(f"{nome:6} {total} reqs em {duracao:6.2f}s  ({total / duracao:7.1f} req/s)  maior atraso do loop {max(atrasos, default=0) * 1000:7.1f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requisicoes", type=int, default=50)
+    parser.add_argument("--latencia", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # Aquecer os pools
+    await requisicao_sync(0)
+    await requisicao_async(0)
+
+    await rodar("sync", requisicao_sync, args.requisicoes, args.latencia)
+    await rodar("async", requisicao_async, args.requisicoes, args.latencia)
+
+if __name__ == "__main__":
+    asyncio.run(main())
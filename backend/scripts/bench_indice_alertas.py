@@ -0,0 +1,158 @@
+"""
+Benchmark do índice de alertas em memória (indice_alertas) x avaliação por
+consulta (todos os alertas pendentes do produto, testados um a um).
+
+    python scripts/bench_indice_alertas.py [--alertas 2000000] [--produtos 100000] [--banco]
+
+Os alertas seguem uma distribuição concentrada (poucos produtos populares com
+muitos alertas, como em uma promoção). Cada atualização sorteia um produto e
+um preço próximo ao atual. As duas versões são conferidas entre si antes de
+medir. Com --banco os alertas sintéticos são gravados no DATABASE_URL dentro
+de uma transação (desfeita no final) e a consulta real do scheduler é medida
+contra o índice reconstruído a partir do banco.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indice_alertas import IndiceAlertas
+
+def gerar_alertas(total: int, produtos: int, semente: int = 42):
+    """(alerta_id, produto_id, limiar) e o preço base de cada produto"""
+    rng = random.Random(semente)
+    precos_base = {produto_id: rng.uniform(20, 5000) for produto_id in range(1, produtos + 1)}
+    pesos = [1 / produto_id ** 0.8 for produto_id in range(1, produtos + 1)]
+    sorteados = rng.choices(range(1, produtos + 1), weights=pesos, k=total)
+    alertas = [
+        (alerta_id, produto_id, round(precos_base[produto_id] * rng.uniform(0.6, 1.0), 2))
+        for alerta_id, produto_id in enumerate(sorteados, start=1)
+    ]
+    return alertas, precos_base
+
+def gerar_atualizacoes(precos_base: dict, quantidade: int, semente: int = 7):
+    """Variações pequenas, como entre dois ciclos do scheduler: a maioria não dispara nada"""
+    rng = random.Random(semente)
+    produto_ids = rng.choices(list(precos_base), k=quantidade)
+    return [(produto_id, round(precos_base[produto_id] * rng.uniform(0.9, 1.05), 2)) for produto_id in produto_ids]
+
+def carregar_indice(alertas) -> IndiceAlertas:
+    indice = IndiceAlertas()
+    indice.carregar(sorted(alertas, key=lambda alerta: (alerta[1], alerta[2], alerta[0])))
+    return indice
+
+def medir(funcao, rodadas: int) -> float:
+    tempos = []
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alertas", type=int, default=2_000_000)
+    parser.add_argument("--produtos", type=int, default=100_000)
+    parser.add_argument("--atualizacoes", type=int, default=20_000)
+    parser.add_argument("--rodadas", type=int, default=3)
+    parser.add_argument("--banco", action="store_true")
+    args = parser.parse_args()
+
+    alertas, precos_base = gerar_alertas(args.alertas, args.produtos)
+    atualizacoes = gerar_atualizacoes(precos_base, args.atualizacoes)
+    print(f"{args.alertas:,} alertas em {args.produtos:,} produtos, {args.atualizacoes:,} atualizações de preço")
+
+    inicio = time.perf_counter()
+    indice = carregar_indice(alertas)
+    print(f"carga      {(time.perf_counter() - inicio) * 1000:8.1f} ms  ({len(indice):,} alertas indexados)")
+
+    # Referência: o que verificar_alertas fazia, sem o custo do banco
+    por_produto = {}
+    for alerta in alertas:
+        por_produto.setdefault(alerta[1], []).append(alerta)
+
+    def por_consulta():
+        return [
+            [alerta_id for alerta_id, _, limiar in por_produto.get(produto_id, ()) if preco <= limiar]
+            for produto_id, preco in atualizacoes
+        ]
+
+    def por_indice():
+        return [indice.disparados(produto_id, preco) for produto_id, preco in atualizacoes]
+
+    assert [sorted(ids) for ids in por_consulta()] == [sorted(ids) for ids in por_indice()]
+    disparos = sum(len(ids) for ids in por_indice())
+    print(f"{disparos:,} alertas disparados ({disparos / len(atualizacoes):.2f} por atualização)")
+    print("✅ Alertas disparados iguais à referência")
+
+    t_indice = medir(por_indice, args.rodadas)
+    t_consulta = medir(por_consulta, args.rodadas)
+    print(f"índice     {t_indice / args.atualizacoes * 1e6:8.2f} µs por atualização")
+    print(f"varredura  {t_consulta / args.atualizacoes * 1e6:8.2f} µs por atualização  ({t_consulta / t_indice:.1f}x mais lento)")
+
+    # Manutenção incremental: criar e enviar (remover) alertas
+    rng = random.Random(1)
+    novos = [(args.alertas + i, rng.randint(1, args.produtos), round(rng.uniform(20, 5000), 2)) for i in range(1, 10_001)]
+    inicio = time.perf_counter()
+    for alerta in novos:
+        indice.adicionar(*alerta)
+    for alerta in novos:
+        indice.remover(*alerta)
+    print(f"manutenção {(time.perf_counter() - inicio) / (2 * len(novos)) * 1e6:8.2f} µs por inclusão/remoção")
+
+    if args.banco:
+        medir_banco(alertas, precos_base, atualizacoes[:2000])
+
+def medir_banco(alertas, precos_base, atualizacoes):
+    from sqlalchemy import text
+    from database import SessionLocal
+    from models import Alerta
+
+    db = SessionLocal()
+    try:
+        conexao = db.connection()
+        usuario_id = conexao.execute(text(
+            "INSERT INTO usuarios (email, is_active, is_admin) VALUES ('bench-indice@vigia.local', true, false) RETURNING id"
+        )).scalar()
+        produto_ids = {}
+        for produto_id, preco in precos_base.items():
+            produto_ids[produto_id] = conexao.execute(text(
+                "INSERT INTO produtos_monitorados (usuario_id, ml_id, nome, preco_atual) VALUES (:u, :ml, 'bench', :p) RETURNING id"
+            ), {"u": usuario_id, "ml": f"MLB{produto_id}", "p": preco}).scalar()
+        conexao.execute(text(
+            "INSERT INTO alertas (usuario_id, produto_id, preco_alvo, tipo, enviado) VALUES (:u, :p, :l, 'preco_alvo', false)"
+        ), [{"u": usuario_id, "p": produto_ids[produto_id], "l": limiar} for _, produto_id, limiar in alertas])
+        conexao.execute(text("ANALYZE alertas"))
+        print(f"banco: {len(alertas):,} alertas gravados (transação será desfeita)")
+
+        indice = IndiceAlertas()
+        inicio = time.perf_counter()
+        indice.reconstruir(conexao)
+        print(f"reconstrução do banco {(time.perf_counter() - inicio) * 1000:8.1f} ms")
+
+        def por_consulta():
+            for produto_id, preco in atualizacoes:
+                alertas_produto = db.query(Alerta).filter(Alerta.produto_id == produto_ids[produto_id], Alerta.enviado == False).all()
+                [alerta.id for alerta in alertas_produto if preco <= alerta.preco_alvo]
+                db.expunge_all()
+
+        def por_indice():
+            for produto_id, preco in atualizacoes:
+                ids = indice.disparados(produto_ids[produto_id], preco)
+                if ids:
+                    db.query(Alerta).filter(Alerta.id.in_(ids), Alerta.enviado == False).all()
+                db.expunge_all()
+
+        t_consulta = medir(por_consulta, 1)
+        t_indice = medir(por_indice, 1)
+        print(f"banco índice   {t_indice / len(atualizacoes) * 1000:8.2f} ms por atualização (lê só os disparados)")
+        print(f"banco consulta {t_consulta / len(atualizacoes) * 1000:8.2f} ms por atualização  ({t_consulta / t_indice:.1f}x mais lento)")
+    finally:
+        db.rollback()
+        db.close()
+
+if __name__ == "__main__":
+    main()
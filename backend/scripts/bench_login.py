@@ -0,0 +1,64 @@
+"""
+Benchmark de logins concorrentes: bcrypt direto no handler async (como era)
+x bcrypt no pool de threads de senhas.py.
+
+    python scripts/bench_login.py [--logins 20] [--rounds 12] [--workers 4]
+
+Cada "login" verifica uma senha; em paralelo, um ticker de 10 ms mede o maior
+atraso do event loop, que é o que as outras requisições do worker sentem.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+async def medir_atraso_loop(parar: asyncio.Event, atrasos: list):
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.01)
+        atrasos.append(time.perf_counter() - inicio - 0.01)
+
+async def rodar(nome: str, login, total: int):
+    atrasos = []
+    parar = asyncio.Event()
+    ticker = asyncio.create_task(medir_atraso_loop(parar, atrasos))
+    await asyncio.sleep(0)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(total)))
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    await ticker
+    print(f"{nome:8} {total} logins em {duracao:6.2f}s  ({total / duracao:6.1f} logins/s)  maior atraso do loop {max(atrasos, default=0) * 1000:7.1f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    # Configuração lida na importação do módulo
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["SENHA_HASH_WORKERS"] = str(args.workers)
+    from senhas import contexto_senhas, verificar_senha
+
+    pwd_context = contexto_senhas()
+
+    senha = "senha-de-teste"
+    senha_hash = pwd_context.hash(senha)
+
+    async def login_inline():
+        pwd_context.verify_and_update(senha, senha_hash)
+
+    async def login_pool():
+        await verificar_senha(senha, senha_hash)
+
+    print(f"bcrypt rounds={args.rounds}, workers={args.workers}, CPUs={os.cpu_count()}")
+    await rodar("inline", login_inline, args.logins)
+    await rodar("pool", login_pool, args.logins)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+Benchmark de serialização e bytes trafegados nos maiores endpoints:
+JSONResponse (padrão do FastAPI) x ORJSONResponse, e tamanho com gzip/brotli.
+
+    python scripts/bench_serializacao.py [--repeticoes 200]
+
+Payloads sintéticos no formato de /produtos/search/{query} (resposta crua do
+ML com 50 resultados) e de /produtos/{id}/historico (5.000 pontos).
+"""
+import argparse
+import gzip
+import random
+import time
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def payload_busca(resultados: int = 50) -> dict:
+    return {
+        "success": True,
+        "query": "iphone 15 128gb",
+        "ml_response": {
+            "paging": {"total": 12345, "offset": 0, "limit": resultados},
+            "results": [
+                {
+                    "id": f"MLB{3000000000 + i}",
+                    "title": f"Apple iPhone 15 (128 GB) - Preto - Distribuidor Autorizado {i}",
+                    "price": round(random.uniform(3500, 6000), 2),
+                    "currency_id": "BRL",
+                    "available_quantity": random.randint(1, 500),
+                    "condition": "new",
+                    "permalink": f"https://produto.mercadolivre.com.br/MLB-{3000000000 + i}-apple-iphone-15",
+                    "thumbnail": f"http://http2.mlstatic.com/D_{i}-I.jpg",
+                    "seller": {"id": 100000 + i, "nickname": f"LOJA_{i}"},
+                    "shipping": {"free_shipping": True, "logistic_type": "fulfillment", "tags": ["fulfillment", "mandatory_free_shipping"]},
+                    "attributes": [
+                        {"id": f"ATTR_{j}", "name": f"Atributo {j}", "value_name": f"Valor {j}", "value_id": str(j)}
+                        for j in range(15)
+                    ],
+                }
+                for i in range(resultados)
+            ],
+        },
+    }
+
+def payload_historico(pontos: int = 5000) -> list:
+    inicio = datetime(2024, 1, 1)
+    return [
+        {"id": i, "preco": round(random.uniform(3500, 6000), 2), "estoque": random.randint(0, 500), "data": inicio + timedelta(minutes=30 * i)}
+        for i in range(pontos)
+    ]
+
+def medir(classe, conteudo, repeticoes: int) -> tuple:
+    """Tempo de render da resposta (o conteúdo já chega convertido pelo FastAPI)"""
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        corpo = classe(conteudo).body
+    return (time.perf_counter() - inicio) / repeticoes * 1000, corpo
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    for nome, conteudo in [("search", payload_busca()), ("historico", payload_historico())]:
+        print(f"\n== {nome} ==")
+        conteudo = jsonable_encoder(conteudo)
+        for classe in (JSONResponse, ORJSONResponse):
+            ms, corpo = medir(classe, conteudo, args.repeticoes)
+            linha = f"{classe.__name__:15} {ms:8.3f} ms/resp  bruto {len(corpo):>9,} B  gzip {len(gzip.compress(corpo, 6)):>8,} B"
+            if brotli:
+                linha += f"  brotli(q4) {len(brotli.compress(corpo, quality=4)):>8,} B"
+            print(linha)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark de cold start: tempo de import do app e tempo até o primeiro
+/health saudável de um worker uvicorn recém-iniciado.
+
+    DATABASE_URL=postgresql://... python scripts/bench_startup.py [--rodadas 5] [--orcamento-ms 1500]
+
+O import é medido com `python -X importtime -c "import main"` em processos
+novos (mediana das rodadas) e lista os módulos importados diretamente pelo
+main/routers que mais pesam. Sai com código 1 se a mediana do import passar
+do orçamento, para ser usado no CI.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def medir_import() -> tuple:
+    """Retorna (ms do import de main, {módulo: ms cumulativo} dos níveis 1-2)"""
+    saida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND, capture_output=True, text=True, env=os.environ.copy()
+    ).stderr
+    total, modulos = 0.0, {}
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, cumulativo, nome = linha[len("import time:"):].split("|")
+        nivel = (len(nome) - len(nome.lstrip())) // 2
+        nome = nome.strip()
+        if nome == "main":
+            total = int(cumulativo) / 1000
+        elif nivel <= 2:
+            modulos[nome] = max(modulos.get(nome, 0), int(cumulativo) / 1000)
+    return total, modulos
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def medir_primeiro_health(timeout: float = 60) -> float:
+    """Segundos entre iniciar o uvicorn e o primeiro /health com status ok"""
+    porta = porta_livre()
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(porta), "--log-level", "warning"],
+        cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - inicio < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{porta}/health", timeout=2) as resposta:
+                    if resposta.status == 200 and b'"ok"' in resposta.read():
+                        return time.perf_counter() - inicio
+            except OSError:
+                pass
+            time.sleep(0.02)
+        raise TimeoutError("worker não ficou saudável")
+    finally:
+        processo.terminate()
+        processo.wait()
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rodadas", type=int, default=5)
+    parser.add_argument("--orcamento-ms", type=float, default=1500)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    medicoes = [medir_import() for _ in range(args.rodadas)]
+    import_ms = statistics.median(total for total, _ in medicoes)
+    print(f"import main: mediana {import_ms:7.1f} ms (orçamento {args.orcamento_ms:.0f} ms)")
+    ultimos = medicoes[-1][1]
+    for nome, ms in sorted(ultimos.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:8.1f} ms  {nome}")
+
+    tempos = [medir_primeiro_health() for _ in range(args.rodadas)]
+    print(f"primeiro /health ok: mediana {statistics.median(tempos):6.2f}s  (min {min(tempos):.2f}s, max {max(tempos):.2f}s)")
+
+    if import_ms > args.orcamento_ms:
+        print("❌ Import acima do orçamento")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Envia notificações do tópico "items" no formato do Mercado Livre para o
+webhook local, assinadas com ML_WEBHOOK_SECRET (obrigatório: o webhook
+recusa notificações sem assinatura).
+
+    python scripts/enviar_notificacao.py MLB123456789 [MLB... ] [--url http://localhost:8000] [--repetir 3]
+
+Use o mesmo ML_CLIENT_ID (application_id) e ML_WEBHOOK_SECRET do servidor.
+--repetir manda a mesma notificação várias vezes (o ML reenvia quando não
+recebe 200), útil para conferir a deduplicação na fila.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from notificacoes_ml import assinar
+
+def montar_notificacao(ml_id: str, application_id: str, usuario_ml: int) -> dict:
+    agora = datetime.now(timezone.utc).isoformat()
+    return {
+        "_id": str(uuid.uuid4()),
+        "resource": f"/items/{ml_id}",
+        "user_id": usuario_ml,
+        "topic": "items",
+        "application_id": int(application_id) if application_id.isdigit() else application_id,
+        "attempts": 1,
+        "sent": agora,
+        "received": agora,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ml_ids", nargs="+")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--application-id", default=os.getenv("ML_CLIENT_ID", ""))
+    parser.add_argument("--usuario-ml", type=int, default=0)
+    parser.add_argument("--repetir", type=int, default=1)
+    args = parser.parse_args()
+
+    segredo = os.getenv("ML_WEBHOOK_SECRET")
+    if not segredo:
+        sys.exit("❌ Configure ML_WEBHOOK_SECRET (o mesmo do servidor)")
+    with httpx.Client(base_url=args.url, timeout=10) as cliente:
+        for ml_id in args.ml_ids:
+            for _ in range(args.repetir):
+                corpo = json.dumps(montar_notificacao(ml_id, args.application_id, args.usuario_ml)).encode()
+                ts = str(int(time.time()))
+                headers = {"Content-Type": "application/json", "X-Signature": f"ts={ts},v1={assinar(corpo, ts, segredo)}"}
+                resposta = cliente.post("/notificacoes/mercadolivre", content=corpo, headers=headers)
+                print(f"{ml_id}: {resposta.status_code} {resposta.text}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Stub local da API de chat completions da OpenAI para testar o pipeline de
+resumos sem custo:
+
+    uvicorn scripts.stub_openai:app --port 8099
+    OPENAI_BASE_URL=http://localhost:8099/v1 OPENAI_API_KEY=stub python resumos.py
+
+STUB_OPENAI_LATENCIA (segundos) simula a latência do modelo.
+"""
+import os
+import time
+import asyncio
+from fastapi import FastAPI, Request
+
+app = FastAPI(title="Stub OpenAI")
+
+LATENCIA = float(os.getenv("STUB_OPENAI_LATENCIA", "0.5"))
+chamadas = {"total": 0}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    corpo = await request.json()
+    prompt = corpo["messages"][-1]["content"]
+    chamadas["total"] += 1
+    await asyncio.sleep(LATENCIA)
+
+    resposta = f"Resumo stub #{chamadas['total']}: {len(prompt.splitlines()) - 1} avaliações analisadas."
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(resposta) // 4
+    return {
+        "id": f"chatcmpl-stub-{chamadas['total']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": corpo.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": resposta},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+@app.get("/stats")
+def stats():
+    return chamadas
@@ -0,0 +1,100 @@
+"""
+Regressão de planos de consulta: confere com EXPLAIN que as consultas quentes
+usam os índices criados pelas migrações.
+
+    DATABASE_URL=postgresql://... python scripts/verificar_planos.py
+
+Com tabelas pequenas o planner prefere seq scan, então a verificação roda com
+enable_seqscan/enable_bitmapscan=off: o que se testa é se existe um índice
+utilizável (e se a ordenação do histórico sai do índice, sem nó Sort). No
+histórico particionado valem os índices das partições, herdados do pai. Sai com código 1 se algum
+plano regredir, para ser usado no CI/deploy.
+"""
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine
+from particoes import PARTICAO_REGEX
+
+# (descrição, SQL, índice esperado (regex), nós proibidos)
+CONSULTAS = [
+    (
+        "histórico do produto ordenado por data",
+        "SELECT * FROM historico_precos WHERE produto_id = 1 ORDER BY data DESC",
+        r"ix_historico_precos_produto_id_data|historico_precos_(p\d{4}_\d{2}|padrao)_produto_id_data_idx",
+        {"Sort"},
+    ),
+    (
+        "alertas pendentes do produto (scheduler)",
+        "SELECT * FROM alertas WHERE produto_id = 1 AND enviado = false",
+        "ix_alertas_produto_id_pendentes",
+        set(),
+    ),
+    (
+        "produtos do usuário",
+        "SELECT * FROM produtos_monitorados WHERE usuario_id = 1",
+        "ix_produtos_monitorados_usuario_id",
+        set(),
+    ),
+    (
+        "alertas do usuário",
+        "SELECT * FROM alertas WHERE usuario_id = 1",
+        "ix_alertas_usuario_id",
+        set(),
+    ),
+]
+
+def nos_do_plano(no: dict):
+    yield no
+    for filho in no.get("Plans", []):
+        yield from nos_do_plano(filho)
+
+def verificar_poda_particoes(connection, dias: int = 30) -> bool:
+    """Histórico recente (?dias=) deve ler só as partições a partir do corte"""
+    corte = datetime.utcnow() - timedelta(days=dias)
+    plano = connection.execute(text(
+        f"EXPLAIN (FORMAT JSON) SELECT * FROM historico_precos WHERE produto_id = 1 AND data >= '{corte.isoformat()}' ORDER BY data DESC"
+    )).scalar()[0]["Plan"]
+    lidas = {no["Relation Name"] for no in nos_do_plano(plano) if no.get("Relation Name")}
+    antigas = []
+    for nome in lidas:
+        encontrado = PARTICAO_REGEX.match(nome)
+        if encontrado and (int(encontrado.group(1)), int(encontrado.group(2))) < (corte.year, corte.month):
+            antigas.append(nome)
+    if antigas:
+        print(f"❌ histórico dos últimos {dias} dias: leu partições antigas {sorted(antigas)}")
+        return False
+    print(f"✅ histórico dos últimos {dias} dias: {len(lidas)} partições lidas")
+    return True
+
+def main() -> int:
+    falhas = 0
+    with engine.connect() as connection:
+        connection.execute(text("SET enable_seqscan = off"))
+        connection.execute(text("SET enable_bitmapscan = off"))
+        for descricao, sql, indice, proibidos in CONSULTAS:
+            plano = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+            nos = list(nos_do_plano(plano))
+            indices_usados = {no.get("Index Name") for no in nos if no.get("Index Name")}
+            tipos = {no["Node Type"] for no in nos}
+            problemas = []
+            if not indices_usados or not all(re.fullmatch(indice, nome) for nome in indices_usados):
+                problemas.append(f"esperava {indice}, usou {sorted(indices_usados) or 'nenhum índice'}")
+            if tipos & proibidos:
+                problemas.append(f"nós indesejados: {sorted(tipos & proibidos)}")
+            if problemas:
+                falhas += 1
+                print(f"❌ {descricao}: {'; '.join(problemas)}")
+            else:
+                print(f"✅ {descricao}: {', '.join(sorted(indices_usados)[:3])}{' ...' if len(indices_usados) > 3 else ''}")
+        if connection.dialect.name == "postgresql" and not verificar_poda_particoes(connection):
+            falhas += 1
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+# Hash de senhas fora do event loop. O bcrypt consome ~100-300 ms de CPU por
+# chamada; rodando direto no handler async ele trava todas as requisições do
+# worker. O bcrypt libera o GIL, então um pool de threads limitado basta.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+SENHA_HASH_WORKERS = int(os.getenv("SENHA_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=SENHA_HASH_WORKERS, thread_name_prefix="vigia-senhas")
+_contexto: Optional["CryptContext"] = None
+
+def contexto_senhas() -> "CryptContext":
+    """
+    CryptContext criado no primeiro uso (passlib/bcrypt fora do boot). Com
+    rounds fixo, hashes gravados com outro custo são considerados
+    desatualizados e refeitos no próximo login bem-sucedido
+    """
+    global _contexto
+    if _contexto is None:
+        from passlib.context import CryptContext
+        _contexto = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _contexto
+
+async def gerar_hash_senha(senha: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, contexto_senhas().hash, senha)
+
+async def verificar_senha(senha: str, senha_hash: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica a senha no pool de threads. Retorna (valida, novo_hash); novo_hash
+    vem preenchido quando o hash gravado usa um custo diferente do configurado
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, contexto_senhas().verify_and_update, senha, senha_hash)
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Os testes rodam contra um SQLite descartável (caminho de desenvolvimento
+# local): o DATABASE_URL precisa existir antes de importar database.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'vigia_testes.db')}"
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from arquivo_historico import arquivar_historico, aplicar_retencao_arquivo
+from database import SessionLocal, create_tables
+from models import Usuario, ProdutoMonitorado, HistoricoPreco, HistoricoArquivo, HistoricoPrecoDiario
+
+def test_retencao_consolida_os_meses_arquivados_em_agregados_diarios():
+    assert create_tables()
+    agora = datetime.utcnow()
+    antigo = datetime.combine((agora - timedelta(days=400)).date(), datetime.min.time())
+    recente = agora - timedelta(days=130)
+    db = SessionLocal()
+    try:
+        usuario = Usuario(email="arquivo@vigia.local", is_active=True)
+        db.add(usuario)
+        db.flush()
+        produto = ProdutoMonitorado(usuario_id=usuario.id, ml_id="MLB900", nome="teste", preco_atual=10.0, estoque_atual=1, url="")
+        db.add(produto)
+        db.flush()
+        db.add_all([
+            HistoricoPreco(produto_id=produto.id, preco=10.0, estoque=5, data=antigo + timedelta(hours=1)),
+            HistoricoPreco(produto_id=produto.id, preco=14.0, estoque=4, data=antigo + timedelta(hours=9)),
+            HistoricoPreco(produto_id=produto.id, preco=12.0, estoque=3, data=antigo + timedelta(days=1, hours=2)),
+            HistoricoPreco(produto_id=produto.id, preco=11.0, estoque=2, data=recente),
+        ])
+        db.commit()
+        produto_id = produto.id
+    finally:
+        db.close()
+
+    assert arquivar_historico(dias=90, produto_ids=[produto_id])["pontos"] == 4
+    assert aplicar_retencao_arquivo(dias=365)["pontos"] >= 3
+
+    db = SessionLocal()
+    try:
+        diarios = {
+            linha.dia: (linha.preco_minimo, linha.preco_maximo, linha.preco_medio, linha.estoque_final, linha.pontos)
+            for linha in db.query(HistoricoPrecoDiario).filter(HistoricoPrecoDiario.produto_id == produto_id)
+        }
+        assert diarios[antigo.date()] == (10.0, 14.0, 12.0, 4, 2)
+        assert diarios[antigo.date() + timedelta(days=1)] == (12.0, 12.0, 12.0, 3, 1)
+        assert recente.date() not in diarios
+        meses = [arquivo.mes for arquivo in db.query(HistoricoArquivo).filter(HistoricoArquivo.produto_id == produto_id)]
+        assert meses == [recente.date().replace(day=1)]
+    finally:
+        db.close()
@@ -0,0 +1,58 @@
+from datetime import datetime
+from buscas_salvas import aplicar_execucao, codificar_vistos, decodificar_vistos
+from database import SessionLocal, create_tables
+from models import Usuario, BuscaSalva
+
+def _pagina(*itens):
+    return {"results": [{"id": ml_id, "price": preco, "title": ml_id, "permalink": ""} for ml_id, preco in itens]}
+
+def _eventos(busca, dados):
+    db = SessionLocal()
+    try:
+        busca = db.merge(busca)
+        aplicar_execucao(db, busca, dados, datetime.utcnow())
+        tipos = sorted((evento.ml_id, evento.tipo) for evento in db.new if hasattr(evento, "tipo"))
+        db.commit()
+        db.refresh(busca)
+        return busca, tipos
+    finally:
+        db.close()
+
+def _nova_busca(preco_maximo=None) -> BuscaSalva:
+    assert create_tables()
+    db = SessionLocal()
+    try:
+        usuario = Usuario(email=f"buscas-{datetime.utcnow().timestamp()}@vigia.local", is_active=True)
+        db.add(usuario)
+        db.flush()
+        busca = BuscaSalva(usuario_id=usuario.id, consulta="teste", preco_maximo=preco_maximo, ativa=True)
+        db.add(busca)
+        db.commit()
+        return busca
+    finally:
+        db.close()
+
+def test_pagina_reordenada_nao_gera_novos():
+    busca, eventos = _eventos(_nova_busca(), _pagina(("MLB1", 10), ("MLB2", 20), ("MLB3", 30)))
+    assert eventos == []  # linha de base
+    # MLB3 sai da página e volta depois: só mudou de posição no ranking
+    busca, eventos = _eventos(busca, _pagina(("MLB2", 20), ("MLB1", 10), ("MLB4", 40)))
+    assert eventos == [("MLB4", "novo")]
+    busca, eventos = _eventos(busca, _pagina(("MLB3", 30), ("MLB4", 40), ("MLB1", 10)))
+    assert eventos == []
+
+def test_pagina_vazia_mantem_o_estado():
+    busca, _ = _eventos(_nova_busca(), _pagina(("MLB1", 10), ("MLB2", 20)))
+    busca, eventos = _eventos(busca, {"results": []})
+    assert eventos == [] and busca.resultados == 2
+    busca, eventos = _eventos(busca, _pagina(("MLB1", 9), ("MLB2", 20)))
+    assert eventos == [("MLB1", "queda_preco")]
+
+def test_anuncio_que_volta_abaixo_do_preco_maximo_e_queda_de_preco():
+    busca, _ = _eventos(_nova_busca(preco_maximo=50), _pagina(("MLB1", 10), ("MLB2", 60)))
+    busca, eventos = _eventos(busca, _pagina(("MLB1", 10), ("MLB2", 45)))
+    assert eventos == [("MLB2", "queda_preco")]
+
+def test_codificacao_dos_vistos():
+    vistos = {"MLB1", "MLB123456789", "MLB987654321"}
+    assert decodificar_vistos(codificar_vistos(vistos)) == vistos
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from arquivo_historico import arquivar_historico
+from database import SessionLocal, create_tables
+from estatisticas import recalcular_estatisticas
+from models import Usuario, ProdutoMonitorado, HistoricoPreco, HistoricoPrecoDiario, EstatisticaProduto
+
+def test_recalculo_inclui_arquivo_frio_e_dias_consolidados():
+    assert create_tables()
+    agora = datetime.utcnow().replace(microsecond=0)
+    consolidado = (agora - timedelta(days=500)).date()
+    db = SessionLocal()
+    try:
+        usuario = Usuario(email="estatisticas@vigia.local", is_active=True)
+        db.add(usuario)
+        db.flush()
+        produto = ProdutoMonitorado(usuario_id=usuario.id, ml_id="MLB901", nome="teste", preco_atual=13.0, estoque_atual=1, url="")
+        db.add(produto)
+        db.flush()
+        db.add_all([
+            HistoricoPrecoDiario(produto_id=produto.id, dia=consolidado, preco_minimo=10.0, preco_maximo=14.0, preco_medio=12.0, estoque_final=1, pontos=2),
+            HistoricoPreco(produto_id=produto.id, preco=11.0, estoque=1, data=agora - timedelta(days=130)),
+            HistoricoPreco(produto_id=produto.id, preco=11.0, estoque=1, data=agora - timedelta(days=10)),
+            HistoricoPreco(produto_id=produto.id, preco=13.0, estoque=1, data=agora - timedelta(days=2)),
+        ])
+        db.commit()
+        produto_id = produto.id
+    finally:
+        db.close()
+
+    assert arquivar_historico(dias=90, produto_ids=[produto_id])["pontos"] == 1
+    assert recalcular_estatisticas([produto_id]) == 1
+
+    db = SessionLocal()
+    try:
+        estatistica = db.get(EstatisticaProduto, produto_id)
+        assert estatistica.pontos == 5
+        assert (estatistica.preco_minimo, estatistica.preco_maximo) == (10.0, 14.0)
+        assert abs(estatistica.preco_medio - 11.8) < 1e-9
+        assert estatistica.ultimo_preco == 13.0
+        assert estatistica.mudancas == 1
+        assert estatistica.primeiro_ponto_em == datetime.combine(consolidado, datetime.min.time())
+        assert abs((estatistica.ultima_mudanca_em - (agora - timedelta(days=2))).total_seconds()) < 1
+        assert abs((estatistica.ultimo_ponto_em - (agora - timedelta(days=2))).total_seconds()) < 1
+    finally:
+        db.close()
@@ -0,0 +1,29 @@
+from database import SessionLocal, create_tables
+from models import Usuario, ProdutoMonitorado, HistoricoPreco
+from atualizacao import gravar_atualizacoes
+
+def test_inserir_pontos_historico_sqlite():
+    assert create_tables()
+    db = SessionLocal()
+    try:
+        usuario = Usuario(email="historico-sqlite@vigia.local", is_active=True)
+        db.add(usuario)
+        db.flush()
+        produto = ProdutoMonitorado(usuario_id=usuario.id, ml_id="MLB1", nome="teste", preco_atual=10.0, estoque_atual=1, url="")
+        db.add(produto)
+        db.flush()
+        pontos = [HistoricoPreco(produto_id=produto.id, preco=10.0, estoque=1), HistoricoPreco(produto_id=produto.id, preco=9.5, estoque=1)]
+        db.add_all(pontos)
+        db.commit()
+        assert pontos[0].id is not None and pontos[1].id > pontos[0].id
+        usuario_id, produto_id = usuario.id, produto.id
+    finally:
+        db.close()
+
+    resultado = gravar_atualizacoes(usuario_id, {"MLB1": {"nome": "teste", "preco": 9.0, "estoque": 2, "url": ""}})
+    assert resultado["atualizados"] == 1
+    db = SessionLocal()
+    try:
+        assert db.query(HistoricoPreco).filter(HistoricoPreco.produto_id == produto_id).count() == 3
+    finally:
+        db.close()
@@ -0,0 +1,15 @@
+from starlette.requests import Request
+from http_cache import aceita_codificacao
+
+def _request(accept_encoding: str) -> Request:
+    return Request({"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]})
+
+def test_aceita_codificacao_com_q_values():
+    assert aceita_codificacao(_request("gzip, deflate, br"), "gzip")
+    assert aceita_codificacao(_request("br;q=1.0, gzip;q=0.5"), "gzip")
+    assert not aceita_codificacao(_request("gzip;q=0"), "gzip")
+    assert not aceita_codificacao(_request("GZIP; q=0.0, br"), "gzip")
+    assert aceita_codificacao(_request("*"), "gzip")
+    assert not aceita_codificacao(_request("*, gzip;q=0"), "gzip")
+    assert not aceita_codificacao(_request("identity"), "gzip")
+    assert not aceita_codificacao(_request(""), "gzip")
@@ -0,0 +1,37 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import routers
+from auth import UsuarioAutenticado, get_current_user
+from database import SessionLocal, create_tables
+from models import Usuario, ProdutoMonitorado, EstatisticaProduto
+
+def test_importacao_em_lote_registra_estatisticas(monkeypatch):
+    assert create_tables()
+    db = SessionLocal()
+    try:
+        usuario = Usuario(email="lote@vigia.local", is_active=True)
+        db.add(usuario)
+        db.commit()
+        usuario_id = usuario.id
+    finally:
+        db.close()
+
+    async def buscar_produtos(ml_ids, usuario_id):
+        return {ml_id: {"nome": f"Produto {ml_id}", "url": "", "preco": 99.9, "estoque": 3} for ml_id in ml_ids}
+
+    monkeypatch.setattr(routers, "buscar_produtos_por_ids_ml", buscar_produtos)
+    app = FastAPI()
+    app.include_router(routers.router)
+    app.dependency_overrides[get_current_user] = lambda: UsuarioAutenticado(id=usuario_id, email="lote@vigia.local")
+    resposta = TestClient(app).post("/produtos/batch", json={"itens": ["MLB9100", "MLB9101"]})
+    assert resposta.status_code == 200
+    assert resposta.json()["criados"] == 2
+
+    db = SessionLocal()
+    try:
+        produto = db.query(ProdutoMonitorado).filter(ProdutoMonitorado.ml_id == "MLB9100").one()
+        estatistica = db.get(EstatisticaProduto, produto.id)
+        assert (estatistica.pontos, estatistica.ultimo_preco, estatistica.preco_minimo) == (1, 99.9, 99.9)
+        assert estatistica.ultimo_ponto_em == produto.criado_em
+    finally:
+        db.close()
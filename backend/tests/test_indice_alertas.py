@@ -0,0 +1,87 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import routers
+from auth import UsuarioAutenticado, get_current_user
+from database import SessionLocal, create_tables
+from indice_alertas import IndiceAlertas, alerta_criado, indice_alertas
+from models import Usuario, ProdutoMonitorado, Alerta
+
+def test_mudancas_durante_a_consulta_da_carga_nao_se_perdem():
+    indice = IndiceAlertas()
+    indice.carregar([(1, 10, 50.0)])
+
+    def consulta():
+        # Notificações que chegam entre o início da reconstrução e o snapshot
+        indice.aplicar({"op": "adicionar", "alerta_id": 3, "produto_id": 10, "limiar": 80.0})
+        indice.aplicar({"op": "remover", "alerta_id": 2, "produto_id": 10, "limiar": 60.0})
+        return [(1, 10, 50.0), (2, 10, 60.0)]
+
+    assert indice.carregar(consulta) == 2
+    assert indice.disparados(10, 40.0) == [1, 3]
+
+def test_mudancas_durante_a_leitura_das_linhas_sao_reaplicadas():
+    indice = IndiceAlertas()
+
+    def linhas():
+        yield (1, 10, 50.0)
+        indice.aplicar({"op": "adicionar", "alerta_id": 4, "produto_id": 20, "limiar": 30.0})
+        indice.aplicar({"op": "remover_produto", "produto_id": 10})
+        yield (2, 10, 60.0)
+
+    indice.carregar(linhas())
+    assert indice.disparados(10, 0.0) == []
+    assert indice.disparados(20, 25.0) == [4]
+    assert len(indice) == 1
+
+def test_adicionar_e_idempotente():
+    indice = IndiceAlertas()
+    indice.carregar([(1, 10, 50.0)])
+    indice.aplicar({"op": "adicionar", "alerta_id": 1, "produto_id": 10, "limiar": 50.0})
+    assert indice.disparados(10, 50.0) == [1]
+
+def test_sem_notify_o_indice_so_muda_no_commit():
+    assert create_tables()
+    db = SessionLocal()
+    try:
+        descartado = Alerta(usuario_id=1, produto_id=9701, preco_alvo=50.0, tipo="preco_alvo", enviado=False)
+        db.add(descartado)
+        db.flush()
+        alerta_criado(db, descartado)
+        assert indice_alertas.disparados(9701, 40.0) == []
+        db.rollback()
+        assert indice_alertas.disparados(9701, 40.0) == []
+
+        confirmado = Alerta(usuario_id=1, produto_id=9701, preco_alvo=60.0, tipo="preco_alvo", enviado=False)
+        db.add(confirmado)
+        db.flush()
+        alerta_criado(db, confirmado)
+        db.commit()
+        assert indice_alertas.disparados(9701, 40.0) == [confirmado.id]
+    finally:
+        db.close()
+
+def test_alerta_so_para_produto_do_proprio_usuario():
+    assert create_tables()
+    db = SessionLocal()
+    try:
+        dono, outro = Usuario(email="dono-alerta@vigia.local", is_active=True), Usuario(email="outro-alerta@vigia.local", is_active=True)
+        db.add_all([dono, outro])
+        db.flush()
+        produto = ProdutoMonitorado(usuario_id=dono.id, ml_id="MLB9702", nome="teste", preco_atual=10.0, estoque_atual=1, url="")
+        db.add(produto)
+        db.commit()
+        dono_id, outro_id, produto_id = dono.id, outro.id, produto.id
+    finally:
+        db.close()
+
+    app = FastAPI()
+    app.include_router(routers.router)
+    cliente = TestClient(app)
+    corpo = {"produto_id": produto_id, "preco_alvo": 8.0, "tipo": "preco_alvo"}
+    app.dependency_overrides[get_current_user] = lambda: UsuarioAutenticado(id=outro_id, email="outro-alerta@vigia.local")
+    assert cliente.post("/alertas/", json=corpo).status_code == 404
+    assert cliente.post("/alertas/", json={**corpo, "produto_id": produto_id + 1000}).status_code == 404
+    app.dependency_overrides[get_current_user] = lambda: UsuarioAutenticado(id=dono_id, email="dono-alerta@vigia.local")
+    resposta = cliente.post("/alertas/", json=corpo)
+    assert resposta.status_code == 200
+    assert indice_alertas.disparados(produto_id, 5.0) == [resposta.json()["id"]]
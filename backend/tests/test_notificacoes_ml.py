@@ -0,0 +1,62 @@
+import json
+import time
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+import notificacoes_ml
+import routers
+from database import SessionLocal, create_tables
+from models import Usuario, ProdutoMonitorado, NotificacaoItemML
+
+def test_itens_nao_atualizados_voltam_para_a_fila(monkeypatch):
+    assert create_tables()
+    db = SessionLocal()
+    try:
+        usuario = Usuario(email="notificacoes@vigia.local", is_active=True)
+        db.add(usuario)
+        db.flush()
+        for ml_id in ("MLB501", "MLB502"):
+            db.add(ProdutoMonitorado(usuario_id=usuario.id, ml_id=ml_id, nome="teste", preco_atual=10.0, estoque_atual=1, url=""))
+            db.execute(text(notificacoes_ml.SQL_ENFILEIRAR), {"ml_id": ml_id, "agora": datetime.utcnow()})
+        db.commit()
+    finally:
+        db.close()
+
+    async def multiget_parcial(ml_ids, user_id):
+        # MLB502 fica de fora da resposta do ML
+        return {"MLB501": {"nome": "teste", "preco": 9.0, "estoque": 1, "url": ""}}
+
+    monkeypatch.setattr(notificacoes_ml, "buscar_produtos_por_ids_ml", multiget_parcial)
+    assert notificacoes_ml.processar_notificacoes() == 1
+
+    db = SessionLocal()
+    try:
+        pendentes = dict(db.query(NotificacaoItemML.ml_id, NotificacaoItemML.pendente).filter(NotificacaoItemML.ml_id.in_(["MLB501", "MLB502"])))
+        assert pendentes == {"MLB501": False, "MLB502": True}
+    finally:
+        db.close()
+
+def _cliente_webhook():
+    app = FastAPI()
+    app.include_router(routers.router)
+    return TestClient(app)
+
+def test_webhook_sem_segredo_recusa_notificacoes(monkeypatch):
+    monkeypatch.setattr(notificacoes_ml, "ML_WEBHOOK_SECRET", None)
+    monkeypatch.setattr(notificacoes_ml, "ML_CLIENT_ID", "123")
+    corpo = json.dumps({"topic": "items", "resource": "/items/MLB503", "application_id": 123})
+    resposta = _cliente_webhook().post("/notificacoes/mercadolivre", content=corpo)
+    assert resposta.status_code == 403
+
+def test_webhook_exige_assinatura_do_segredo(monkeypatch):
+    monkeypatch.setattr(notificacoes_ml, "ML_WEBHOOK_SECRET", "segredo")
+    monkeypatch.setattr(notificacoes_ml, "ML_CLIENT_ID", "123")
+    cliente = _cliente_webhook()
+    corpo = json.dumps({"topic": "items", "resource": "/items/MLB503", "application_id": 123}).encode()
+    ts = str(int(time.time()))
+    assert cliente.post("/notificacoes/mercadolivre", content=corpo).status_code == 401
+    errada = {"X-Signature": f"ts={ts},v1={notificacoes_ml.assinar(corpo, ts, 'outro')}"}
+    assert cliente.post("/notificacoes/mercadolivre", content=corpo, headers=errada).status_code == 401
+    certa = {"X-Signature": f"ts={ts},v1={notificacoes_ml.assinar(corpo, ts, 'segredo')}"}
+    assert cliente.post("/notificacoes/mercadolivre", content=corpo, headers=certa).status_code == 200
@@ -0,0 +1,55 @@
+import time
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from sqlalchemy import text
+import replicas
+from database import SessionLocal
+
+def _commit():
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        db.commit()
+    finally:
+        db.close()
+
+async def mutacao(request):
+    replicas.marcar_requisicao_de_escrita(41)
+    antes = replicas.roteador.escrita_recente(41)
+    await run_in_threadpool(_commit)
+    return JSONResponse({"antes_do_commit": antes, "depois_do_commit": replicas.roteador.escrita_recente(41)})
+
+async def leitura(request):
+    return JSONResponse({"primario": replicas.roteador.escolher(42) is None})
+
+def _cliente(monkeypatch):
+    monkeypatch.setattr(replicas.roteador, "replicas", [replicas.Replica.__new__(replicas.Replica)])
+    monkeypatch.setattr(replicas.roteador, "_escritas", {})
+    replicas.roteador.replicas[0].saudavel = True
+    app = Starlette(routes=[Route("/mutacao", mutacao, methods=["POST"]), Route("/leitura", leitura)])
+    return TestClient(replicas.MiddlewareLeituraAposEscrita(app))
+
+def test_escrita_e_registrada_no_commit_e_devolvida_ao_cliente(monkeypatch):
+    cliente = _cliente(monkeypatch)
+    resposta = cliente.post("/mutacao")
+    assert resposta.json() == {"antes_do_commit": False, "depois_do_commit": True}
+    assert abs(float(resposta.headers[replicas.HEADER_ESCRITA]) - time.time()) < 5
+    assert replicas.COOKIE_ESCRITA in resposta.headers["set-cookie"]
+
+def test_escrita_informada_pelo_cliente_le_do_primario(monkeypatch):
+    cliente = _cliente(monkeypatch)
+    assert cliente.get("/leitura").json() == {"primario": False}
+    assert cliente.get("/leitura", headers={replicas.HEADER_ESCRITA: f"{time.time():.3f}"}).json() == {"primario": True}
+    assert cliente.get("/leitura", headers={"cookie": f"{replicas.COOKIE_ESCRITA}={time.time() - 60:.3f}"}).json() == {"primario": False}
+
+def test_pools_de_replica_cabem_no_orcamento_da_replica():
+    from database import calcular_pools
+    workers, replicas_app = 4, 2
+    pools = calcular_pools(40, workers, replicas_app, 24)
+    por_processo = {nome: sum(tamanhos) for nome, tamanhos in pools.items()}
+    assert (por_processo["sync"] + por_processo["async"] + 2) * workers * replicas_app <= 40
+    assert por_processo["replica"] * workers * replicas_app <= 24
+    assert calcular_pools(40, 1, 1)["replica"] == (20, 20)
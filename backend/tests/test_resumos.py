@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime, timedelta
+import resumos
+from database import AsyncSessionLocal, SessionLocal, create_tables
+from models import ResumoAvaliacao
+
+def test_busca_de_avaliacoes_que_falha_nao_grava_resumo(monkeypatch):
+    assert create_tables()
+
+    async def busca_falhou(ml_id, user_id):
+        return None
+
+    async def revalidar():
+        async with AsyncSessionLocal() as db:
+            return await resumos.revalidar_resumo(db, "MLB777", 1)
+
+    monkeypatch.setattr(resumos, "buscar_avaliacoes_ml", busca_falhou)
+    assert asyncio.run(revalidar()) is None
+    db = SessionLocal()
+    try:
+        assert db.query(ResumoAvaliacao).filter(ResumoAvaliacao.ml_id == "MLB777").count() == 0
+    finally:
+        db.close()
+
+def test_revalidacao_em_segundo_plano_usa_sessao_propria(monkeypatch):
+    assert create_tables()
+    avaliacoes = [{"content": "Ótimo produto"}]
+    expirado = datetime.utcnow() - resumos.RESUMO_TTL - timedelta(hours=1)
+    db = SessionLocal()
+    try:
+        db.add(ResumoAvaliacao(
+            ml_id="MLB778", resumo="bom", total_avaliacoes=1, gerado_em=expirado, verificado_em=expirado,
+            hash_avaliacoes=resumos.calcular_hash_avaliacoes(avaliacoes)
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    async def buscar_avaliacoes(ml_id, user_id):
+        return avaliacoes
+
+    monkeypatch.setattr(resumos, "buscar_avaliacoes_ml", buscar_avaliacoes)
+    asyncio.run(resumos.revalidar_resumo_em_segundo_plano("MLB778", 1))
+    db = SessionLocal()
+    try:
+        resumo = db.query(ResumoAvaliacao).filter(ResumoAvaliacao.ml_id == "MLB778").one()
+        assert resumo.verificado_em > expirado + timedelta(minutes=30)
+        assert resumo.resumo == "bom"
+    finally:
+        db.close()
+    assert "MLB778" not in resumos._revalidando